@@ -0,0 +1,94 @@
+"""
+Benchmark: the digest archive (bot/archive.py) after years of daily digests.
+
+    python bench/bench_archive.py [--years 5] [--stories 8] [--repeat 5] [--budget-ms 1000]
+
+Fills a fresh archive with --years of daily digests of --stories bench/feed_server.py stories
+each (a third mention a CVE), one add() per day as the send path does, then times adding one
+more day and a set of keyword, CVE and date-range queries. Exits 1 if any query's best time is
+over --budget-ms.
+"""
+from __future__ import annotations
+import argparse, datetime, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+
+from archive import Archive  # noqa: E402
+from feed_server import _story  # noqa: E402
+
+
+def day_records(day_index: int, stories: int) -> list[dict]:
+    records = []
+    for j in range(stories):
+        story_id = day_index * stories + j
+        title, body, _ = _story(story_id)
+        sentences = body.split(". ")
+        records.append({
+            "title": f"🛡️ {title}",
+            "rundown_text": sentences[0] + ".",
+            "bullets": [s.rstrip(".") for s in sentences[1:3]],
+            "link": f"https://feed{story_id % 50}.example.com/news/{story_id}",
+        })
+    return records
+
+
+def best_ms(fn, repeat: int) -> tuple:
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--stories", type=int, default=8, help="stories per digest")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="slowest acceptable query")
+    args = parser.parse_args()
+
+    days = int(args.years * 365)
+    first = datetime.date(2020, 1, 1)
+    with tempfile.TemporaryDirectory(prefix="digest-archive-") as tmp:
+        archive = Archive(Path(tmp) / "archive.sqlite3")
+        start = time.perf_counter()
+        for d in range(days):
+            archive.add(day_records(d, args.stories), first + datetime.timedelta(days=d))
+        fill = time.perf_counter() - start
+        s = archive.stats()
+        size_mb = sum(p.stat().st_size for p in Path(tmp).iterdir()) / 1e6
+        print(f"{s['items']:,} stories over {s['days']:,} days: filled in {fill:.1f}s, {s['terms']:,} terms, {s['cves']:,} CVEs, {size_mb:.1f} MB")
+
+        last = first + datetime.timedelta(days=days)
+        add_ms, _ = best_ms(lambda: archive.add(day_records(days, args.stories), last), 1)
+        print(f"add one day ({args.stories} stories): {add_ms:.1f} ms")
+
+        cve = _story(3 * (days * args.stories // 6))[2]
+        queries = [
+            ("common keyword", dict(words="attackers")),
+            ("rare keyword", dict(words="confluence")),
+            ("two keywords", dict(words="fortinet campaign")),
+            ("cve", dict(cve=cve)),
+            ("cve, first covered", dict(cve=cve, oldest_first=True, limit=1)),
+            ("last 30 days", dict(since=last - datetime.timedelta(days=30))),
+            ("keyword in a year", dict(words="exchange", since=last - datetime.timedelta(days=365), until=last)),
+            ("keyword, all results", dict(words="attackers", limit=None)),
+        ]
+        failed = False
+        print(f"{'query':<24}{'best ms':>9}{'results':>9}")
+        for name, kwargs in queries:
+            ms, results = best_ms(lambda: archive.search(**kwargs), args.repeat)
+            flag = "  OVER BUDGET" if ms > args.budget_ms else ""
+            failed |= bool(flag)
+            print(f"{name:<24}{ms:>9.1f}{len(results):>9}{flag}")
+        archive.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
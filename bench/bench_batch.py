@@ -0,0 +1,56 @@
+"""
+Benchmark: batched JSON summarisation vs one prompt per article, against bench/fake_genai.FakeModel.
+
+    python bench/bench_batch.py [--articles 40] [--batch-sizes 1 5 10] [--malformed-rate 0.1]
+                                [--misnumber-rate 0.2]
+
+The fake model charges a fixed per-request latency plus a smaller per-article cost, which
+is what makes batching pay off against the real API too. Some replies come back shifted by
+one article; every summary must still belong to its own article, or the script exits 1.
+"""
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GENAI_API_KEY", "offline-benchmark")
+os.environ.setdefault("DIGEST_STATE_DIR", tempfile.mkdtemp(prefix="digest-bench-"))
+os.environ.setdefault("LLM_CACHE_BYPASS", "1")
+
+from agent import summarise_rss  # noqa: E402
+from bench_summarise import make_articles  # noqa: E402
+from fake_genai import FakeModel  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--latency", type=float, default=0.5, help="fixed fake seconds per request")
+    parser.add_argument("--per-article", type=float, default=0.05, help="extra fake seconds per article in a request")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="share of batch entries returned broken")
+    parser.add_argument("--misnumber-rate", type=float, default=0.2, help="share of batch replies shifted by one article")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles)
+    failed = False
+    print(f"{'batch':>6}{'wall s':>9}{'requests':>10}{'fallbacks':>11}{'ordered':>9}{'matched':>9}")
+    for batch_size in args.batch_sizes:
+        model = FakeModel(f"models/fake-batch-{batch_size}", latency=args.latency, latency_per_article=args.per_article,
+                          malformed_rate=args.malformed_rate, misnumber_rate=args.misnumber_rate, seed=batch_size)
+        start = time.perf_counter()
+        results = summarise_rss(articles, bullets=len(articles), model=model, max_workers=args.workers, batch_size=batch_size)
+        wall = time.perf_counter() - start
+        fallbacks = sum(not r["bullets"] for r in results)
+        ordered = [r["link"] for r in results] == [a["link"] for a in articles]
+        matched = all(a["title"][:40] in r["rundown_text"] for a, r in zip(articles, results) if r["bullets"])
+        failed |= not (ordered and matched)
+        print(f"{batch_size:>6}{wall:>9.2f}{model.calls:>10}{fallbacks:>11}{str(ordered):>9}{str(matched):>9}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: deduplicate_articles, exact all-pairs Jaccard vs MinHash/LSH.
+
+    python bench/bench_dedup.py [--sizes 100 500 1000 2000 5000] [--exact-max 2000]
+
+Articles are synthetic: a pool of distinct stories plus reworded copies (a few words
+swapped/added) so roughly a third of the input is a near-duplicate of something earlier.
+Agreement is measured against the exact engine's kept set.
+"""
+from __future__ import annotations
+import argparse, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from dedup import deduplicate_articles  # noqa: E402
+
+VOCAB = [f"w{i}" for i in range(20000)] + ["ransomware", "cve", "exploit", "patch", "phishing", "botnet", "zero-day"]
+
+
+def make_articles(n: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    articles = []
+    for _ in range(n):
+        if articles and rng.random() < 0.33:
+            src = rng.choice(articles)["summary"].split()
+            for _ in range(rng.randint(1, 4)): # light rewording: swap a few words, append one
+                src[rng.randrange(len(src))] = rng.choice(VOCAB)
+            src.append(rng.choice(VOCAB))
+            words = src
+        else:
+            words = rng.sample(VOCAB, rng.randint(40, 80))
+        text = " ".join(words)
+        articles.append({"title": " ".join(words[:8]), "summary": text})
+    return articles
+
+
+def run(engine: str, articles: list[dict], **kwargs) -> tuple[float, list[dict]]:
+    start = time.perf_counter()
+    kept = deduplicate_articles(articles, similarity_threshold=0.7, engine=engine, **kwargs)
+    return time.perf_counter() - start, kept
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000])
+    parser.add_argument("--exact-max", type=int, default=2000, help="skip the quadratic engine above this size")
+    args = parser.parse_args()
+
+    print(f"{'articles':>9}{'exact s':>10}{'minhash+verify s':>18}{'minhash s':>11}{'kept exact':>12}{'agree verify':>14}{'agree est.':>12}")
+    for n in args.sizes:
+        articles = make_articles(n)
+        t_v, kept_v = run("minhash", articles, verify=True)
+        t_m, kept_m = run("minhash", articles, verify=False)
+        if n <= args.exact_max:
+            t_e, kept_e = run("exact", articles)
+            ref = {id(a) for a in kept_e}
+            agree = lambda kept: f"{len(ref & {id(a) for a in kept}) / len(ref | {id(a) for a in kept}):.1%}"
+            print(f"{n:>9}{t_e:>10.3f}{t_v:>18.3f}{t_m:>11.3f}{len(kept_e):>12}{agree(kept_v):>14}{agree(kept_m):>12}")
+        else:
+            print(f"{n:>9}{'-':>10}{t_v:>18.3f}{t_m:>11.3f}{'-':>12}{'-':>14}{'-':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Benchmark: the whole daily run offline — local RSS server, fake Gemini, captured Gmail send.
+
+    python bench/bench_e2e.py [--scales 3x25 50x50 500x100] [--repeat 3] [--llm-latency 0.2]
+                              [--save NAME] [--compare NAME] [--tolerance 0.15]
+
+Each scale is FEEDSxITEMS. Every run is a fresh subprocess with its own state directory, so peak
+memory and caches don't leak between runs. The real agent.build_pipeline stages run unchanged:
+rss.FEEDS points at bench/feed_server.py, genai.GenerativeModel is bench/fake_genai.FakeModel and
+agent.send_html_email is replaced by a sink that keeps the message. Reports wall time, feed
+entries parsed per second, peak RSS and per-stage / per-span latency percentiles. --save writes
+bench/baselines/NAME.json; --compare NAME prints the change against it and exits 1 if wall time,
+throughput or peak memory regressed by more than --tolerance.
+"""
+from __future__ import annotations
+import argparse, datetime, json, os, platform, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+BASELINE_DIR = ROOT / "baselines"
+RESULT_MARKER = "E2E_RESULT "
+SPANS = ("rss.feed", "dedup", "rank", "images", "llm.generate", "render") # span percentiles worth tracking
+
+
+def run_one(args) -> None:
+    """Child process: one full pipeline run; prints a single JSON result line."""
+    os.environ["DIGEST_STATE_DIR"] = tempfile.mkdtemp(prefix="digest-e2e-")
+    os.environ["GENAI_API_KEY"] = "offline-benchmark"
+    os.environ["LLM_CACHE_BYPASS"] = "1"
+    os.environ["GMAIL_RECIPIENTS"] = "bench@example.com" # audiences without recipients are not sent
+    sys.path.insert(0, str(ROOT.parent / "bot"))
+    sys.path.insert(0, str(ROOT))
+    import resource
+
+    import agent, llm, rss
+    from fake_genai import FakeModel
+    from metrics import TRACER
+    from sent_index import SentIndex
+
+    rss.FEEDS = [f"{args.server}/feeds/{args.items}/{i}.xml" for i in range(args.feeds)]
+    llm.genai.configure = lambda **kwargs: None
+    llm.genai.GenerativeModel = lambda model_name, **kwargs: FakeModel(model_name, latency=args.llm_latency, jitter=args.llm_latency / 4)
+    sent = []
+    agent.send_html_email = lambda subject, html, recipients=None: sent.append((subject, html))
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    TRACER.reset()
+    t = time.perf_counter()
+    pipeline = agent.build_pipeline(SentIndex(), datetime.date.today().strftime("%d %b %Y"))
+    pipeline.run()
+    wall = time.perf_counter() - t
+    time.sleep(0.2) # let feed workers cut short by an early stop close their spans
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KiB on Linux
+
+    summary = TRACER.summary()
+    feeds = [s for s in TRACER.spans if s.name == "rss.feed"]
+    entries = sum(s.items_in for s in feeds) # entries actually parsed, whichever fetch path ran
+    result = {
+        "wall_s": wall,
+        "entries": entries,
+        "entries_per_s": entries / wall,
+        "feeds_failed": sum(1 for s in feeds if s.attrs.get("status") != "ok"),
+        "feed_mb": sum(s.bytes_in for s in feeds) / 1e6,
+        "peak_rss_mb": peak / 1024,
+        "rss_growth_mb": (peak - rss_before) / 1024,
+        "stories": summary.get("render", {}).get("items_out", 0),
+        "email_kb": sum(len(html.encode()) for _, html in sent) / 1024,
+        "stages": {name: stage.elapsed for name, stage in pipeline.stages.items()},
+        "spans": {name: {"n": summary[name]["count"], "p50_s": summary[name]["p50_s"], "p95_s": summary[name]["p95_s"]}
+                  for name in SPANS if name in summary},
+    }
+    print(RESULT_MARKER + json.dumps(result))
+
+
+def _pct(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def aggregate(runs: list) -> dict:
+    """Median of the headline numbers across repeats; p50/p95 of each stage's time across repeats."""
+    out = {k: statistics.median(r[k] for r in runs) for k in
+           ("wall_s", "entries", "entries_per_s", "feeds_failed", "feed_mb", "peak_rss_mb", "rss_growth_mb", "stories", "email_kb")}
+    out["repeat"] = len(runs)
+    out["stages"] = {name: {"p50_s": _pct([r["stages"][name] for r in runs], 50), "p95_s": _pct([r["stages"][name] for r in runs], 95)}
+                     for name in runs[0]["stages"]}
+    out["spans"] = {name: {k: statistics.median(r["spans"][name][k] for r in runs if name in r["spans"]) for k in ("n", "p50_s", "p95_s")}
+                    for name in runs[0]["spans"]}
+    return out
+
+
+def print_report(results: dict) -> None:
+    print(f"{'scale':>9}{'wall':>9}{'entries':>9}{'entries/s':>11}{'failed':>8}{'feed MB':>9}{'peak MB':>9}{'email KB':>10}")
+    for scale, r in results.items():
+        print(f"{scale:>9}{r['wall_s']:>8.2f}s{r['entries']:>9.0f}{r['entries_per_s']:>11.0f}{r['feeds_failed']:>8.0f}"
+              f"{r['feed_mb']:>9.1f}{r['peak_rss_mb']:>9.0f}{r['email_kb']:>10.1f}")
+    for scale, r in results.items():
+        print(f"\n{scale + ' latency':<26}{'p50':>9}{'p95':>9}")
+        for name, m in r["stages"].items():
+            print(f"  {'stage.' + name:<24}{m['p50_s']:>8.3f}s{m['p95_s']:>8.3f}s")
+        for name, m in r["spans"].items():
+            print(f"  {name:<24}{m['p50_s']:>8.3f}s{m['p95_s']:>8.3f}s  (n={m['n']:.0f})")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the change per scale; True if anything regressed beyond tolerance."""
+    regressed = False
+    print(f"\nvs baseline from {baseline['created']} ({baseline['machine']}):")
+    checks = [("wall_s", "wall", False), ("entries_per_s", "entries/s", True), ("peak_rss_mb", "peak MB", False)]
+    for scale, r in results.items():
+        base = baseline["results"].get(scale)
+        if not base:
+            print(f"{scale:>9}  (not in baseline)")
+            continue
+        cells = []
+        for key, label, higher_is_better in checks:
+            change = r[key] / base[key] - 1 if base[key] else 0.0
+            worse = -change if higher_is_better else change
+            flag = " REGRESSION" if worse > tolerance else ""
+            regressed |= bool(flag)
+            cells.append(f"{label} {base[key]:.2f}→{r[key]:.2f} ({change:+.0%}){flag}")
+        print(f"{scale:>9}  " + "; ".join(cells))
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=["3x25", "50x50", "500x100"], help="FEEDSxITEMS per run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model seconds per call")
+    parser.add_argument("--save", metavar="NAME", help="write results to bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against bench/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression before --compare fails")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    # internal: one measured run, spawned by the parent
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    parser.add_argument("--feeds", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--items", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one:
+        return run_one(args)
+
+    sys.path.insert(0, str(ROOT))
+    from feed_server import FeedServer
+    server = FeedServer().start() # lives in this process so its memory isn't counted
+
+    results = {}
+    for scale in args.scales:
+        feeds, items = (int(x) for x in scale.lower().split("x"))
+        runs = []
+        for i in range(args.repeat):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--run-one", "--server", server.url, "--feeds", str(feeds),
+                 "--items", str(items), "--llm-latency", str(args.llm_latency)],
+                capture_output=True, text=True,
+            )
+            if args.verbose or proc.returncode:
+                sys.stdout.write(proc.stdout)
+                sys.stderr.write(proc.stderr)
+            if proc.returncode:
+                sys.exit(f"run {i + 1} at {scale} failed")
+            line = next(l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER))
+            runs.append(json.loads(line[len(RESULT_MARKER):]))
+            print(f"{scale} run {i + 1}/{args.repeat}: {runs[-1]['wall_s']:.2f}s", file=sys.stderr)
+        results[scale] = aggregate(runs)
+    server.shutdown()
+
+    print_report(results)
+    regressed = False
+    if args.compare:
+        regressed = compare(results, json.loads((BASELINE_DIR / f"{args.compare}.json").read_text()), args.tolerance)
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps({
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "machine": f"{platform.node()} {platform.machine()} {os.cpu_count()} cpu, Python {platform.python_version()}",
+            "args": {"repeat": args.repeat, "llm_latency": args.llm_latency},
+            "results": results,
+        }, indent=1))
+        print(f"\nBaseline saved to {path}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Micro-benchmark: per-entry HTML extraction, old BeautifulSoup path vs bot/extract.py.
+
+    python bench/bench_extract.py [--repeat 20]
+
+Feeds are parsed once up front from bench/fixtures/*.xml; only the entry -> item step is timed.
+With selectolax installed it also checks that both backends give every fixture fragment (each
+entry's summary and content) the same text, image URL and sanitized HTML, and exits 1 if not.
+"""
+from __future__ import annotations
+import argparse, re, sys, time
+from pathlib import Path
+
+import feedparser
+from bs4 import BeautifulSoup
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+
+import extract  # noqa: E402
+from rss import entry_to_item  # noqa: E402
+
+
+def legacy_entry_to_item(e) -> dict:
+    """The pre-extract.py body of today_items' entry loop, kept verbatim as the baseline."""
+    title = e.get("title", "").strip()
+    link = e.get("link", "").strip()
+    image_url = ""
+    summary_content_html = ""
+    raw_summary = e.get("summary", "")
+    if 'content' in e and isinstance(e.content, list) and len(e.content) > 0 and 'value' in e.content[0]:
+        summary_content_html = e.content[0].value
+    elif 'content' in e and isinstance(e.content, dict) and 'value' in e.content:
+        summary_content_html = e.content.value
+    if summary_content_html:
+        content_soup = BeautifulSoup(summary_content_html, 'html.parser')
+        img_tag = content_soup.find('img')
+        if img_tag and 'src' in img_tag.attrs:
+            image_url = img_tag['src']
+    if not image_url and 'media_content' in e:
+        for media in e.media_content:
+            if 'url' in media and media.get('type', '').startswith('image/'):
+                image_url = media['url']
+                break
+    if not image_url and 'enclosures' in e:
+        for enc in e.enclosures:
+            if 'href' in enc and enc.get('type', '').startswith('image/'):
+                image_url = enc['href']
+                break
+    if not image_url and raw_summary:
+        summary_soup_for_img = BeautifulSoup(raw_summary, 'html.parser')
+        img_tag_in_summary = summary_soup_for_img.find('img')
+        if img_tag_in_summary and 'src' in img_tag_in_summary.attrs:
+            image_url = img_tag_in_summary['src']
+    if not summary_content_html and raw_summary:
+        summary_content_html = raw_summary
+    plain_text_summary = re.sub(r'<.*?>', '', raw_summary).strip()
+    return {"title": title, "summary": plain_text_summary, "link": link, "image_url": image_url,
+            "summary_content_html": summary_content_html}
+
+
+def fragments(entries) -> list:
+    """Every HTML fragment extract() sees for these entries."""
+    out = []
+    for e in entries:
+        out += [e.get("summary", "")] + [c.get("value", "") for c in e.get("content", [])]
+    return [f for f in out if f]
+
+
+def parity_mismatches(entries) -> list:
+    """(field, html.parser value, lexbor value) for every fragment the two backends extract differently."""
+    mismatches = []
+    for fragment in fragments(entries):
+        a, b = extract.extract(fragment, "html.parser"), extract.extract(fragment, "lexbor")
+        mismatches += [(name, x, y) for name, x, y in (("text", a.text, b.text), ("image_url", a.image_url, b.image_url),
+                                                       ("html", a.html, b.html)) if x != y]
+    return mismatches
+
+
+def time_it(fn, entries, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for e in entries:
+            fn(e)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="runs per variant; the best one is reported")
+    args = parser.parse_args()
+
+    backends = ["html.parser"] + (["lexbor"] if extract.LexborHTMLParser is not None else [])
+    failed = False
+    print(f"{'fixture':<22}{'entries':>8}{'legacy ms':>12}" + "".join(f"{b + ' ms':>16}{'speedup':>9}" for b in backends))
+    for path in sorted((ROOT / "fixtures").glob("*.xml")):
+        entries = feedparser.parse(path.read_bytes()).entries
+        legacy = time_it(legacy_entry_to_item, entries, args.repeat)
+        row = f"{path.stem:<22}{len(entries):>8}{legacy * 1000:>12.2f}"
+        for backend in backends:
+            extract.BACKEND = backend
+            new = time_it(entry_to_item, entries, args.repeat)
+            row += f"{new * 1000:>16.2f}{legacy / new:>8.1f}x"
+            mismatched = sum(legacy_entry_to_item(e)["image_url"] != entry_to_item(e)["image_url"] for e in entries)
+            if mismatched:
+                row += f" ({mismatched} image mismatches)"
+        print(row)
+        if "lexbor" in backends:
+            for name, stdlib, lexbor in parity_mismatches(entries)[:3]:
+                at = next((i for i, (x, y) in enumerate(zip(stdlib, lexbor)) if x != y), min(len(stdlib), len(lexbor)))
+                print(f"  BACKENDS DIFFER on {name} at char {at}:\n    html.parser: {stdlib[max(0, at - 60):at + 60]!r}\n"
+                      f"    lexbor:      {lexbor[max(0, at - 60):at + 60]!r}")
+                failed = True
+    if "lexbor" not in backends:
+        print("selectolax not installed: backend parity not checked")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
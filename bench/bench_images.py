@@ -0,0 +1,79 @@
+"""
+Benchmark and check: the image stage (bot/images.py) against bench/feed_server.py's images.
+
+    python bench/bench_images.py [--stories 40] [--workers 8] [--slow 2]
+
+Every story offers its feed image first and the media:content image second, as rss.entry_to_item
+collects them; a few more offer only an oversized, undersized, slow, non-http or unreachable
+image. Runs pick_images cold (empty cache) and warm, reports wall time and requests the server
+saw, and checks each story got the image it should: the feed image when it is good, the
+fallback after a tracking pixel, HTML page or 404, none when every candidate is bad. The warm
+run must not reach the server at all. Exits 1 on any mismatch.
+"""
+from __future__ import annotations
+import argparse, socket, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+
+from feed_server import FeedServer  # noqa: E402
+from images import ImageCache, pick_images  # noqa: E402
+
+
+def closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_articles(base: str, stories: int, slow: int) -> list:
+    """(article, expected image URL or "") pairs."""
+    cases = []
+    for story_id in range(stories):
+        story, alt = f"{base}/images/story/{story_id}.jpg", f"{base}/images/alt/{story_id}.jpg"
+        cases.append(({"link": f"https://example.com/news/{story_id}", "image_candidates": [story, alt]},
+                      alt if story_id % 10 in (0, 1, 2) else story))
+    dead = f"http://127.0.0.1:{closed_port()}/image.jpg"
+    for i, url in enumerate([f"{base}/images/huge/1.jpg", f"{base}/images/small/1.jpg", "data:image/png;base64,AAAA", dead]):
+        cases.append(({"link": f"https://example.com/bad/{i}", "image_url": url}, ""))
+    for i in range(slow):
+        cases.append(({"link": f"https://example.com/slow/{i}", "image_candidates": [f"{base}/images/slow/{i}.jpg", f"{base}/images/alt/{i}.jpg"]},
+                      f"{base}/images/alt/{i}.jpg"))
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stories", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--slow", type=int, default=2, help="stories whose first image times out")
+    args = parser.parse_args()
+
+    server = FeedServer().start()
+    cases = make_articles(server.url, args.stories, args.slow)
+    articles = [article for article, _ in cases]
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="digest-images-") as tmp:
+        cache = ImageCache(Path(tmp) / "image_cache.sqlite3")
+        for run in ("cold", "warm"):
+            before = server.image_requests
+            start = time.perf_counter()
+            found = pick_images(articles, cache=cache, max_workers=args.workers)
+            wall = time.perf_counter() - start
+            requests = server.image_requests - before
+            wrong = [(a["link"], (found[a["link"]].url if found[a["link"]] else ""), want)
+                     for a, want in cases if (found[a["link"]].url if found[a["link"]] else "") != want]
+            print(f"{run:<5} {wall:>6.2f}s  {requests:>4} image requests  {sum(1 for f in found.values() if f)}/{len(articles)} stories with an image")
+            for link, got, want in wrong[:5]:
+                print(f"  WRONG {link}: got {got or 'no image'}, expected {want or 'no image'}")
+            failed |= bool(wrong) or (run == "warm" and requests > 0)
+        print(f"cache: {len(cache)} URL(s), {cache.hits} hit(s), {cache.misses} miss(es)")
+        cache.close()
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
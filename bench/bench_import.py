@@ -0,0 +1,88 @@
+"""
+Import-time regression check: cold-start cost of the bot's entry points, from `python -X importtime`.
+
+    python bench/bench_import.py [--repeat 3] [--scale 1.0] [--top 8]
+
+Each scenario runs in a fresh interpreter with the Gemini/Gmail secrets removed from the
+environment. Modules the interpreter loads at startup (measured with `python -c pass`) are not
+counted. A scenario fails if it imports anything on FORBIDDEN (those stacks must stay lazy) or
+if its best-of-repeat import time is over budget × --scale (raise --scale on slow machines).
+Exits 1 on any failure; --top lists the heaviest imports of each scenario.
+"""
+from __future__ import annotations
+import argparse, json, os, subprocess, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+AGENT = ROOT / "bot" / "agent.py"
+# Heavy stacks that only the fetch, summarise and send paths may load.
+FORBIDDEN = ("google.generativeai", "google.api_core", "googleapiclient", "requests", "feedparser", "numpy")
+SECRETS = ("GENAI_API_KEY", "GMAIL_REFRESH_TOKEN", "GMAIL_CLIENT_ID", "GMAIL_CLIENT_SECRET", "GMAIL_SENDER", "GMAIL_RECIPIENTS")
+
+
+def scenarios(workdir: Path) -> list:
+    """(name, argv after the interpreter, budget in ms)."""
+    stories = workdir / "stories.json"
+    stories.write_text(json.dumps([
+        {"title": f"Story {i} CVE-2025-{1000 + i}", "summary": "Attackers exploit a flaw. Patch now.",
+         "link": f"https://example.com/{i}", "image_url": ""} for i in range(5)
+    ]))
+    return [
+        ("import agent", ["-c", f"import sys; sys.path.insert(0, {str(AGENT.parent)!r}); import agent"], 150),
+        ("agent.py --help", [str(AGENT), "--help"], 150),
+        ("render --dry-run", [str(AGENT), "render", "--dry-run", "--input", str(stories), "--out", str(workdir / "digest.html")], 250),
+    ]
+
+
+def import_times(argv: list, env: dict, cwd: Path) -> dict:
+    """{module: (self µs, cumulative µs, top level?)} from one `-X importtime` run."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], capture_output=True, text=True, env=env, cwd=cwd)
+    if proc.returncode:
+        errors = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))
+        sys.exit(f"`{' '.join(argv)}` failed:\n{proc.stdout}{errors}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us), not name[1:].startswith(" "))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=float(os.environ.get("IMPORT_BUDGET_SCALE", 1.0)), help="multiply every budget")
+    parser.add_argument("--top", type=int, default=8, help="heaviest imports to list per scenario")
+    args = parser.parse_args()
+
+    env = {k: v for k, v in os.environ.items() if k not in SECRETS}
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="digest-import-") as tmp:
+        workdir = Path(tmp)
+        env["DIGEST_STATE_DIR"] = str(workdir / "state")
+        startup = set(import_times(["-c", "pass"], env, workdir))
+        print(f"{'scenario':<20}{'import ms':>10}{'budget':>9}  heaviest (cumulative ms)")
+        for name, argv, budget_ms in scenarios(workdir):
+            best = None
+            for _ in range(args.repeat):
+                times = import_times(argv, env, workdir)
+                total = sum(cum for mod, (_, cum, top) in times.items() if top and mod not in startup) / 1000
+                if best is None or total < best[0]:
+                    best = (total, times)
+            total, times = best
+            ours = {mod: t for mod, t in times.items() if mod not in startup}
+            heavy = sorted(((t[1], mod) for mod, t in ours.items() if t[2]), reverse=True)[:args.top]
+            print(f"{name:<20}{total:>10.1f}{budget_ms * args.scale:>9.0f}  " + ", ".join(f"{mod} {us / 1000:.1f}" for us, mod in heavy))
+            leaked = sorted(mod for mod in ours if any(mod == f or mod.startswith(f + ".") for f in FORBIDDEN))
+            if leaked:
+                failed = True
+                print(f"  FAIL: imports {', '.join(leaked[:6])}{' …' if len(leaked) > 6 else ''}")
+            if total > budget_ms * args.scale:
+                failed = True
+                print(f"  FAIL: {total:.1f} ms is over the {budget_ms * args.scale:.0f} ms budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
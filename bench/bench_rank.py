@@ -0,0 +1,74 @@
+"""
+Benchmark: rank.rank_articles on thousands of candidates.
+
+    python bench/bench_rank.py [--sizes 500 2000 5000 10000] [--repeat 5] [--top 5]
+
+Candidates are bench/feed_server.py stories (same titles and bodies the end-to-end benchmark
+serves) spread over 50 feeds, with random publish times in the last day and random dedup
+coverage. Reports ranking time cold (articles never tokenized) and warm (token sets already
+memoized by dedup, as in the pipeline), and how the top picks differ from plain feed order
+(CVE share, mean coverage, mean age).
+"""
+from __future__ import annotations
+import argparse, datetime, random, statistics, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+
+from dedup import TOKEN_CACHE  # noqa: E402
+from feed_server import _story  # noqa: E402
+from rank import mentions_cve, rank_articles  # noqa: E402
+
+
+def make_articles(n: int, now: datetime.datetime, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    articles = []
+    for i in range(n):
+        title, body, _ = _story(i * 7919)
+        articles.append({
+            "title": title,
+            "summary": body[:600],
+            "link": f"https://feed{i % 50}.example.com/news/{i}",
+            "feed": f"https://feed{i % 50}.example.com/rss",
+            "published": (now - datetime.timedelta(minutes=rng.uniform(0, 24 * 60))).isoformat(),
+            "coverage": rng.choices([1, 2, 3, 4], weights=[80, 12, 6, 2])[0],
+        })
+    return articles
+
+
+def describe(picks: list[dict], now: datetime.datetime) -> str:
+    cve = sum(mentions_cve(a) for a in picks) / len(picks)
+    coverage = statistics.mean(a["coverage"] for a in picks)
+    age = statistics.mean((now - datetime.datetime.fromisoformat(a["published"])).total_seconds() / 3600 for a in picks)
+    return f"cve {cve:>4.0%}  coverage {coverage:.1f}  age {age:>4.1f}h"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    weights = {f"https://feed{i}.example.com/rss": 1.5 if i % 10 == 0 else 1.0 for i in range(50)}
+    print(f"{'articles':>9}{'cold':>10}{'warm':>10}  top {args.top}: ranked vs feed order")
+    for n in args.sizes:
+        articles = make_articles(n, now)
+        cold, warm = [], []
+        for _ in range(args.repeat):
+            TOKEN_CACHE.clear()
+            start = time.perf_counter()
+            rank_articles(articles, now=now, source_weights=weights)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ranked = rank_articles(articles, now=now, source_weights=weights)
+            warm.append(time.perf_counter() - start)
+        print(f"{n:>9}{min(cold) * 1000:>8.1f}ms{min(warm) * 1000:>8.1f}ms  "
+              f"{describe(ranked[:args.top], now)}  |  {describe(articles[:args.top], now)}")
+
+
+if __name__ == "__main__":
+    main()
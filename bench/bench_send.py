@@ -0,0 +1,63 @@
+"""
+Benchmark: Gmail delivery, one message per recipient, against the local bench/fake_gmail server.
+
+    python bench/bench_send.py [--recipients 200] [--latency 0.05] [--error-rate 0.1] [--batch-sizes 1 10 50]
+
+Batch size 1 with one worker is the old one-request-per-message path. Checks that every recipient
+gets exactly one message despite injected 503s (failed recipients are retried, sent ones aren't).
+Each sender sends twice; "conns" counts the TCP connections the server accepted over both, which
+stays at most the worker count when connections are kept across sends and retry rounds.
+"""
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from fake_gmail import FakeGmail  # noqa: E402
+from send_email import GmailSender, GoogleApiTransport  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server seconds per HTTP request")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="share of messages answered with a 503")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    recipients = [f"reader{i}@example.com" for i in range(args.recipients)]
+    html = lambda rcpt: f"<html><body><p>Hello {rcpt}</p></body></html>"  # noqa: E731
+
+    t = time.perf_counter()
+    transport = GoogleApiTransport(AnonymousCredentials(), api_endpoint="http://127.0.0.1:1")
+    print(f"transport setup (bundled discovery doc): {(time.perf_counter() - t) * 1000:.1f} ms\n")
+    transport.close()
+
+    failed = False
+    print(f"{'batch':>6}{'workers':>8}{'time':>9}{'requests':>10}{'503s':>6}{'delivered':>11}{'dupes':>7}{'conns':>7}")
+    for batch_size in args.batch_sizes:
+        workers = 1 if batch_size == 1 else args.workers
+        server = FakeGmail(latency=args.latency, error_rate=args.error_rate, seed=batch_size).start()
+        sender = GmailSender(GoogleApiTransport(AnonymousCredentials(), api_endpoint=server.url),
+                             sender="digest@example.com", batch_size=batch_size, max_workers=workers)
+        t = time.perf_counter()
+        outcome = sender.send_personalized("Digest", recipients, html)
+        elapsed = time.perf_counter() - t
+        sender.send_personalized("Digest", recipients, html) # second send: must reuse the connections
+        sender.close()
+        server.shutdown()
+        delivered = sum(1 for _, err in outcome.values() if err is None)
+        dupes = sum(n - 2 for n in server.delivered.values())
+        failed |= dupes != 0 or server.connections > workers
+        print(f"{batch_size:>6}{workers:>8}{elapsed:>8.2f}s{server.requests:>10}{server.errors:>6}{delivered:>11}{dupes:>7}{server.connections:>7}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
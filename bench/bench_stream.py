@@ -0,0 +1,58 @@
+"""
+Check and benchmark: streaming fetch (rss.iter_items) with more feeds than fetch workers.
+
+    python bench/bench_stream.py [--feeds 12] [--items 250] [--max-items 100] [--workers 8] [--deadline 3]
+
+Every feed has more fresh entries than --max-items, so workers that waited on the consumer would
+hold the pool while later feeds never start. Checks that iter_items returns --max-items items in
+the same order as the whole-feed path, well inside the deadline; then that with one feed stalled
+past the deadline it still yields what the other feeds delivered. Exits 1 on any failure.
+"""
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "bot"))
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DIGEST_STATE_DIR", tempfile.mkdtemp(prefix="digest-stream-"))
+
+import rss  # noqa: E402
+from feed_server import FeedServer  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=12)
+    parser.add_argument("--items", type=int, default=250, help="entries per feed")
+    parser.add_argument("--max-items", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    args = parser.parse_args()
+
+    server = FeedServer(spacing=1.0).start() # a story a minute: every entry is inside the 24h window
+    rss.FEEDS[:] = server.feed_urls(args.feeds, args.items)
+    failed = False
+
+    def run(label: str, check_order: bool) -> None:
+        nonlocal failed
+        start = time.perf_counter()
+        items = list(rss.iter_items(max_items=args.max_items, use_cache=False, deadline=args.deadline, max_workers=args.workers))
+        wall = time.perf_counter() - start
+        feeds = len({item["feed"] for item in items})
+        ok = len(items) == args.max_items and wall < args.deadline + 1
+        if check_order:
+            whole = rss.today_items(max_items=args.max_items, use_cache=False, stream=False)
+            ok &= [item["title"] for item in items] == [item["title"] for item in whole]
+        failed |= not ok
+        print(f"{label:<28}{len(items):>6} items from {feeds:>3} feed(s) in {wall:>5.2f}s  {'ok' if ok else 'FAILED'}")
+
+    run(f"{args.feeds} feeds, {args.workers} workers", check_order=True)
+    server.stalled, server.stall_seconds = {0}, args.deadline + 2
+    run("feed 0 past the deadline", check_order=False)
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
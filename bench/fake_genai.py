@@ -0,0 +1,91 @@
+"""
+Local stand-in for google.generativeai.GenerativeModel: configurable latency and injected
+transient errors, no network. Used by the bench/ scripts.
+"""
+from __future__ import annotations
+import json, random, re, threading, time
+
+from google.api_core import exceptions as google_exceptions
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """
+    generate_content() sleeps `latency` (± `jitter`) seconds and then either raises
+    ServiceUnavailable (with probability `error_rate`) or returns a title / radar sentence /
+    bullets reply built from the prompt's Title line(s). Batch prompts (asking for a JSON array)
+    get a JSON reply; `malformed_rate` is the chance each object in it is broken,
+    `misnumber_rate` the chance a whole reply comes back with its objects shifted by one place
+    (ids still counting up), and `latency_per_article` adds time per article in the prompt.
+    """
+
+    def __init__(self, model_name: str = "models/fake", latency: float = 0.2, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, malformed_rate: float = 0.0,
+                 latency_per_article: float = 0.0, misnumber_rate: float = 0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.latency_per_article = latency_per_article
+        self.misnumber_rate = misnumber_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def reply(self, prompt: str) -> str:
+        titles = re.findall(r"^Title: (.*)$", prompt, re.MULTILINE) or ["Today's news"]
+        if "JSON array" not in prompt:
+            title = titles[0]
+            return (
+                f"🛡️ {title[:60]}\n"
+                f"Researchers describe what happened in {title[:40]} and why defenders should care.\n"
+                "* Patch affected systems as soon as the vendor fix is available.\n"
+                "* Hunt for the published indicators of compromise in recent logs.\n"
+            )
+        objects = []
+        for i, title in enumerate(titles):
+            obj = {
+                "id": i,
+                "source": " ".join(title.split()[:5]),
+                "title": f"🛡️ {title[:60]}",
+                "radar": f"Researchers describe what happened in {title[:40]} and why defenders should care.",
+                "bullets": ["Patch affected systems as soon as the vendor fix is available.",
+                            "Hunt for the published indicators of compromise in recent logs."],
+            }
+            with self._lock:
+                broken = self._rng.random() < self.malformed_rate
+            if broken:
+                obj["bullets"] = "not a list"
+            objects.append(obj)
+        with self._lock:
+            misnumbered = len(objects) > 1 and self._rng.random() < self.misnumber_rate
+        if misnumbered: # first article skipped, the rest moved up a place, a made-up one at the end
+            objects = [dict(obj, id=i) for i, obj in enumerate(objects[1:] + [dict(objects[0], source="Unrelated story")])]
+        return json.dumps(objects, ensure_ascii=False)
+
+    def generate_content(self, prompt: str, **kwargs) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            articles = max(1, prompt.count("\nTitle: "))
+            delay = max(0.0, self.latency + articles * self.latency_per_article + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+        try:
+            time.sleep(delay)
+            if fail:
+                with self._lock:
+                    self.errors += 1
+                raise google_exceptions.ServiceUnavailable("fake model: injected outage")
+            return FakeResponse(self.reply(prompt))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the Gmail API send endpoints, no network: single sends on
+/gmail/v1/users/me/messages/send and multipart batch requests on /batch. Used by the bench/
+scripts through send_email.GoogleApiTransport(api_endpoint=server.url).
+"""
+from __future__ import annotations
+import base64, email, json, random, threading, time
+from email import policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+SEND_PATH = "/gmail/v1/users/me/messages/send"
+
+
+class FakeGmail(ThreadingHTTPServer):
+    """
+    Accepts every message (recording its To: header) after `latency` seconds per HTTP request,
+    except that each message fails with a 503 with probability `error_rate`.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, seed: int = 0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.delivered: Dict[str, int] = {} # recipient -> messages received
+        self.requests = 0
+        self.connections = 0 # TCP connections accepted
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeGmail":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def send_one(self, body: bytes) -> Tuple[int, dict]:
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return 503, {"error": {"code": 503, "message": "Backend Error", "status": "UNAVAILABLE"}}
+        raw = json.loads(body)["raw"]
+        message = email.message_from_bytes(base64.urlsafe_b64decode(raw), policy=policy.default)
+        with self._lock:
+            self.delivered[message["To"]] = self.delivered.get(message["To"], 0) + 1
+            msg_id = f"fake{sum(self.delivered.values()):08x}"
+        return 200, {"id": msg_id, "threadId": msg_id, "labelIds": ["SENT"]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real endpoint
+    server: FakeGmail
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server._lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            path = self.path.split("?", 1)[0]
+            if path == SEND_PATH:
+                status, payload = server.send_one(body)
+                self._reply(status, "application/json", json.dumps(payload).encode())
+            elif path == "/batch":
+                self._batch(body)
+            else:
+                self._reply(404, "application/json", b'{"error": {"code": 404}}')
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+    def _batch(self, body: bytes) -> None:
+        envelope = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body, policy=policy.compat32
+        )
+        parts: List[str] = []
+        for part in envelope.get_payload():
+            # Each part is a serialized HTTP request: request line, headers, blank line, JSON body.
+            inner = part.get_payload()
+            _, _, inner_body = inner.replace("\r\n", "\n").partition("\n\n")
+            status, payload = self.server.send_one(inner_body.encode())
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"Content-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Service Unavailable'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        boundary = "batch_fake_gmail"
+        out = "".join(f"--{boundary}\r\n{p}" for p in parts) + f"--{boundary}--\r\n"
+        self._reply(200, f"multipart/mixed; boundary={boundary}", out.encode())
+
+    def _reply(self, status: int, content_type: str, payload: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
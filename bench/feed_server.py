@@ -0,0 +1,206 @@
+"""
+Local RSS server for the bench/ scripts, no network: GET /feeds/<items>/<feed>.xml returns a
+generated RSS 2.0 feed with <items> entries shaped like the production sources (HTML
+description, content:encoded with an image, one story every `spacing` minutes going back from
+server start, newest first). Every 10th story also appears in the neighbouring feed under a
+slightly different headline, so dedup has cross-feed duplicates to find. Feeds carry an ETag and
+answer If-None-Match with 304 until bump() publishes new stories.
+
+GET /images/<kind>/<id>.jpg serves the stories' images, honouring single Range requests:
+"story" is the content:encoded image, which for every 10th story is a 1×1 tracking pixel,
+an HTML page or a 404 (story ids ending in 0, 1, 2); "alt" is the always-good media:content
+fallback; "huge" claims 8 MB, "small" is 120×80, and "slow" answers after 10 s.
+"""
+from __future__ import annotations
+import datetime, hashlib, random, re, struct, threading, time
+from email.utils import format_datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from html import escape
+from typing import Optional
+
+WORDS = (
+    "attackers exploit vulnerability ransomware patch vendor critical update malware phishing "
+    "campaign researchers threat actors credentials botnet zero-day firmware appliance loader "
+    "payload government healthcare finance europe america cisa kev advisory exposure breach "
+    "data leak supply chain backdoor remote code execution privilege escalation authentication "
+    "bypass firewall vpn router endpoint cloud tenant token session"
+).split()
+PRODUCTS = ["Ivanti Connect Secure", "Fortinet FortiOS", "Citrix NetScaler", "SonicWall SMA", "Cisco IOS XE",
+            "Microsoft Exchange", "VMware ESXi", "Atlassian Confluence", "Palo Alto PAN-OS", "MOVEit Transfer"]
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+@lru_cache(maxsize=4096)
+def _story(story_id: int) -> tuple:
+    """Title and body for one story; shared by every feed that carries it."""
+    rng = random.Random(story_id)
+    product = rng.choice(PRODUCTS)
+    cve = f"CVE-2025-{1000 + story_id % 9000}" if story_id % 3 == 0 else ""
+    title = f"Attackers target {product} {cve or 'flaw'} in new campaign #{story_id}"
+    body = " ".join(_sentence(rng, rng.randint(14, 28)) for _ in range(rng.randint(3, 6)))
+    return title, body, cve
+
+
+@lru_cache(maxsize=64)
+def _jpeg(width: int, height: int, size: int) -> bytes:
+    """A `size`-byte stand-in JPEG: real SOI/APP0/SOF0 headers (what image probes read), zero padding."""
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    head = b"\xff\xd8" + app0 + sof0
+    return head + bytes(size - len(head) - 2) + b"\xff\xd9"
+
+
+PIXEL_GIF = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+
+def render_image(kind: str, story_id: int) -> tuple:
+    """(status, content type, body) for /images/<kind>/<story_id>.jpg."""
+    if kind == "story":
+        bad = story_id % 10
+        if bad == 0:
+            return 200, "image/gif", PIXEL_GIF
+        if bad == 1:
+            return 200, "text/html; charset=utf-8", b"<html><body>Image moved</body></html>" * 40
+        if bad == 2:
+            return 404, "text/plain", b"not found"
+        return 200, "image/jpeg", _jpeg(900, 500, 40_000)
+    if kind == "alt":
+        return 200, "image/jpeg", _jpeg(1200, 630, 60_000)
+    if kind == "huge":
+        return 200, "image/jpeg", _jpeg(7000, 5000, 8_000_000)
+    if kind == "small":
+        return 200, "image/jpeg", _jpeg(120, 80, 6_000)
+    if kind == "slow":
+        time.sleep(10)
+        return 200, "image/jpeg", _jpeg(900, 500, 40_000)
+    return 404, "text/plain", b"not found"
+
+
+def render_feed(feed_id: int, items: int, published: datetime.datetime, spacing: float = 20.0, epoch: int = 0,
+                base: str = "https://img.example.com") -> bytes:
+    out = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:media="http://search.yahoo.com/mrss/">\n'
+        f"<channel><title>Bench feed {feed_id}</title><link>https://feed{feed_id}.example.com/</link>"
+        f"<description>Synthetic feed {feed_id}</description>\n"
+    ]
+    for j in range(items):
+        n = j - epoch + 50_000 # stable story number: bump() shifts older stories down the feed
+        story_id = (feed_id if n % 10 else feed_id // 2) * 100_003 + n
+        title, body, _ = _story(story_id)
+        if n % 10 == 0 and feed_id % 2:
+            title = title.replace("Attackers target", "Hackers are targeting")
+        stamp = published - datetime.timedelta(minutes=spacing * j)
+        link = f"https://feed{feed_id}.example.com/news/{story_id}?utm_source=rss"
+        image = f"{base}/images/story/{story_id}.jpg"
+        out.append(
+            f"<item><title>{escape(title)}</title><link>{link}</link><guid>{link}</guid>"
+            f"<pubDate>{format_datetime(stamp)}</pubDate>"
+            f"<description>{escape(f'<p>{body[:240]}</p>')}</description>"
+            f"<content:encoded><![CDATA[<p>{body}</p><figure><img src=\"{image}\" width=\"900\" height=\"500\">"
+            f"<figcaption>Source: feed {feed_id}</figcaption></figure><p>{body[::-1][:200]} "
+            f"<a href=\"{link}\" onclick=\"track({story_id})\">Read more</a></p>]]></content:encoded>"
+            f"<media:content url=\"{base}/images/alt/{story_id}.jpg\" type=\"image/jpeg\" medium=\"image\"/>"
+            f"</item>\n"
+        )
+    out.append("</channel></rss>\n")
+    return "".join(out).encode("utf-8")
+
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, spacing: float = 20.0, published: Optional[datetime.datetime] = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.spacing = spacing # minutes between consecutive stories in a feed
+        self.published = published or datetime.datetime.now(datetime.timezone.utc)
+        self.epoch = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.image_requests = 0
+        self.stalled: set = set() # feed ids that answer only after stall_seconds
+        self.stall_seconds = 5.0
+
+    def handle_error(self, request, client_address):
+        pass # clients hanging up mid-feed (early-terminating readers) are expected, not errors
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def feed_urls(self, feeds: int, items: int) -> list:
+        return [f"{self.url}/feeds/{items}/{i}.xml" for i in range(feeds)]
+
+    def start(self) -> "FeedServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def bump(self, stories: int = 1) -> None:
+        """Publish `stories` new stories at the top of every feed (changes every ETag)."""
+        with self._lock:
+            self.epoch += stories
+            self.published += datetime.timedelta(minutes=self.spacing * stories)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FeedServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "images" and parts[2].endswith(".jpg") and parts[2][:-4].isdigit():
+            return self._image(parts[1], int(parts[2][:-4]))
+        if len(parts) != 3 or parts[0] != "feeds" or not parts[2].endswith(".xml"):
+            return self._reply(404, b"not found")
+        items, feed_id = int(parts[1]), int(parts[2][:-4])
+        server = self.server
+        if feed_id in server.stalled:
+            time.sleep(server.stall_seconds)
+        etag = '"' + hashlib.sha1(f"{items}/{feed_id}/{server.epoch}".encode()).hexdigest()[:16] + '"'
+        with server._lock:
+            server.requests += 1
+        if self.headers.get("If-None-Match") == etag:
+            with server._lock:
+                server.not_modified += 1
+            return self._reply(304, b"", etag)
+        body = render_feed(feed_id, items, server.published, server.spacing, server.epoch, base=server.url)
+        with server._lock:
+            server.bytes_sent += len(body)
+        self._reply(200, body, etag)
+
+    def _image(self, kind: str, story_id: int) -> None:
+        with self.server._lock:
+            self.server.image_requests += 1
+        status, content_type, body = render_image(kind, story_id)
+        total, content_range = len(body), ""
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")) if status == 200 else None
+        if match and int(match.group(1)) < total:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or total - 1), total - 1)
+            status, body, content_range = 206, body[start:end + 1], f"bytes {start}-{end}/{total}"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply(self, status: int, body: bytes, etag: str = "") -> None:
+        self.send_response(status)
+        if status == 200:
+            self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
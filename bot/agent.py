@@ -1,67 +1,40 @@
 from __future__ import annotations # This must be the very first line of the file!
-import os, datetime, sys, traceback, time
-import google.generativeai as genai
-import re # Added for text normalization in deduplication
-
-from rss import today_items
-from send_email import send_html_email # custom Gmail sender
+import argparse, os, datetime, json, re, sys, traceback, time
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+# Only light modules are imported up front. rss (requests, feedparser), dedup/rank (NumPy),
+# send_email (googleapiclient) and google.generativeai (via llm.get_model) load on the code
+# paths that need them, so `render --dry-run` starts fast and needs no secrets.
+from compact import CALL_TOKENS, CONTEXT_TOKENS, clean_text, compact, compact_all
+from llm import LLM_MAX_WORKERS, TOKENS, generate_text, get_model, map_ordered
+from llm_cache import default_cache
+from metrics import TRACER
+from audiences import NOTHING_FOUND, Audience, build_pool, load_audiences, render_variants, send_variants
+from pipeline import Pipeline
+from state import state_path
+
+if TYPE_CHECKING:
+    from sent_index import SentIndex
 
 # ── Secrets / env vars ─────────────────────────────────────────────
-GENAI_API_KEY = os.environ["GENAI_API_KEY"]
-# GMAIL secrets are handled inside email.py via env vars
+# GENAI_API_KEY is read by llm.get_model; commands that call Gemini check for it up front.
+# GMAIL secrets are handled inside send_email.py via env vars
 # ───────────────────────────────────────────────────────────────────
 
-# ── New Deduplication Functions ────────────────────────────────────
-
-def tokenize_and_normalize(text: str) -> set[str]:
-    """
-    Tokenizes text, converts to lowercase, removes punctuation, and returns a set of unique words.
-    """
-    # Remove non-alphanumeric characters (keep spaces) and convert to lowercase
-    text = re.sub(r'[^\w\s]', '', text).lower()
-    # Split into words and filter out empty strings
-    tokens = set(word for word in text.split() if word)
-    return tokens
-
-def jaccard_similarity(set1: set[str], set2: set[str]) -> float:
-    """
-    Calculates the Jaccard similarity between two sets.
-    """
-    intersection = len(set1.intersection(set2))
-    union = len(set1.union(set2))
-    if union == 0:
-        return 0.0 # Avoid division by zero if both sets are empty
-    return intersection / union
+# ── Prompt template versions ───────────────────────────────────────
+# Part of the LLM cache key: bump one whenever its prompt wording or output format changes.
+WELCOME_PROMPT_VERSION = "welcome-v1"
+HEADLINE_PROMPT_VERSION = "headline-v1"
+SUMMARY_PROMPT_VERSION = "summary-v1"
+SUMMARY_BATCH_PROMPT_VERSION = "summary-batch-v2"
+# ───────────────────────────────────────────────────────────────────
 
-def deduplicate_articles(articles: list[dict], similarity_threshold: float = 0.7) -> list[dict]:
-    """
-    Deduplicates a list of articles based on Jaccard similarity of their combined title and summary.
-    Articles are compared against those already accepted into the deduplicated list.
-    """
-    deduplicated_articles = []
-    processed_article_signatures = [] # Stores (original_article_index, normalized_tokens_set) for comparison
-
-    for i, current_article in enumerate(articles):
-        current_text = current_article.get('title', '') + " " + current_article.get('summary', '')
-        current_tokens = tokenize_and_normalize(current_text)
-
-        is_duplicate = False
-        for existing_article_idx, existing_tokens in processed_article_signatures:
-            similarity = jaccard_similarity(current_tokens, existing_tokens)
-            if similarity >= similarity_threshold:
-                # Optional: Uncomment the lines below for debugging to see which articles are skipped
-                # print(f"DEBUG: Skipping potential duplicate (Similarity {similarity:.2f}):")
-                # print(f"  Existing: {articles[existing_article_idx].get('title', '')}")
-                # print(f"  Current: {current_article.get('title', '')}")
-                is_duplicate = True
-                break
-
-        if not is_duplicate:
-            deduplicated_articles.append(current_article)
-            # Store the index of the original article for reference if needed, and its token set
-            processed_article_signatures.append((i, current_tokens))
-
-    return deduplicated_articles
+# ── Summarisation settings ─────────────────────────────────────────
+SUMMARY_BATCH_SIZE = int(os.environ.get("GEMINI_SUMMARY_BATCH_SIZE", 5)) # articles per request; 1 = one prompt per article
+CANDIDATE_POOL = int(os.environ.get("DIGEST_CANDIDATES", 200)) # fresh items fetched for ranking; only the top few are summarised
+JSON_OUTPUT = {"response_mime_type": "application/json"}
+# ───────────────────────────────────────────────────────────────────
 
 # ── AI Generation Functions ────────────────────────────────────────
 
@@ -72,12 +45,12 @@ def generate_welcome_message(articles: list[dict]) -> str:
     if not articles:
         return "Welcome to today's Cybersecurity Digest! Stay informed and protected."
 
-    genai.configure(api_key=GENAI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    model = get_model("gemini-2.5-flash")
 
+    top = articles[:5] # Use top 5 articles for context
     news_context = ""
-    for article in articles[:5]: # Use top 5 articles for context
-        news_context += f"Title: {article['title']}\nSummary: {article['summary']}\n\n"
+    for article, summary in zip(top, compact_all([a['summary'] for a in top], CALL_TOKENS["welcome"], CONTEXT_TOKENS)):
+        news_context += f"Title: {clean_text(article['title'])}\nSummary: {summary}\n\n"
 
     prompt = (
         "You are a friendly and insightful cybersecurity newsletter editor. "
@@ -91,8 +64,7 @@ def generate_welcome_message(articles: list[dict]) -> str:
     )
 
     try:
-        response = model.generate_content(prompt)
-        welcome_text = response.text.strip()
+        welcome_text = generate_text(model, prompt, WELCOME_PROMPT_VERSION).strip()
         return welcome_text if welcome_text else "Welcome to today's Cybersecurity Digest! Stay informed and protected."
     except Exception as e:
         print(f"Error generating welcome message: {e}")
@@ -106,12 +78,13 @@ def generate_email_headline(articles: list[dict], today_str: str) -> str:
     if not articles:
         return f"🕵️ Cybersecurity Digest — {today_str}" # Fallback to generic if no articles
 
-    genai.configure(api_key=GENAI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    model = get_model("gemini-2.5-flash")
 
+    top = articles[:3] # Focus on the top 3 articles for headline relevance
+    radars = compact_all([a.get('rundown_text', a.get('summary', '')) for a in top], CALL_TOKENS["headline"], CONTEXT_TOKENS)
     context_for_headline = ""
-    for article in articles[:3]: # Focus on the top 3 articles for headline relevance
-        context_for_headline += f"- {article['title']} (Radar: {article.get('rundown_text', article.get('summary', ''))})\n"
+    for article, radar in zip(top, radars):
+        context_for_headline += f"- {clean_text(article['title'])} (Radar: {radar})\n"
 
     prompt = (
         "You are a cybersecurity marketing expert specializing in email newsletters. "
@@ -124,8 +97,7 @@ def generate_email_headline(articles: list[dict], today_str: str) -> str:
     )
 
     try:
-        response = model.generate_content(prompt)
-        headline = response.text.strip()
+        headline = generate_text(model, prompt, HEADLINE_PROMPT_VERSION).strip()
         if headline.startswith('"') and headline.endswith('"'):
             headline = headline[1:-1]
         if len(headline) > 80:
@@ -137,293 +109,419 @@ def generate_email_headline(articles: list[dict], today_str: str) -> str:
         return f"🕵️ Cybersecurity Digest — {today_str}"
 
 
-def summarise_rss(articles: list[dict], bullets: int = 5) -> list[dict]:
-    """Use Gemini to generate custom titles and bullet-point summaries from article title + summary."""
-    if not articles:
-        return [{"title": "No fresh cybersecurity headlines found", "summary_content_html": "<p>• No fresh cybersecurity headlines found in the last\u202f24h.</p>", "link": "#", "rundown_text": "No fresh cybersecurity headlines found in the last 24h.", "summary": "No fresh cybersecurity headlines found in the last 24h."}]
-
-    genai.configure(api_key=GENAI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-pro")
-
-    results = []
-    for article in articles[:bullets]:
-        cve_hint = (
-            "Highlight CVE IDs in square brackets like [CVE-2025-1234]. "
-            if "cve" in article["title"].lower() or "cve" in article["summary"].lower() else ""
-        )
-
-        prompt = (
-            "You are a cybersecurity editor. For the following news article, "
-            "first write a short, punchy title. Start the title with **one relevant emoji**, and include no other emojis in the title. "
-            "Avoid Markdowns in the title."
-            "Then, provide a **single, very concise, impactful sentence** summarizing the main point. "
-            "Finally, provide 2-3 **very concise, impactful bullet points** detailing specific takeaways from the news. "
-            f"{cve_hint}"
-            "Ensure the output format is: Title, then the summary sentence, then bullet points. "
-            "Avoid hashtags, links, or conversational filler in all outputs.\n\n"
-            f"Title: {article['title']}\n"
-            f"Description: {article['summary']}"
-        )
+def _cve_hint(article: dict) -> str:
+    from rank import mentions_cve
+    return (
+        "Highlight CVE IDs in square brackets like [CVE-2025-1234]. "
+        if mentions_cve(article) else ""
+    )
 
-        try:
-            response = model.generate_content(prompt)
-            generated_content = response.text.strip()
-
-            lines = [line.strip() for line in generated_content.splitlines() if line.strip()]
-            final_title = article['title']
-            rundown_text = ""
-            details_html = ""
-            bullet_points = []
-            content_start_index = 0
-
-            if lines:
-                potential_title = lines[0]
-                if potential_title.lower().startswith("title:"):
-                    final_title = potential_title[len("title:"):].strip()
-                    content_start_index = 1
-                elif potential_title and (potential_title.count(' ') < 10 and not (potential_title.startswith('*') or potential_title.startswith('-'))):
-                    final_title = potential_title
-                    content_start_index = 1
-
-                radar_found = False
-                for i in range(content_start_index, len(lines)):
-                    line = lines[i]
-                    if not (line.startswith('*') or line.startswith('-')) and len(line) > 10:
-                        rundown_text = line
-                        content_start_index = i + 1
-                        radar_found = True
-                        break
-
-                for i in range(content_start_index, len(lines)):
-                    stripped_line = lines[i]
-                    if stripped_line.startswith('*') or stripped_line.startswith('-') or len(stripped_line) > 10:
-                        bullet_points.append(stripped_line.strip('* ').strip('- ').strip())
-
-            if bullet_points:
-                bullet_points_html_content = "".join([
-                    f"<li style='margin-bottom:8px;'>{bp}</li>"
-                    for bp in bullet_points if bp
-                ])
-                if bullet_points_html_content:
-                    details_html = f"<ul style='padding-left:20px; margin:0; list-style-type:disc; color:#cccccc; font-size:15px; line-height:1.6;'>{bullet_points_html_content}</ul>"
-
-            if not details_html:
-                details_html = f"<p style='color:#cccccc; font-size:15px; line-height:1.7; margin:0;'>{article['summary']}</p>"
-
-            if not rundown_text:
-                rundown_text = article['summary'].split('.')[0] + '.' if '.' in article['summary'] else article['summary']
-                if len(rundown_text) > 200 and not radar_found:
-                    rundown_text = rundown_text[:200] + '...'
-
-            final_summary_content = (
-                f"<p style='font-weight:bold; color:#E0E0E0; font-size:16px; margin-bottom:10px; margin-top:0;'>The Radar: <span style='font-weight:normal; color:#cccccc;'>{rundown_text}</span></p>"
-                f"<p style='font-weight:bold; color:#E0E0E0; font-size:16px; margin-bottom:10px; margin-top:15px;'>The details:</p>"
-                f"{details_html}"
-            )
 
+def _summary_record(article: dict, final_title: str, rundown_text: str, bullet_points: list[str], radar_found: bool = True) -> dict:
+    """Build the summary dict the digest renders for one article (render.render_card turns it into HTML)."""
+    if not rundown_text:
+        rundown_text = article['summary'].split('.')[0] + '.' if '.' in article['summary'] else article['summary']
+        if len(rundown_text) > 200 and not radar_found:
+            rundown_text = rundown_text[:200] + '...'
+
+    return {
+        "title": final_title,
+        "link": article['link'],
+        "image_url": article.get("image_url", ""),
+        "rundown_text": rundown_text,
+        "bullets": [bp for bp in bullet_points if bp],
+        "summary": article['summary']
+    }
+
+
+def _fallback_record(article: dict) -> dict:
+    """Summary dict built from the feed text alone, for when the model never answered usefully."""
+    return {
+        "title": article['title'],
+        "link": article['link'],
+        "image_url": article.get("image_url", ""),
+        "rundown_text": article['summary'].split('.')[0] + '.', # Ensure rundown_text is set even on error for email headline
+        "bullets": [],
+        "summary": article['summary'],
+        "summary_content_html": article.get('summary_content_html', ""), # rendered as the card's details
+    }
+
+
+def _summarise_article(model, article: dict) -> dict:
+    """One Gemini call for one article; falls back to the feed text if the call ultimately fails."""
+    prompt = (
+        "You are a cybersecurity editor. For the following news article, "
+        "first write a short, punchy title. Start the title with **one relevant emoji**, and include no other emojis in the title. "
+        "Avoid Markdowns in the title."
+        "Then, provide a **single, very concise, impactful sentence** summarizing the main point. "
+        "Finally, provide 2-3 **very concise, impactful bullet points** detailing specific takeaways from the news. "
+        f"{_cve_hint(article)}"
+        "Ensure the output format is: Title, then the summary sentence, then bullet points. "
+        "Avoid hashtags, links, or conversational filler in all outputs.\n\n"
+        f"Title: {clean_text(article['title'])}\n"
+        f"Description: {compact(article['summary'], CALL_TOKENS['summary'])}"
+    )
+
+    try:
+        generated_content = generate_text(model, prompt, SUMMARY_PROMPT_VERSION).strip()
+
+        lines = [line.strip() for line in generated_content.splitlines() if line.strip()]
+        final_title = article['title']
+        rundown_text = ""
+        bullet_points = []
+        content_start_index = 0
+        radar_found = False
+
+        if lines:
+            potential_title = lines[0]
+            if potential_title.lower().startswith("title:"):
+                final_title = potential_title[len("title:"):].strip()
+                content_start_index = 1
+            elif potential_title and (potential_title.count(' ') < 10 and not (potential_title.startswith('*') or potential_title.startswith('-'))):
+                final_title = potential_title
+                content_start_index = 1
+
+            for i in range(content_start_index, len(lines)):
+                line = lines[i]
+                if not (line.startswith('*') or line.startswith('-')) and len(line) > 10:
+                    rundown_text = line
+                    content_start_index = i + 1
+                    radar_found = True
+                    break
+
+            for i in range(content_start_index, len(lines)):
+                stripped_line = lines[i]
+                if stripped_line.startswith('*') or stripped_line.startswith('-') or len(stripped_line) > 10:
+                    bullet_points.append(stripped_line.strip('* ').strip('- ').strip())
+
+        return _summary_record(article, final_title, rundown_text, bullet_points, radar_found)
+
+    except Exception as e:
+        print(f"Error generating content for article '{article['title']}': {e}")
+        traceback.print_exc()
+        return _fallback_record(article)
+
+
+def _batch_prompt(batch: list[dict]) -> str:
+    descriptions = compact_all([a['summary'] for a in batch], CALL_TOKENS["batch"])
+    articles_block = "".join(
+        f"\n### Article {i}\n{_cve_hint(article)}\nTitle: {clean_text(article['title'])}\nDescription: {description}\n"
+        for i, (article, description) in enumerate(zip(batch, descriptions))
+    )
+    return (
+        "You are a cybersecurity editor. For EACH of the news articles below, write:\n"
+        "- \"title\": a short, punchy title that starts with **one relevant emoji** and contains no other emojis and no Markdown;\n"
+        "- \"radar\": a **single, very concise, impactful sentence** summarizing the main point;\n"
+        "- \"bullets\": 2-3 **very concise, impactful bullet points** (plain strings, no leading '*' or '-') with specific takeaways.\n"
+        "Avoid hashtags, links, or conversational filler in all outputs.\n"
+        f"Respond with ONLY a JSON array of exactly {len(batch)} objects, one per article, in the same order, "
+        "each shaped like {\"id\": <article number>, \"source\": \"<the first five words of the article's Title, copied exactly>\", "
+        "\"title\": \"...\", \"radar\": \"...\", \"bullets\": [\"...\", \"...\"]}.\n"
+        f"{articles_block}"
+    )
+
+
+def _echoes_title(source, title: str) -> bool:
+    """True if the reply's "source" echo is the start of the article's title, word for word (case and punctuation aside)."""
+    echoed = re.findall(r"\w+", source.lower()) if isinstance(source, str) else []
+    return bool(echoed) and re.findall(r"\w+", clean_text(title).lower())[:len(echoed)] == echoed
+
+
+def _parse_batch_response(text: str, titles: list[str]) -> list[dict | None]:
+    """
+    Validate a batch reply against the {id, source, title, radar, bullets} schema for the
+    articles titled `titles`. Objects are matched by id only when the ids are exactly
+    0..len(titles)-1, each once; otherwise by list position. Either way an object is kept only
+    if its "source" echo matches that article's title, so a misnumbered or shifted reply can't
+    attach one article's summary to another. Returns one entry per article: the validated
+    object, or None where it is missing, malformed or doesn't match.
+    """
+    size = len(titles)
+    text = text.strip()
+    if text.startswith("```"): # tolerate a fenced ```json block
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [None] * size
+    if not isinstance(data, list):
+        return [None] * size
+
+    ids = [obj.get("id") if isinstance(obj, dict) else None for obj in data]
+    by_id = sorted(i for i in ids if isinstance(i, int) and not isinstance(i, bool)) == list(range(size)) and len(ids) == size
+    parsed: list[dict | None] = [None] * size
+    for position, obj in enumerate(data):
+        if not isinstance(obj, dict):
+            continue
+        idx = obj["id"] if by_id else position
+        bullets = obj.get("bullets")
+        if (
+            0 <= idx < size
+            and _echoes_title(obj.get("source"), titles[idx])
+            and isinstance(obj.get("title"), str) and obj["title"].strip()
+            and isinstance(obj.get("radar"), str) and obj["radar"].strip()
+            and isinstance(bullets, list) and 1 <= len(bullets) <= 5
+            and all(isinstance(b, str) and b.strip() for b in bullets)
+        ):
+            parsed[idx] = {
+                "title": obj["title"].strip(),
+                "radar": obj["radar"].strip(),
+                "bullets": [b.strip().lstrip("*-• ").strip() for b in bullets],
+            }
+    return parsed
+
+
+def _summarise_batch(model, batch: list[dict]) -> list[dict]:
+    """
+    Summarise several articles with one JSON-mode call. Articles whose entry is missing,
+    malformed or doesn't echo their title are split into halves and retried; a single article
+    that still fails goes through the per-article path (and its fallback).
+    """
+    if len(batch) == 1:
+        try:
+            text = generate_text(model, _batch_prompt(batch), SUMMARY_BATCH_PROMPT_VERSION, generation_config=JSON_OUTPUT)
+            parsed = _parse_batch_response(text, [batch[0]['title']])[0]
         except Exception as e:
-            print(f"Error generating content for article '{article['title']}': {e}")
-            traceback.print_exc()
-            final_title = article['title']
-            final_summary_content = article['summary_content_html'] if article.get('summary_content_html') else f"<p style='color:#cccccc; font-size:16px; line-height:1.7; margin-bottom:20px;'>{article['summary']}</p>"
-            rundown_text = article['summary'].split('.')[0] + '.' # Ensure rundown_text is set even on error for email headline
-
-        results.append({
-            "title": final_title,
-            "summary_content_html": final_summary_content,
-            "link": article['link'],
-            "image_url": article.get("image_url", ""),
-            "rundown_text": rundown_text,
-            "summary": article['summary']
-        })
+            print(f"Error generating batch content for article '{batch[0]['title']}': {e}")
+            parsed = None
+        if parsed is None:
+            return [_summarise_article(model, batch[0])]
+        return [_summary_record(batch[0], parsed["title"], parsed["radar"], parsed["bullets"])]
 
+    try:
+        text = generate_text(model, _batch_prompt(batch), SUMMARY_BATCH_PROMPT_VERSION, generation_config=JSON_OUTPUT)
+        parsed = _parse_batch_response(text, [a['title'] for a in batch])
+    except Exception as e:
+        print(f"Error generating content for a batch of {len(batch)} articles: {e}")
+        parsed = [None] * len(batch)
+
+    results: list[dict | None] = [
+        _summary_record(article, p["title"], p["radar"], p["bullets"]) if p else None
+        for article, p in zip(batch, parsed)
+    ]
+    failed = [i for i, r in enumerate(results) if r is None]
+    if failed:
+        print(f"WARN: {len(failed)} of {len(batch)} batch summaries missing, malformed or mismatched; retrying them in smaller batches")
+        retry = [batch[i] for i in failed]
+        half = (len(retry) + 1) // 2
+        redone = _summarise_batch(model, retry[:half]) + (_summarise_batch(model, retry[half:]) if retry[half:] else [])
+        for i, record in zip(failed, redone):
+            results[i] = record
     return results
 
-# ── Main routine ───────────────────────────────────────────────────
-if __name__ == "__main__":
-    t0 = time.time()
+
+def summarise_rss(articles: list[dict], bullets: int = 5, model=None, max_workers: int = LLM_MAX_WORKERS,
+                  batch_size: int = SUMMARY_BATCH_SIZE) -> list[dict]:
+    """
+    Use Gemini to generate custom titles and bullet-point summaries from article title + summary.
+    With batch_size > 1, articles are sent batch_size at a time as one structured-JSON request;
+    batch_size=1 sends one free-text prompt per article. Up to max_workers requests run at
+    once and results keep the order of `articles`.
+    """
+    if not articles:
+        return list(NOTHING_FOUND)
+
+    if model is None:
+        model = get_model("gemini-2.5-pro")
+
+    selected = articles[:bullets]
+    if batch_size <= 1:
+        return map_ordered(lambda article: _summarise_article(model, article), selected, max_workers)
+
+    batches = [selected[i:i + batch_size] for i in range(0, len(selected), batch_size)]
+    return [record for batch in map_ordered(lambda b: _summarise_batch(model, b), batches, max_workers) for record in batch]
+
+def archive_sent(sent: List[dict], pool: List[dict], summaries: List[dict], day: datetime.date) -> None:
+    """Add the stories that went out to the searchable archive; a failure here must not fail the run."""
+    from archive import Archive
+    by_link = {a["link"]: (a, s) for a, s in zip(pool, summaries)}
+    pairs = [by_link[a["link"]] for a in sent if a["link"] in by_link]
     try:
-        raw_articles = today_items(max_items=25)
+        archive = Archive()
+        added = archive.add([s for _, s in pairs], day, articles=[a for a, _ in pairs])
+        print(f"DEBUG: archived {added} stor{'y' if added == 1 else 'ies'} ({len(archive):,} in the archive)")
+        archive.close()
+    except Exception as e:
+        print(f"WARN: could not archive today's stories: {e!r}")
+
+
+def send_html_email(subject: str, html: str, recipients: Optional[List[str]] = None):
+    """send_email.send_html_email, imported on first send (googleapiclient is slow to import)."""
+    from send_email import send_html_email as send
+    return send(subject, html, recipients)
+
+
+_DEDUP_NAMES = ("tokenize_and_normalize", "jaccard_similarity", "deduplicate_articles")
+
+def __getattr__(name: str):
+    """agent.deduplicate_articles & co., from before they moved to dedup.py; dedup (NumPy) loads on first use."""
+    if name in _DEDUP_NAMES:
+        import dedup
+        return getattr(dedup, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ── Main routine ───────────────────────────────────────────────────
+
+def build_pipeline(sent_index: Optional[SentIndex], today_str: str, until: str = "send",
+                   articles: Optional[List[dict]] = None, dry_run: bool = False,
+                   audiences: Optional[List[Audience]] = None) -> Pipeline:
+    """
+    The daily run as a stage graph. Candidates are ranked locally, and one shared pool of the
+    best stories for all audiences (audiences.toml) is summarised, so the model only sees the
+    highest-impact stories and its cost doesn't grow with the number of audiences. The welcome
+    message only needs the pool, so it runs while the summaries are still being generated.
+    Every audience's variant is rendered from the pool, then each goes to its own recipients.
+
+    until="rank" stops after ranking and until="render" before sending. Passing already-ranked
+    `articles` replaces fetch/dedup/rank with a stage that returns them. dry_run=True makes no
+    model calls: stories keep their feed text and the welcome/headline are the fixed fallbacks.
+    """
+    pipeline = Pipeline()
+    audiences = audiences or load_audiences()
+
+    def fetch():
+        from feeds import READ_BACK, FeedScheduler
+        from rss import today_items
+        # The mail says "last 24h": a skipped feed is only read back further when DIGEST_READ_BACK asks for it.
+        raw_articles = today_items(max_items=CANDIDATE_POOL, sent_index=sent_index, scheduler=FeedScheduler(read_back=READ_BACK))
         print(f"DEBUG: Number of raw_articles fetched: {len(raw_articles)}")
+        return raw_articles
 
-        # NEW: Deduplicate articles based on content similarity
+    def dedup(raw_articles):
+        from dedup import deduplicate_articles
+        # Deduplicate articles based on content similarity
         processed_articles = deduplicate_articles(raw_articles, similarity_threshold=0.7)
         print(f"DEBUG: Number of deduplicated articles: {len(processed_articles)}")
+        return processed_articles
+
+    def rank(processed_articles):
+        from rank import rank_articles
+        return rank_articles(processed_articles)
 
-        # Pass the deduplicated articles to the summarization function
-        summaries = summarise_rss(processed_articles, bullets=5)
+    def pool(ranked_articles):
+        selected = build_pool(ranked_articles, audiences)
+        print(f"DEBUG: {len(selected)} stories to summarise for {len(audiences)} audience(s)")
+        return selected
+
+    def summarise(pool_articles):
+        if dry_run:
+            return [_fallback_record(a) for a in pool_articles]
+        summaries = summarise_rss(pool_articles, bullets=len(pool_articles))
         print(f"DEBUG: Number of summaries generated: {len(summaries)}")
-        today_str = datetime.date.today().strftime("%d %b %Y")
+        return summaries
+
+    def images(pool_articles):
+        from images import IMAGE_CHECK, pick_images
+        if dry_run or not IMAGE_CHECK or not any(a.images for a in audiences):
+            return {}
+        return pick_images(pool_articles)
+
+    def welcome(pool_articles):
+        return generate_welcome_message([] if dry_run else pool_articles)
+
+    def headline(summaries):
+        return generate_email_headline([] if dry_run else summaries, today_str)
+
+    def render(pool_articles, summaries, found_images, welcome_message, subject):
+        from images import apply_images
+        summaries = apply_images(summaries, pool_articles, found_images)
+        return render_variants(audiences, pool_articles, summaries, welcome_message, subject, today_str)
+
+    def send(variants, pool_articles, summaries):
+        report = send_variants(variants, send_html_email)
+        sent_index.mark_sent(report.sent)
+        archive_sent(report.sent, pool_articles, summaries, datetime.date.today())
+        if report.failed: # after recording what did go out, so a re-run doesn't mail it twice
+            raise RuntimeError(f"Digest send failed for {len(report.failed)} of {len(variants)} audience(s): {report.summary()}")
+
+    if until not in ("rank", "render", "send"):
+        raise ValueError(f"Can only stop after rank, render or send, not {until!r}")
+    if articles is None:
+        pipeline.add("fetch", fetch)
+        pipeline.add("dedup", dedup, deps=["fetch"])
+        pipeline.add("rank", rank, deps=["dedup"])
+    else:
+        pipeline.add("rank", lambda: articles)
+    if until == "rank":
+        return pipeline
+    pipeline.add("pool", pool, deps=["rank"])
+    pipeline.add("summarise", summarise, deps=["pool"])
+    pipeline.add("images", images, deps=["pool"]) # checked while the model is busy
+    pipeline.add("welcome", welcome, deps=["pool"]) # top stories set the day's themes
+    pipeline.add("headline", headline, deps=["summarise"])
+    pipeline.add("render", render, deps=["pool", "summarise", "images", "welcome", "headline"])
+    if until == "send":
+        pipeline.add("send", send, deps=["render", "pool", "summarise"])
+    return pipeline
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build and send the daily cybersecurity digest.")
+    sub = parser.add_subparsers(dest="command", metavar="{send,fetch,render,daemon,archive}")
+    sub.add_parser("send", help="fetch, summarise, render and email the digest (the default)")
+    p_fetch = sub.add_parser("fetch", help="fetch, dedup and rank today's stories and save them as JSON; no secrets needed")
+    p_fetch.add_argument("--out", type=Path, default=None, help="where to write the ranked stories (default .state/candidates.json)")
+    p_render = sub.add_parser("render", help="build the digest HTML without sending it")
+    p_render.add_argument("--input", type=Path, help="ranked stories saved by `fetch` (default: fetch now)")
+    p_render.add_argument("--out", type=Path, default=Path("digest.html"), help="HTML output file (default digest.html)")
+    p_render.add_argument("--dry-run", action="store_true", help="no Gemini calls: feed text and stock welcome/headline, no API key needed")
+    p_daemon = sub.add_parser("daemon", add_help=False, help="stay resident, prepare through the day and send at a fixed time (see daemon.py --help)")
+    p_daemon.add_argument("daemon_args", nargs=argparse.REMAINDER)
+    p_archive = sub.add_parser("archive", add_help=False, help="search past digests by keyword, CVE or date (see archive.py --help)")
+    p_archive.add_argument("archive_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    command = args.command or "send"
+
+    if command == "daemon":
+        import daemon
+        return daemon.main(args.daemon_args)
+    if command == "archive":
+        import archive
+        return archive.main(args.archive_args)
+    if command == "send" or (command == "render" and not args.dry_run):
+        if not os.environ.get("GENAI_API_KEY"): # fail fast, before any fetching
+            raise SystemExit(f"GENAI_API_KEY is not set (needed by `{command}`; try `render --dry-run`)")
 
-        # Define the logo URL (using raw.githubusercontent.com as requested)
-        logo_url = "https://raw.githubusercontent.com/throwaway666-ui/Cybersecurity-Newsletter/main/assets/digest.png"
-
-        # Generate the dynamic email headline
-        dynamic_email_subject = generate_email_headline(summaries, today_str)
-
-        # Generate the welcome message
-        welcome_message = generate_welcome_message(raw_articles) # Use raw_articles for broader context
-
-        # Generate Quick Links section
-        quick_links = "\n".join([
-            f"<li><a href=\"{item['link']}\" style=\"color:#00F5D4; text-decoration:none;\">{item['title']}</a></li>"
-            for item in summaries
-        ])
-
-        html_items = ""
-        for item in summaries:
-            # Add image if available (for individual article images, not the main logo)
-            image_html = ""
-            if item.get('image_url'):
-                image_html = f"<img src=\"{item['image_url']}\" alt=\"{item['title']}\" style=\"width:100%; max-width:550px; height:auto; display:block; margin:0 auto 20px; border-radius:8px; object-fit:cover;\">"
-
-            html_items += (
-                f"<div style='margin-bottom:30px; padding:25px; border-radius:12px; background-color:#1E1E1E; box-shadow:0 6px 15px rgba(0,255,224,0.1);'>"
-                + f"<h2 style='font-size:22px; color:#00F5D4; font-weight:700; margin:0 0 15px; line-height:1.3;'>{item['title']}</h2>"
-                + image_html +
-                f"{item['summary_content_html']}"
-                f"<a href=\"{item['link']}\" target=\"_blank\" style=\"display:inline-block; margin-top:20px; padding:12px 25px; background-color:#00FFE0; color:#121212; text-decoration:none; border-radius:8px; font-weight:bold; font-size:15px; transition:background-color 0.3s ease;\">Read More &gt;</a>"
-                f"</div>"
-            )
-
-        html_digest = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Cybersecurity Digest</title>
-            <style>
-                body {{
-                    margin: 0;
-                    padding: 0;
-                    background-color: #0d0d0d;
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    -webkit-text-size-adjust: 100%;
-                    -ms-text-size-adjust: 100%;
-                }}
-                table {{
-                    border-spacing: 0;
-                    mso-table-lspace: 0pt;
-                    mso-table-rspace: 0pt;
-                }}
-                td {{
-                    padding: 0;
-                }}
-                img {{
-                    border: 0;
-                    outline: none;
-                    text-decoration: none;
-                    -ms-interpolation-mode: bicubic;
-                }}
-                a {{
-                    text-decoration: none;
-                }}
-                /* Dark Mode Compatibility */
-                @media (prefers-color-scheme: dark) {{
-                    body, .container {{
-                        background-color: #0d0d0d !important;
-                        color: #E0E0E0 !important;
-                    }}
-                    .header-bg {{
-                        background-color: #00FFE0 !important; /* Teal for dark mode */
-                        color: #000 !important; /* Black text for dark mode header */
-                    }}
-                    .content-block {{ /* New style for content blocks */
-                        background-color: #121212 !important; /* Adjust if blocks should be lighter */
-                        border: 1px solid #333333 !important;
-                        box-shadow: 0 4px 10px rgba(0,0,0,0.3) !important;
-                    }}
-                    .card {{
-                        background-color: #1E1E1E !important;
-                        box-shadow: 0 6px 15px rgba(0,255,224,0.1) !important;
-                    }}
-                    h1, h2, h3 {{
-                        color: #00F5D4 !important;
-                    }}
-                    p, li, span {{
-                        color: #cccccc !important;
-                    }}
-                }}
-            </style>
-        </head>
-        <body style="margin:0; padding:0; background-color:#0d0d0d;">
-            <center style="width:100%; background-color:#0d0d0d;">
-                <div style="max-width:700px; margin:0 auto;" class="email-container">
-                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" class="header-bg" style="background-color:#00FFE0; border-top-left-radius:16px; border-top-right-radius:16px; border:1px solid #000; box-shadow:0 4px 10px rgba(0,0,0,0.3);">
-                        <tr>
-                            <td style="text-align:center; padding:25px 25px 20px;">
-                                <img src="{logo_url}"
-                                            alt="Cybersecurity Digest Logo" style="width:100%; max-width:250px; height:auto; display:block; margin:0 auto;" />
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="text-align:center; padding:0 25px 25px;">
-                                <table role="presentation" cellspacing="0" cellpadding="0" border="0" align="center" style="background-color:#000; border-radius: 8px;">
-                                    <tr>
-                                        <td style="padding: 5px 15px;">
-                                            <span style="font-family:'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size:16px; font-weight:bold; color:#FFFFFF;">{today_str}</span>
-                                        </td>
-                                    </tr>
-                                </table>
-                            </td>
-                        </tr>
-                    </table>
-                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color:#0d0d0d; padding:20px 0;">
-                        <tr>
-                            <td style="padding: 0 25px;">
-                                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" class="content-block" style="background-color:#121212; border-radius:12px; border:1px solid #333333; box-shadow:0 4px 10px rgba(0,0,0,0.3); margin-bottom: 20px;">
-                                    <tr>
-                                        <td style="padding: 25px;">
-                                            <p style='color:#E0E0E0; font-size:16px; line-height:1.7; margin-top:0; margin-bottom:25px;'>
-                                                {welcome_message}
-                                            </p>
-                                            <h3 style="color:#00FFE0; border-left:4px solid #00FFE0; padding-left:15px; font-size:18px; font-weight:bold; margin-top:0; margin-bottom:25px;">
-                                                🛡️ Quick Shields
-                                            </h3>
-                                            <ul style="padding-left:25px; margin:0; color:#00F5D4; font-size:16px; line-height:1.8;">{quick_links}</ul>
-                                        </td>
-                                    </tr>
-                                </table>
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 0 25px;">
-                                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" class="content-block" style="background-color:#121212; border-radius:12px; border:1px solid #333333; box-shadow:0 4px 10px rgba(0,0,0,0.3);">
-                                    <tr>
-                                        <td style="padding: 25px;">
-                                            <h3 style="color:#FFFFFF; font-size:20px; margin-bottom:25px; font-weight:bold;">💻 Today's Stories</h3>
-                                            {html_items}
-                                        </td>
-                                    </tr>
-                                </table>
-                            </td>
-                        </tr>
-                    </table>
-
-                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color:#121212; border-bottom-left-radius:16px; border-bottom-right-radius:16px;">
-                        <tr>
-                            <td style="text-align:center; padding:25px; font-size:12px; color:#888888;">
-                                <p style="margin:0 0 10px; font-size:14px; color:#cccccc;">
-                                    Was this email forwarded to you? <a href="https://github.com/throwaway666-ui/Cybersecurity-Newsletter" target="_blank" style="color:#00FFE0; text-decoration:underline;">Sign up for free here</a>
-                                </p>
-                                <p style="margin:0 0 10px;">Stay secure. This digest was sent by your automated cybersecurity agent.</p>
-                                <p style="margin:0; color:#555;">&copy; {today_str[:4]} Cyber Digest Bot. All rights reserved.</p>
-                                <p style="margin-top:15px;"><a href="#" style="color:#00FFE0; text-decoration:underline; font-size:11px;">Unsubscribe</a></p>
-                            </td>
-                        </tr>
-                    </table>
-
-                </div>
-            </center>
-        </body>
-        </html>
-        """
-
-        send_html_email(dynamic_email_subject, html_digest)
-
-        print(f"✅ Sent to Gmail! Runtime: {time.time() - t0:.1f}s")
+    t0 = time.time()
+    try:
+        today_str = datetime.date.today().strftime("%d %b %Y")
+        articles = json.loads(args.input.read_text(encoding="utf-8")) if command == "render" and args.input else None
+        sent_index = None
+        if articles is None:
+            from sent_index import SentIndex
+            sent_index = SentIndex() # remembers what earlier digests already covered
+        until = {"send": "send", "fetch": "rank", "render": "render"}[command]
+        pipeline = build_pipeline(sent_index, today_str, until=until, articles=articles,
+                                  dry_run=command == "render" and args.dry_run)
+        results = pipeline.run()
+        print(pipeline.report())
+
+        if command == "fetch":
+            out = args.out or state_path("candidates.json")
+            out.write_text(json.dumps(results["rank"], ensure_ascii=False, indent=1), encoding="utf-8")
+            print(f"✅ {len(results['rank'])} ranked stories written to {out}. Runtime: {time.time() - t0:.1f}s")
+        elif command == "render":
+            variants = results["render"]
+            for name, variant in variants.items(): # one audience writes --out itself, several get -<name> suffixes
+                out = args.out if len(variants) == 1 else args.out.with_name(f"{args.out.stem}-{name}{args.out.suffix}")
+                out.write_text(variant.result.html, encoding="utf-8")
+                print(f"✅ [{name}] {variant.subject!r}: digest HTML written to {out}")
+            print(f"Runtime: {time.time() - t0:.1f}s")
+        else:
+            print(f"DEBUG: {default_cache().summary()}; evicted {default_cache().prune()}")
+            print(f"DEBUG: {TOKENS.summary()}")
+            print(f"✅ Sent to Gmail! Runtime: {time.time() - t0:.1f}s")
 
     except Exception:
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        # Written for failed runs too; that's when the numbers are most useful.
+        print(TRACER.table())
+        print(f"DEBUG: run metrics written to {TRACER.write_json()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+from __future__ import annotations
+import argparse, datetime, json, re, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from dedup import tokenize_and_normalize
+from sent_index import normalize_link
+from state import state_path
+
+# ── Archive settings ───────────────────────────────────────────────
+SEARCH_LIMIT = 20       # results shown per query unless --limit says otherwise
+# ───────────────────────────────────────────────────────────────────
+
+CVE_ID = re.compile(r"\bCVE-(\d{4})-(\d{4,7})\b", re.IGNORECASE)
+
+
+def extract_cves(*texts: str) -> List[str]:
+    """Distinct CVE IDs in the texts, upper-cased, in order of first mention."""
+    return list(dict.fromkeys(f"CVE-{year}-{num}" for text in texts for year, num in CVE_ID.findall(text or "")))
+
+
+def _terms(record: Dict) -> set[str]:
+    """Index terms of a summary record: its title, Radar line and bullets, normalized like dedup does."""
+    return tokenize_and_normalize(" ".join([record.get("title", ""), record.get("rundown_text", ""), *record.get("bullets", [])]))
+
+
+class Archive:
+    """
+    Every story that went out, as mailed (title, Radar line, bullets, link), with its digest day
+    and CVE IDs, in SQLite under .state. Searchable through an inverted index (term → items)
+    that is extended with each new item's terms only; nothing already archived is re-indexed.
+    Thread-safe.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else state_path("archive.sqlite3")
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id       INTEGER PRIMARY KEY,
+                link_key TEXT NOT NULL UNIQUE,
+                day      TEXT NOT NULL,      -- digest date, YYYY-MM-DD
+                title    TEXT NOT NULL,
+                radar    TEXT NOT NULL,
+                bullets  TEXT NOT NULL,      -- JSON list
+                link     TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS items_day ON items(day);
+            CREATE TABLE IF NOT EXISTS postings (
+                term    TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                PRIMARY KEY (term, item_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS cves (
+                cve     TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                PRIMARY KEY (cve, item_id)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def add(self, records: Iterable[Dict], day: datetime.date, articles: Optional[Iterable[Dict]] = None) -> int:
+        """
+        Archive one digest's summary records (render's input) under `day`. `articles`, the feed
+        items they came from, only add CVE IDs the summary dropped. Links already archived are
+        skipped. Returns how many items were added.
+        """
+        records = list(records)
+        sources = list(articles) if articles is not None else [{}] * len(records)
+        added = 0
+        with self._lock, self.db:
+            for record, source in zip(records, sources):
+                if not record.get("link") or record["link"] == "#": # the "nothing found" placeholder
+                    continue
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO items (link_key, day, title, radar, bullets, link) VALUES (?, ?, ?, ?, ?, ?)",
+                    (normalize_link(record["link"]), day.isoformat(), record.get("title", ""), record.get("rundown_text", ""),
+                     json.dumps(record.get("bullets", []), ensure_ascii=False), record["link"]),
+                )
+                if not cursor.rowcount:
+                    continue
+                item_id = cursor.lastrowid
+                cves = extract_cves(record.get("title", ""), record.get("rundown_text", ""), *record.get("bullets", []),
+                                    source.get("title", ""), source.get("summary", ""))
+                self.db.executemany("INSERT OR IGNORE INTO postings (term, item_id) VALUES (?, ?)", [(t, item_id) for t in _terms(record)])
+                self.db.executemany("INSERT OR IGNORE INTO cves (cve, item_id) VALUES (?, ?)", [(c, item_id) for c in cves])
+                added += 1
+        return added
+
+    def search(self, words: str = "", cve: Optional[str] = None, since: Optional[datetime.date] = None,
+               until: Optional[datetime.date] = None, limit: Optional[int] = SEARCH_LIMIT, oldest_first: bool = False) -> List[Dict]:
+        """
+        Items containing every word (normalized like the index), mentioning the CVE and dated
+        within [since, until], newest first. CVE IDs typed among the words count as `cve` too.
+        """
+        cve_ids = extract_cves(words, cve or "")
+        terms = tokenize_and_normalize(CVE_ID.sub(" ", words))
+        if cve and not cve_ids:
+            return []
+        where, params = [], []
+        for term in sorted(terms): # each term narrows through its postings
+            where.append("id IN (SELECT item_id FROM postings WHERE term = ?)")
+            params.append(term)
+        for cve_id in cve_ids:
+            where.append("id IN (SELECT item_id FROM cves WHERE cve = ?)")
+            params.append(cve_id)
+        if since:
+            where.append("day >= ?")
+            params.append(since.isoformat())
+        if until:
+            where.append("day <= ?")
+            params.append(until.isoformat())
+        sql = (
+            "SELECT id, day, title, radar, bullets, link FROM items"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY day {'ASC' if oldest_first else 'DESC'}, id {'ASC' if oldest_first else 'DESC'}"
+            + (" LIMIT ?" if limit else "")
+        )
+        with self._lock:
+            rows = self.db.execute(sql, params + ([limit] if limit else [])).fetchall()
+            cves = self._cves([row[0] for row in rows])
+        return [
+            {"day": day, "title": title, "rundown_text": radar, "bullets": json.loads(bullets), "link": link, "cves": cves.get(item_id, [])}
+            for item_id, day, title, radar, bullets, link in rows
+        ]
+
+    def _cves(self, item_ids: List[int]) -> Dict[int, List[str]]:
+        out: Dict[int, List[str]] = {}
+        for start in range(0, len(item_ids), 500): # stay under SQLite's bound-parameter limit
+            chunk = item_ids[start:start + 500]
+            for cve, item_id in self.db.execute(f"SELECT cve, item_id FROM cves WHERE item_id IN ({','.join('?' * len(chunk))})", chunk):
+                out.setdefault(item_id, []).append(cve)
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            items, first, last = self.db.execute("SELECT COUNT(*), MIN(day), MAX(day) FROM items").fetchone()
+            days = self.db.execute("SELECT COUNT(DISTINCT day) FROM items").fetchone()[0]
+            terms = self.db.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+            cves = self.db.execute("SELECT COUNT(DISTINCT cve) FROM cves").fetchone()[0]
+        return {"items": items, "days": days, "first": first, "last": last, "terms": terms, "cves": cves}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+def _date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Search the archive of past digests.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_search = sub.add_parser("search", help="stories matching every keyword, CVE and date filter given")
+    p_search.add_argument("words", nargs="*", help="keywords; CVE IDs among them filter on the CVE")
+    p_search.add_argument("--cve", help="only stories mentioning this CVE ID")
+    p_search.add_argument("--since", type=_date, help="from this digest date on (YYYY-MM-DD)")
+    p_search.add_argument("--until", type=_date, help="up to this digest date (YYYY-MM-DD)")
+    p_search.add_argument("--oldest", action="store_true", help="oldest first, e.g. to find when something was first covered")
+    p_search.add_argument("--limit", type=int, default=SEARCH_LIMIT, help=f"results to show, 0 = all (default {SEARCH_LIMIT})")
+    p_search.add_argument("--json", action="store_true", help="print the results as JSON")
+    sub.add_parser("stats", help="show what the archive holds")
+    args = parser.parse_args(argv)
+
+    archive = Archive()
+    if args.command == "stats":
+        s = archive.stats()
+        print(f"{s['items']:,} stories from {s['days']:,} digests ({s['first'] or '-'} to {s['last'] or '-'}), "
+              f"{s['terms']:,} index terms, {s['cves']:,} CVE IDs in {archive.path}")
+    else:
+        t0 = time.perf_counter()
+        results = archive.search(" ".join(args.words), cve=args.cve, since=args.since, until=args.until,
+                                 limit=args.limit or None, oldest_first=args.oldest)
+        elapsed = time.perf_counter() - t0
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=1))
+        else:
+            for r in results:
+                print(f"{r['day']}  {r['title']}")
+                print(f"            {r['rundown_text']}")
+                print(f"            {r['link']}" + (f"  [{', '.join(r['cves'])}]" if r["cves"] else ""))
+            print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+import argparse, os, tomllib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from functools import cached_property
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from render import CardCache, RenderResult, render_digest
+
+AUDIENCES_FILE = Path(os.environ.get("DIGEST_AUDIENCES_FILE") or Path(__file__).resolve().parent.parent / "audiences.toml")
+
+# ── Audience settings ──────────────────────────────────────────────
+# Most stories summarised per run, shared by every audience (0 = no cap). The pool is every
+# audience's own top stories together; the cap bounds model calls when audiences overlap little.
+SUMMARY_POOL = int(os.environ.get("DIGEST_SUMMARY_POOL", 0))
+RENDER_WORKERS = 4          # audience variants rendered at once
+# ───────────────────────────────────────────────────────────────────
+
+
+@dataclass(frozen=True)
+class Audience:
+    """One entry of audiences.toml."""
+    name: str
+    recipients_env: str = "GMAIL_RECIPIENTS"
+    stories: int = 5
+    topics: tuple = ()
+    categories: tuple = ()
+    cve_only: bool = False
+    images: bool = True
+    bullets: bool = True
+    subject: str = "{headline}"
+    enabled: bool = True
+
+    @cached_property
+    def topic_tokens(self) -> tuple:
+        from dedup import tokenize_and_normalize
+        return tuple(frozenset(tokenize_and_normalize(t)) for t in self.topics if t.strip())
+
+    def recipients(self) -> List[str]:
+        return [email.strip() for email in os.environ.get(self.recipients_env, "").split(",") if email.strip()]
+
+    def matches(self, article: dict, categories: Dict[str, str]) -> bool:
+        """Whether a story passes this audience's filters; categories maps feed URL to feeds.toml category."""
+        if self.cve_only:
+            from rank import mentions_cve
+            if not mentions_cve(article):
+                return False
+        if self.categories and categories.get(article.get("feed", ""), "") not in self.categories:
+            return False
+        if self.topics:
+            from dedup import article_tokens
+            tokens = article_tokens(article)
+            return any(topic <= tokens for topic in self.topic_tokens)
+        return True
+
+    def pick(self, ranked: List[dict], categories: Dict[str, str], extra: int = 0) -> List[dict]:
+        return [a for a in ranked if self.matches(a, categories)][:self.stories + extra]
+
+
+DEFAULT_AUDIENCES = [Audience("everyone")] # used when there is no audiences.toml
+# What an audience with no matching story gets, same as summarise_rss on an empty day.
+NOTHING_FOUND = [{"title": "No fresh cybersecurity headlines found", "link": "#", "image_url": "",
+                  "rundown_text": "No fresh cybersecurity headlines found in the last 24h.", "bullets": [],
+                  "summary": "No fresh cybersecurity headlines found in the last 24h."}]
+
+
+def load_audiences(path: Optional[Path] = None) -> List[Audience]:
+    """Read the audience profiles, apply [defaults] and validate. Disabled audiences are left out."""
+    path = Path(path or AUDIENCES_FILE)
+    if not path.exists():
+        return list(DEFAULT_AUDIENCES)
+    with open(path, "rb") as fh:
+        data = tomllib.load(fh)
+    known = {f.name for f in fields(Audience)}
+    defaults = data.get("defaults", {})
+    audiences, seen = [], set()
+    for i, raw in enumerate(data.get("audience", []), 1):
+        entry = {**defaults, **raw}
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"{path}: audience #{i} has unknown key(s): {', '.join(sorted(unknown))}")
+        if not entry.get("name"):
+            raise ValueError(f"{path}: audience #{i} has no name")
+        if entry["name"] in seen:
+            raise ValueError(f"{path}: duplicate audience name {entry['name']}")
+        if int(entry.get("stories", 1)) < 1:
+            raise ValueError(f"{path}: audience {entry['name']} needs stories >= 1")
+        seen.add(entry["name"])
+        audience = Audience(**{**entry, "topics": tuple(entry.get("topics", ())), "categories": tuple(entry.get("categories", ()))})
+        if audience.enabled:
+            audiences.append(audience)
+    if not audiences:
+        raise ValueError(f"{path}: no enabled audience")
+    return audiences
+
+
+def feed_categories() -> Dict[str, str]:
+    from feeds import load_registry
+    try:
+        return {spec.url: spec.category for spec in load_registry()}
+    except (OSError, ValueError) as e:
+        print(f"WARN: audience category filters see no categories: {e}")
+        return {}
+
+
+def build_pool(ranked: List[dict], audiences: List[Audience], limit: int = SUMMARY_POOL, ahead: int = 0,
+               categories: Optional[Dict[str, str]] = None) -> List[dict]:
+    """
+    The stories to summarise, shared by every audience: the union of each audience's own top
+    stories (plus `ahead` more each), in rank order, so every audience gets exactly the stories
+    it would get on its own. `limit` (0 = none, plus `ahead`) caps the union; past it stories are
+    taken round-robin from each audience's picks, best first, so no audience is crowded out.
+    """
+    categories = feed_categories() if categories is None else categories
+    picks = [a.pick(ranked, categories, ahead) for a in audiences]
+    cap = limit + ahead if limit else sum(map(len, picks))
+    chosen = set()
+    for depth in range(max(map(len, picks), default=0)):
+        for p in picks:
+            if len(chosen) >= cap:
+                break
+            if depth < len(p):
+                chosen.add(p[depth]["link"])
+    return [a for a in ranked if a["link"] in chosen]
+
+
+@dataclass
+class Variant:
+    """One audience's rendered digest."""
+    audience: Audience
+    subject: str
+    articles: List[dict]
+    result: RenderResult
+
+
+def render_variants(audiences: List[Audience], pool: List[dict], summaries: List[dict], welcome_message: str,
+                    headline: str, today_str: str, categories: Optional[Dict[str, str]] = None,
+                    max_workers: int = RENDER_WORKERS) -> Dict[str, Variant]:
+    """
+    Render every audience's digest from the shared pool (summaries[i] belongs to pool[i]),
+    concurrently, with one CardCache so a card shown to several audiences is built once.
+    """
+    categories = feed_categories() if categories is None else categories
+    by_link = {a["link"]: s for a, s in zip(pool, summaries)}
+    cards = CardCache()
+
+    def render_one(audience: Audience) -> Variant:
+        articles = audience.pick(pool, categories)
+        records = [by_link[a["link"]] for a in articles if a["link"] in by_link] or NOTHING_FOUND
+        result = render_digest(records, welcome_message, today_str, images=audience.images, bullets=audience.bullets, card_cache=cards)
+        subject = audience.subject.format(headline=headline, date=today_str)
+        print(f"DEBUG: [{audience.name}] {result.summary()}")
+        return Variant(audience, subject, articles[:result.stories], result)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(audiences))), thread_name_prefix="render") as executor:
+        variants = {v.audience.name: v for v in executor.map(render_one, audiences)}
+    print(f"DEBUG: {len(cards)} distinct card(s) rendered for {len(audiences)} audience(s), {cards.hits} reused")
+    return variants
+
+
+@dataclass
+class SendReport:
+    """What send_variants got out: the stories mailed to at least one audience, and the audiences whose send failed."""
+    sent: List[dict]
+    failed: Dict[str, str]   # audience name -> error
+
+    def summary(self) -> str:
+        return "; ".join(f"{name}: {error}" for name, error in self.failed.items())
+
+
+def send_variants(variants: Dict[str, Variant], send: Callable[[str, str, List[str]], object]) -> SendReport:
+    """
+    Hand each variant to `send(subject, html, recipients)`. Audiences without recipients are
+    skipped with a warning. An audience whose send raises is reported in the result's `failed`
+    and the others still go out, so the caller can record what was mailed before reporting it.
+    An error with a non-zero `delivered` count (send_email.DeliveryError) means the audience
+    partly went out: it is reported as failed, and its stories count as sent.
+    """
+    sent, seen, failed = [], set(), {}
+    for name, variant in variants.items():
+        recipients = variant.audience.recipients()
+        if not recipients:
+            print(f"WARN: audience {name!r} skipped: {variant.audience.recipients_env} is empty")
+            continue
+        try:
+            send(variant.subject, variant.result.html, recipients)
+            print(f"DEBUG: [{name}] sent {variant.result.stories} stories to {len(recipients)} recipient(s)")
+        except Exception as e:
+            print(f"WARN: [{name}] send failed: {type(e).__name__}: {e}")
+            failed[name] = f"{type(e).__name__}: {e}"
+            if not getattr(e, "delivered", 0):
+                continue
+        for article in variant.articles:
+            if article["link"] not in seen:
+                seen.add(article["link"])
+                sent.append(article)
+    return SendReport(sent, failed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Show the audience profiles.")
+    parser.parse_args(argv)
+    audiences = load_audiences()
+    for a in audiences:
+        filters = [f"topics: {', '.join(a.topics)}"] if a.topics else []
+        filters += [f"categories: {', '.join(a.categories)}"] if a.categories else []
+        filters += ["CVE only"] if a.cve_only else []
+        layout = ", ".join(x for x, on in (("images", a.images), ("bullets", a.bullets)) if on) or "compact"
+        print(f"{a.name:<12}{a.stories:>3} stories  {layout:<16} {len(a.recipients()):>3} recipient(s) via {a.recipients_env:<24} {'; '.join(filters) or 'all stories'}")
+    print(f"{len(audiences)} enabled audience(s) in {AUDIENCES_FILE if AUDIENCES_FILE.exists() else '(defaults)'}")
+
+
+if __name__ == "__main__":
+    main()
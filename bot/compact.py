@@ -0,0 +1,84 @@
+from __future__ import annotations
+import html, os, re
+from functools import lru_cache
+from typing import List
+
+from llm import estimate_tokens
+
+# ── Prompt budgets ─────────────────────────────────────────────────
+# Estimated tokens (llm.estimate_tokens) of feed text each prompt may carry: per article, and
+# for all the articles of one call together. Article text beyond that adds cost and latency,
+# not better summaries.
+ARTICLE_TOKENS = int(os.environ.get("GEMINI_ARTICLE_TOKENS", 200))  # one article's description in a summary prompt
+CALL_TOKENS = {
+    "summary": ARTICLE_TOKENS,                                      # one article per prompt
+    "batch": int(os.environ.get("GEMINI_BATCH_TOKENS", 800)),      # all descriptions of a batch prompt
+    "welcome": 400,                                                 # the top stories' summaries
+    "headline": 150,                                                # the top stories' radar lines
+}
+CONTEXT_TOKENS = 80         # most of that any one story gets in the welcome/headline context
+# ───────────────────────────────────────────────────────────────────
+
+# Feed boilerplate that carries nothing about the story: WordPress footers, "read more" links,
+# truncation markers.
+BOILERPLATE = [re.compile(p, re.IGNORECASE) for p in (
+    r"\bThe post\b.{0,300}?\bappeared first on\b.{0,120}?(?:\.|$)",
+    r"\bThis (?:article|post|story) (?:was |is )?(?:originally )?(?:published|appeared) (?:on|at|in|first on)\b.{0,120}?(?:\.|$)",
+    r"\b(?:Continue reading|Read more|Read the full (?:article|story)|Click here to read)\b.{0,120}$",
+    r"\[\s*(?:…|\.\.\.|&hellip;)\s*\]",
+    r"(?:…|\.\.\.)\s*$",
+)]
+# A sentence ends at . ! or ? followed by whitespace and what looks like the next sentence's start.
+SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z0-9])")
+INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad")) # zero-width characters and soft hyphens
+
+
+@lru_cache(maxsize=4096)
+def clean_text(text: str) -> str:
+    """Decode leftover (double-escaped) entities, drop feed boilerplate and collapse whitespace."""
+    for _ in range(2): # "&amp;#8217;" survives one decode
+        decoded = html.unescape(text)
+        if decoded == text:
+            break
+        text = decoded
+    text = text.translate(INVISIBLE)
+    text = " ".join(text.split())
+    for pattern in BOILERPLATE:
+        text = pattern.sub("", text)
+    return " ".join(text.split())
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Keep whole sentences while they fit in max_tokens; a first sentence that doesn't fit is cut at a word."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept = ""
+    for sentence in SENTENCE_END.split(text):
+        candidate = f"{kept} {sentence}" if kept else sentence
+        if estimate_tokens(candidate) > max_tokens:
+            break
+        kept = candidate
+    if kept:
+        return kept
+    words = text[:max(0, max_tokens * 4 - 1)].rsplit(" ", 1)[0] # estimate_tokens counts four characters per token
+    return f"{words}…" if words else ""
+
+
+def compact(text: str, max_tokens: int = ARTICLE_TOKENS) -> str:
+    return truncate(clean_text(text or ""), max_tokens)
+
+
+def compact_all(texts: List[str], budget: int, per_item: int = ARTICLE_TOKENS) -> List[str]:
+    """
+    Compact several texts for one prompt: each to at most per_item tokens and all of them to
+    `budget` together. Short texts go first, and what they leave of their even share is split
+    among the longer ones.
+    """
+    cleaned = [clean_text(t or "") for t in texts]
+    out = [""] * len(cleaned)
+    left, remaining = budget, len(cleaned)
+    for i in sorted(range(len(cleaned)), key=lambda i: len(cleaned[i])):
+        out[i] = truncate(cleaned[i], min(per_item, left // remaining))
+        left -= estimate_tokens(out[i]) if out[i] else 0
+        remaining -= 1
+    return out
@@ -0,0 +1,328 @@
+from __future__ import annotations
+import argparse, datetime, fcntl, json, os, signal, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import agent
+from audiences import Audience, build_pool, load_audiences, render_variants, send_variants
+from dedup import deduplicate_articles
+from feeds import FeedScheduler
+from images import IMAGE_CHECK, apply_images, pick_images
+from llm import TOKENS, get_model
+from llm_cache import default_cache
+from metrics import TRACER
+from rank import rank_articles
+from rss import today_items
+from send_email import close_default_sender, default_sender, send_html_email
+from sent_index import SentIndex, normalize_link
+from state import state_path
+
+# ── Daemon settings ────────────────────────────────────────────────
+POLL_MINUTES = float(os.environ.get("DIGEST_POLL_MINUTES", 30))   # how often due feeds are polled
+SEND_AT = os.environ.get("DIGEST_SEND_AT", "03:45")               # HH:MM UTC, same slot as the workflow cron
+PREPARE_HOURS = float(os.environ.get("DIGEST_PREPARE_HOURS", 2))  # welcome/headline are drafted this close to send time
+SUMMARISE_AHEAD = 3         # summarise this many stories beyond each audience's picks, so a late reshuffle needs no model call
+CANDIDATE_HOURS = 24        # candidates published longer ago than this are dropped
+# ───────────────────────────────────────────────────────────────────
+
+
+def _send_slot(now: datetime.datetime, send_at: str = SEND_AT) -> datetime.datetime:
+    """The most recent send time at or before `now` (UTC)."""
+    hour, minute = (int(x) for x in send_at.split(":"))
+    slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return slot if slot <= now else slot - datetime.timedelta(days=1)
+
+
+class DigestStore:
+    """
+    Everything the daemon has prepared for the next digest, in SQLite under .state: candidate
+    articles (deduplicated, with their summary once one exists) and a few key/value entries
+    (last send slot, drafted welcome and headline). A restarted daemon picks up from here. Thread-safe.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else state_path("daemon.sqlite3")
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS candidates (
+                link_key  TEXT PRIMARY KEY,
+                article   TEXT NOT NULL,     -- JSON digest item
+                published REAL NOT NULL,     -- epoch seconds, for the rolling window
+                summary   TEXT               -- JSON summary record, once summarised
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def articles(self) -> List[dict]:
+        with self._lock:
+            return [json.loads(row[0]) for row in self.db.execute("SELECT article FROM candidates ORDER BY rowid")]
+
+    def known(self, article: dict) -> bool:
+        link_key = normalize_link(article.get("link", ""))
+        if not link_key: # link-less stories can't be told apart by link; dedup compares their content
+            return False
+        with self._lock:
+            return self.db.execute("SELECT 1 FROM candidates WHERE link_key = ?", (link_key,)).fetchone() is not None
+
+    def save(self, articles: List[dict]) -> None:
+        """Insert or update candidates, keeping any summary already stored for them."""
+        rows = []
+        for a in articles:
+            try:
+                published = datetime.datetime.fromisoformat(a["published"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                published = time.time()
+            rows.append((normalize_link(a.get("link", "")), json.dumps(a), published))
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT INTO candidates (link_key, article, published) VALUES (?, ?, ?) "
+                "ON CONFLICT(link_key) DO UPDATE SET article = excluded.article",
+                rows,
+            )
+
+    def summaries(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self.db.execute("SELECT link_key, summary FROM candidates WHERE summary IS NOT NULL").fetchall()
+        return {key: json.loads(summary) for key, summary in rows}
+
+    def set_summary(self, article: dict, record: dict) -> None:
+        with self._lock, self.db:
+            self.db.execute("UPDATE candidates SET summary = ? WHERE link_key = ?", (json.dumps(record), normalize_link(article.get("link", ""))))
+
+    def drop(self, articles: List[dict]) -> None:
+        with self._lock, self.db:
+            self.db.executemany("DELETE FROM candidates WHERE link_key = ?", [(normalize_link(a.get("link", "")),) for a in articles])
+
+    def prune(self, hours: float = CANDIDATE_HOURS) -> int:
+        with self._lock, self.db:
+            return self.db.execute("DELETE FROM candidates WHERE published < ?", (time.time() - hours * 3600,)).rowcount
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key: str, value) -> None:
+        with self._lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+
+class _SeenFilter:
+    """sent_index stand-in for today_items that also skips items already among the candidates, so they don't use up max_items."""
+
+    def __init__(self, sent_index: SentIndex, store: DigestStore):
+        self.sent_index, self.store = sent_index, store
+
+    def was_sent(self, article: dict) -> bool:
+        return self.store.known(article) or self.sent_index.was_sent(article)
+
+    def filter_unsent(self, articles: List[dict]) -> List[dict]:
+        return [a for a in self.sent_index.filter_unsent(articles) if not self.store.known(a)]
+
+
+class Daemon:
+    """
+    Resident digest service. Every poll_minutes it fetches whatever feeds are due, folds new items
+    into the stored candidates (dedup against what is already there, bumping coverage), re-ranks,
+    and summarises any story of the audiences' shared pool that has no summary yet. Close to send
+    time it also drafts the welcome message and headline. At send time it only renders and mails
+    every audience's variant of what is prepared.
+    The Gemini models and the Gmail client are built once and reused; all progress is in
+    DigestStore, so stopping (SIGTERM/SIGINT finish the current step first) and restarting is safe.
+    """
+
+    def __init__(self, store: Optional[DigestStore] = None, sent_index: Optional[SentIndex] = None,
+                 poll_minutes: float = POLL_MINUTES, send_at: str = SEND_AT, audiences: Optional[List[Audience]] = None):
+        self.store = store or DigestStore()
+        self.sent_index = sent_index or SentIndex()
+        self.scheduler = FeedScheduler()
+        self.poll_minutes = poll_minutes
+        self.send_at = send_at
+        self.audiences = audiences or load_audiences()
+        self.stop = threading.Event()
+        if self.store.get("last_slot") is None: # first start: the next slot is the first send, nothing to catch up
+            self.store.put("last_slot", _send_slot(self._now(), send_at).isoformat())
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def warm_up(self) -> None:
+        """Build the model and Gmail clients now rather than at send time."""
+        for model_name in ("gemini-2.5-pro", "gemini-2.5-flash"):
+            get_model(model_name)
+        default_sender()
+
+    def poll(self) -> int:
+        """Fetch due feeds and add the new, non-duplicate items to the candidates. Returns how many were added."""
+        fresh = today_items(max_items=agent.CANDIDATE_POOL, sent_index=_SeenFilter(self.sent_index, self.store), scheduler=self.scheduler)
+        pruned = self.store.prune()
+        if not fresh:
+            print(f"DEBUG: poll: nothing new ({len(self.store)} candidates, {pruned} expired)")
+            return 0
+        stored = self.store.articles()
+        prior = {normalize_link(a["link"]): a.get("coverage", 1) for a in stored}
+        kept = deduplicate_articles(stored + fresh, similarity_threshold=0.7)
+        for a in kept:
+            key = normalize_link(a["link"])
+            if key in prior: # coverage so far, plus the feeds newly found carrying the same story
+                a["coverage"] = prior[key] + a["coverage"] - 1
+        added = len(kept) - len(stored)
+        self.store.save(kept)
+        print(f"DEBUG: poll: {len(fresh)} new item(s), {added} after dedup ({len(self.store)} candidates, {pruned} expired)")
+        return added
+
+    def summarise(self) -> List[dict]:
+        """Rank the candidates and summarise the pool's stories that don't have a summary yet. Returns the ranking."""
+        ranked = rank_articles(self.store.articles())
+        done = self.store.summaries()
+        pool = build_pool(ranked, self.audiences, ahead=SUMMARISE_AHEAD)
+        missing = [a for a in pool if normalize_link(a["link"]) not in done]
+        if missing:
+            for article, record in zip(missing, agent.summarise_rss(missing, bullets=len(missing))):
+                self.store.set_summary(article, record)
+            print(f"DEBUG: summarised {len(missing)} new top stor{'y' if len(missing) == 1 else 'ies'}")
+        return ranked
+
+    def _top(self, ranked: List[dict]) -> tuple:
+        """The shared pool's articles and their summary records; summarises on the spot anything still missing."""
+        top = build_pool(ranked, self.audiences)
+        done = self.store.summaries()
+        missing = [a for a in top if normalize_link(a["link"]) not in done]
+        if missing:
+            for article, record in zip(missing, agent.summarise_rss(missing, bullets=len(missing))):
+                self.store.set_summary(article, record)
+            done = self.store.summaries()
+        return top, [done[normalize_link(a["link"])] for a in top]
+
+    def prepare(self, ranked: List[dict], today_str: str) -> dict:
+        """Welcome message and headline for the current pool, reusing the stored draft if the pool hasn't changed."""
+        top, summaries = self._top(ranked)
+        self._images(top) # probed now, so send time only reads the image cache
+        links = [a["link"] for a in top]
+        draft = self.store.get("draft")
+        if draft and draft["links"] == links and draft["date"] == today_str:
+            return draft
+        draft = {
+            "links": links,
+            "date": today_str,
+            "welcome": agent.generate_welcome_message(top),
+            "headline": agent.generate_email_headline(summaries, today_str),
+        }
+        self.store.put("draft", draft)
+        print(f"DEBUG: drafted welcome and headline for {len(top)} stories")
+        return draft
+
+    def _images(self, articles: List[dict]) -> dict:
+        if not IMAGE_CHECK or not articles or not any(a.images for a in self.audiences):
+            return {}
+        return pick_images(articles)
+
+    def send(self, slot: datetime.datetime) -> None:
+        """
+        Render and mail every audience's prepared digest for `slot`, then forget what was sent.
+        The slot counts as done even when some audiences failed; they are reported, not retried.
+        """
+        t0 = time.monotonic()
+        today_str = slot.strftime("%d %b %Y")
+        ranked = rank_articles(self.store.articles())
+        top, summaries = self._top(ranked)
+        if top:
+            draft = self.prepare(ranked, today_str)
+        else: # quiet day: the same fallbacks the one-shot run uses
+            draft = {"welcome": agent.generate_welcome_message([]), "headline": agent.generate_email_headline([], today_str)}
+        summaries = apply_images(summaries, top, self._images(top))
+        variants = render_variants(self.audiences, top, summaries, draft["welcome"], draft["headline"], today_str)
+        report = send_variants(variants, send_html_email)
+        self.sent_index.mark_sent(report.sent)
+        agent.archive_sent(report.sent, top, summaries, slot.date())
+        self.store.drop(report.sent)
+        self.store.put("last_slot", slot.isoformat()) # even if an audience failed: the others must not get it again
+        print(f"DEBUG: {TOKENS.summary()}")
+        TOKENS.reset() # the token budget is per digest
+        delivered = len(variants) - len(report.failed)
+        print(f"✅ Sent the {today_str} digest ({len(report.sent)} stories, {delivered} audience(s)) in {time.monotonic() - t0:.1f}s")
+        if report.failed:
+            print(f"❌ {len(report.failed)} audience(s) did not get the {today_str} digest: {report.summary()}")
+
+    def step(self) -> None:
+        """One round: send if a send slot is due, otherwise poll and prepare."""
+        now = self._now()
+        slot = _send_slot(now, self.send_at)
+        if slot.isoformat() > self.store.get("last_slot", ""):
+            if now - slot > datetime.timedelta(minutes=self.poll_minutes): # catching up after downtime: refresh first
+                self.poll()
+                self.summarise()
+            self.send(slot)
+        else:
+            self.poll()
+            ranked = self.summarise()
+            next_slot = slot + datetime.timedelta(days=1)
+            if ranked and next_slot - now <= datetime.timedelta(hours=PREPARE_HOURS):
+                self.prepare(ranked, next_slot.strftime("%d %b %Y"))
+        print(f"DEBUG: {default_cache().summary()}")
+        TRACER.write_json()
+        TRACER.reset()
+
+    def seconds_until_next(self) -> float:
+        now = self._now()
+        next_slot = _send_slot(now, self.send_at) + datetime.timedelta(days=1)
+        return max(0.0, min(self.poll_minutes * 60, (next_slot - now).total_seconds()))
+
+    def run(self, once: bool = False) -> None:
+        """Poll/send until stopped. The first signal lets the current step finish; a second one exits at once."""
+        def handle(signum, frame):
+            print(f"DEBUG: {signal.Signals(signum).name} received, stopping after the current step")
+            self.stop.set()
+            signal.signal(signum, signal.SIG_DFL)
+
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+        self.warm_up()
+        print(f"DEBUG: daemon up: polling every {self.poll_minutes:g} min, sending at {self.send_at} UTC, "
+              f"{len(self.store)} candidates carried over")
+        while not self.stop.is_set():
+            try:
+                self.step()
+            except Exception as e: # a bad round must not take the service down; the next one retries
+                print(f"WARN: daemon step failed: {e!r}")
+            if once:
+                break
+            self.stop.wait(self.seconds_until_next())
+        self.store.close()
+        self.sent_index.close()
+        close_default_sender()
+        print("DEBUG: daemon stopped; state kept in", self.store.path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the digest as a resident service: poll and summarise through the day, send at a fixed time.")
+    parser.add_argument("--poll-minutes", type=float, default=POLL_MINUTES, help=f"minutes between poll rounds (default {POLL_MINUTES:g})")
+    parser.add_argument("--send-at", default=SEND_AT, help=f"daily send time, HH:MM UTC (default {SEND_AT})")
+    parser.add_argument("--once", action="store_true", help="run a single round and exit")
+    args = parser.parse_args(argv)
+
+    with open(state_path("daemon.lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SystemExit(f"Another daemon is already using {lock.name}")
+        Daemon(poll_minutes=args.poll_minutes, send_at=args.send_at).run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
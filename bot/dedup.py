@@ -0,0 +1,215 @@
+from __future__ import annotations
+import re, threading, zlib
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from metrics import span
+
+# ── MinHash / LSH settings ─────────────────────────────────────────
+NUM_PERM = 128          # MinHash signature length (uint32 per slot → 512 bytes per article)
+LSH_RECALL = 0.995      # minimum chance that a pair exactly at the threshold becomes an LSH candidate
+_MERSENNE = np.uint64((1 << 31) - 1)  # prime modulus; keeps a*x + b inside uint64
+_rng = np.random.default_rng(0x5EED)  # fixed seed so signatures are stable across runs
+_PERM_A = _rng.integers(1, int(_MERSENNE), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, int(_MERSENNE), size=NUM_PERM, dtype=np.uint64)
+TOKEN_CACHE_SIZE = 8192 # article token sets kept at least; grows to the largest candidate list seen...
+TOKEN_CACHE_MAX = 50_000 # ...but never past this, so a long-running daemon's cache stays bounded
+# ───────────────────────────────────────────────────────────────────
+
+
+def tokenize_and_normalize(text: str) -> set[str]:
+    """
+    Tokenizes text, converts to lowercase, removes punctuation, and returns a set of unique words.
+    """
+    # Remove non-alphanumeric characters (keep spaces) and convert to lowercase
+    text = re.sub(r'[^\w\s]', '', text).lower()
+    # Split into words (split() with no separator never yields empty strings)
+    return set(text.split())
+
+def jaccard_similarity(set1: set[str], set2: set[str]) -> float:
+    """
+    Calculates the Jaccard similarity between two sets.
+    """
+    intersection = len(set1.intersection(set2))
+    union = len(set1.union(set2))
+    if union == 0:
+        return 0.0 # Avoid division by zero if both sets are empty
+    return intersection / union
+
+def article_text(article: dict) -> str:
+    return article.get('title', '') + " " + article.get('summary', '')
+
+class TokenCache:
+    """
+    LRU memo of text -> frozen token set, shared by dedup, ranking and audience filters so each
+    article is tokenized once per run. deduplicate_articles and rank_articles reserve() room for
+    their whole candidate list first, so a large run doesn't evict its own entries before
+    ranking reads them back. Thread-safe.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._data: OrderedDict[str, frozenset[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, n: int) -> None:
+        """Make room for n entries, up to TOKEN_CACHE_MAX (the cache never shrinks below TOKEN_CACHE_SIZE)."""
+        with self._lock:
+            self.maxsize = max(self.maxsize, min(n, TOKEN_CACHE_MAX))
+
+    def get(self, text: str) -> frozenset[str]:
+        with self._lock:
+            tokens = self._data.get(text)
+            if tokens is not None:
+                self._data.move_to_end(text)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+        tokens = frozenset(tokenize_and_normalize(text))
+        with self._lock:
+            self._data[text] = tokens
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return tokens
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+TOKEN_CACHE = TokenCache()
+
+def article_tokens(article: dict) -> frozenset[str]:
+    """tokenize_and_normalize(article_text(article)), memoized on the text (hence frozen)."""
+    return TOKEN_CACHE.get(article_text(article))
+
+def minhash_signature(tokens: set[str]) -> np.ndarray:
+    """
+    NUM_PERM-slot MinHash signature (uint32 array) of a token set.
+    The fraction of equal slots between two signatures estimates their Jaccard similarity.
+    """
+    hashes = np.fromiter((zlib.crc32(t.encode('utf-8')) for t in tokens), dtype=np.uint64, count=len(tokens))
+    hashes %= _MERSENNE
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE).min(axis=1).astype(np.uint32)
+
+def choose_bands(threshold: float, num_perm: int = NUM_PERM, recall: float = LSH_RECALL) -> tuple[int, int]:
+    """
+    Pick (bands, rows) for LSH banding: the most rows per band (fewest false candidates)
+    that still surfaces a pair at exactly `threshold` with probability >= `recall`.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+def _deduplicate_exact(articles: list[dict], similarity_threshold: float, clusters: list[list[dict]]) -> list[dict]:
+    deduplicated_articles = []
+    processed_article_signatures = [] # Stores (original_article_index, normalized_tokens_set) for comparison
+
+    for i, current_article in enumerate(articles):
+        current_tokens = article_tokens(current_article)
+
+        is_duplicate = False
+        for pos, (existing_article_idx, existing_tokens) in enumerate(processed_article_signatures):
+            similarity = jaccard_similarity(current_tokens, existing_tokens)
+            if similarity >= similarity_threshold:
+                # Optional: Uncomment the lines below for debugging to see which articles are skipped
+                # print(f"DEBUG: Skipping potential duplicate (Similarity {similarity:.2f}):")
+                # print(f"  Existing: {articles[existing_article_idx].get('title', '')}")
+                # print(f"  Current: {current_article.get('title', '')}")
+                is_duplicate = True
+                clusters[pos].append(current_article)
+                break
+
+        if not is_duplicate:
+            deduplicated_articles.append(current_article)
+            clusters.append([current_article])
+            # Store the index of the original article for reference if needed, and its token set
+            processed_article_signatures.append((i, current_tokens))
+
+    return deduplicated_articles
+
+def _deduplicate_minhash(articles: list[dict], similarity_threshold: float, verify: bool, clusters: list[list[dict]]) -> list[dict]:
+    bands, rows = choose_bands(similarity_threshold)
+    buckets = [defaultdict(list) for _ in range(bands)] # band -> {band bytes: [accepted positions]}
+    accepted_tokens = []
+    accepted_sigs = []
+    accepted_pos = [] # position in `clusters` of each article that has a signature
+    deduplicated_articles = []
+
+    for current_article in articles:
+        current_tokens = article_tokens(current_article)
+        if not current_tokens:
+            # Empty text is never similar to anything (jaccard_similarity returns 0.0).
+            deduplicated_articles.append(current_article)
+            clusters.append([current_article])
+            continue
+
+        sig = minhash_signature(current_tokens)
+        keys = [sig[b * rows:(b + 1) * rows].tobytes() for b in range(bands)]
+
+        candidates = set()
+        for band, key in zip(buckets, keys):
+            candidates.update(band.get(key, ()))
+
+        is_duplicate = False
+        for pos in sorted(candidates): # earliest accepted article first, like the exact scan
+            if verify:
+                similarity = jaccard_similarity(current_tokens, accepted_tokens[pos])
+            else:
+                similarity = float(np.count_nonzero(sig == accepted_sigs[pos])) / NUM_PERM
+            if similarity >= similarity_threshold:
+                is_duplicate = True
+                clusters[accepted_pos[pos]].append(current_article)
+                break
+
+        if not is_duplicate:
+            accepted_pos.append(len(clusters))
+            clusters.append([current_article])
+            pos = len(accepted_sigs)
+            accepted_sigs.append(sig)
+            accepted_tokens.append(current_tokens if verify else None)
+            for band, key in zip(buckets, keys):
+                band[key].append(pos)
+            deduplicated_articles.append(current_article)
+
+    return deduplicated_articles
+
+def deduplicate_articles(articles: list[dict], similarity_threshold: float = 0.7, engine: str = "minhash", verify: bool = True) -> list[dict]:
+    """
+    Deduplicates a list of articles based on Jaccard similarity of their combined title and summary.
+    Articles are compared against those already accepted into the deduplicated list.
+
+    engine="minhash" (default) only compares an article with accepted articles that share an
+    LSH band, so the cost grows roughly linearly with the number of articles. With verify=True
+    those candidates are checked with exact Jaccard, so the result matches engine="exact"
+    (the original all-pairs scan) except for the rare pair LSH fails to surface; with
+    verify=False the MinHash estimate is used instead and token sets aren't kept.
+
+    The kept articles are the caller's own dicts, not copies: each gets (in place) a "coverage"
+    key, how many different feeds carried the story (the article plus the duplicates folded
+    into it; articles without a "feed" count once each). The daemon relies on this to carry
+    coverage forward.
+    """
+    if engine not in ("exact", "minhash"):
+        raise ValueError(f"Unknown dedup engine: {engine!r}")
+    TOKEN_CACHE.reserve(len(articles))
+    with span("dedup", engine=engine) as s:
+        s.items_in = len(articles)
+        clusters: list[list[dict]] = [] # one per kept article, in output order
+        if engine == "exact":
+            unique = _deduplicate_exact(articles, similarity_threshold, clusters)
+        else:
+            unique = _deduplicate_minhash(articles, similarity_threshold, verify, clusters)
+        for article, members in zip(unique, clusters):
+            article["coverage"] = len({m.get("feed") or id(m) for m in members})
+        s.items_out = len(unique)
+        return unique
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from html import escape
+from html.parser import HTMLParser
+
+# selectolax (lexbor) parses an order of magnitude faster than html.parser. It's optional:
+# without it we fall back to the stdlib tokenizer BeautifulSoup's 'html.parser' sits on.
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover - depends on the environment
+    LexborHTMLParser = None
+
+# Elements dropped together with everything inside them.
+DROP_TAGS = {"script", "style", "iframe", "object", "embed", "form", "noscript", "template"}
+# Elements after which plain text needs a space so words from adjacent blocks don't merge.
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "td", "th",
+    "blockquote", "figure", "figcaption", "section", "article", "header", "footer", "pre", "hr",
+}
+BLOCK_SELECTOR = ", ".join(sorted(BLOCK_TAGS))
+VOID_TAGS = {"area", "base", "br", "col", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+URL_ATTRS = {"href", "src"}
+
+
+@dataclass
+class Extracted:
+    """Everything today_items needs from one HTML fragment."""
+    image_url: str   # src of the first <img>, or ""
+    text: str        # plain text, entities decoded, whitespace collapsed
+    html: str        # same markup minus scripts/embeds/event handlers
+
+
+def _safe_attr(name: str, value: str | None) -> bool:
+    if name.startswith("on"):
+        return False
+    if name in URL_ATTRS and value and value.strip().lower().startswith(("javascript:", "vbscript:", "data:text")):
+        return False
+    return True
+
+
+class _StreamExtractor(HTMLParser):
+    """Single tokenizer pass over a fragment: no tree is built, each tag is seen once."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.image_url = ""
+        self.text_parts: list[str] = []
+        self.html_parts: list[str] = []
+        self._drop_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_TAGS:
+            self._drop_depth += 1
+            return
+        if self._drop_depth:
+            return
+        if tag == "img" and not self.image_url:
+            self.image_url = dict(attrs).get("src") or ""
+        if tag in BLOCK_TAGS:
+            self.text_parts.append(" ")
+        kept = "".join(
+            f' {name}="{escape(value, quote=True)}"' if value is not None else f" {name}"
+            for name, value in attrs if _safe_attr(name, value)
+        )
+        self.html_parts.append(f"<{tag}{kept}>")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in DROP_TAGS:
+            self._drop_depth -= 1
+
+    def handle_endtag(self, tag):
+        if tag in DROP_TAGS:
+            self._drop_depth = max(0, self._drop_depth - 1)
+            return
+        if self._drop_depth or tag in VOID_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text_parts.append(" ")
+        self.html_parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self._drop_depth:
+            return
+        self.text_parts.append(data)
+        self.html_parts.append(escape(data, quote=False))
+
+
+def _extract_stdlib(fragment: str) -> Extracted:
+    parser = _StreamExtractor()
+    parser.feed(fragment)
+    parser.close()
+    text = " ".join("".join(parser.text_parts).split())
+    return Extracted(parser.image_url, text, "".join(parser.html_parts))
+
+
+def _extract_lexbor(fragment: str) -> Extracted:
+    tree = LexborHTMLParser(fragment)
+    root = tree.body
+    if root is None:
+        return Extracted("", "", "")
+    tree.strip_tags(list(DROP_TAGS))
+    image_url = ""
+    for node in root.traverse():
+        attrs = node.attributes
+        if not attrs:
+            continue
+        if node.tag == "img" and not image_url:
+            image_url = attrs.get("src") or ""
+        for name, value in list(attrs.items()):
+            if not _safe_attr(name, value):
+                del node.attrs[name]
+    html = root.inner_html or ""
+    # Space out block elements only, as _StreamExtractor does; a separator between every text
+    # node would also split inline markup ("<a>link</a>." -> "link .").
+    for node in root.css(BLOCK_SELECTOR):
+        node.insert_before(" ")
+        node.insert_after(" ")
+    text = " ".join(root.text(separator="").split())
+    return Extracted(image_url, text, html)
+
+
+BACKEND = "lexbor" if LexborHTMLParser is not None else "html.parser"
+
+
+def extract(fragment: str, backend: str | None = None) -> Extracted:
+    """Pull the first image, plain text and sanitized HTML out of a feed HTML fragment in one parse."""
+    if not fragment:
+        return Extracted("", "", "")
+    if "<" not in fragment and "&" not in fragment:
+        # Plain text summaries (common for description-only feeds) need no parse at all.
+        return Extracted("", " ".join(fragment.split()), fragment)
+    if (backend or BACKEND) == "lexbor" and LexborHTMLParser is not None:
+        return _extract_lexbor(fragment)
+    return _extract_stdlib(fragment)
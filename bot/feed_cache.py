@@ -0,0 +1,170 @@
+from __future__ import annotations
+import argparse, hashlib, os, pickle, threading, time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from state import STATE_DIR
+
+# ── Cache settings ─────────────────────────────────────────────────
+CACHE_MAX_BYTES = 50 * 1024 * 1024     # total on-disk budget for all cached feeds
+CACHE_MAX_AGE = 7 * 24 * 3600          # drop feeds we haven't refreshed in a week
+# ───────────────────────────────────────────────────────────────────
+
+
+@dataclass
+class CachedFeed:
+    """Validators and parsed entries from the last full (200) response for one feed URL."""
+    url: str
+    etag: str = ""
+    last_modified: str = ""
+    entries: list = field(default_factory=list)
+    stored_at: float = 0.0
+
+
+class FeedCache:
+    """
+    On-disk conditional-GET cache for feeds, one pickle file per URL.
+    Entries are stored as feedparser produced them, so a 304 skips both the download
+    and the parse. Files are only ever written by this bot, so pickle is fine here.
+    """
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: int = CACHE_MAX_BYTES, max_age: float = CACHE_MAX_AGE):
+        self.directory = Path(directory) if directory else STATE_DIR / "feed_cache"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url: str) -> Path:
+        return self.directory / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, url: str) -> Optional[CachedFeed]:
+        path = self._path(url)
+        try:
+            with open(path, "rb") as fh:
+                cached = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"WARN: dropping unreadable feed cache file {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        if cached.url != url:
+            return None
+        return cached
+
+    def conditional_headers(self, cached: Optional[CachedFeed]) -> Dict[str, str]:
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def put(self, url: str, etag: str, last_modified: str, entries: list) -> None:
+        if not (etag or last_modified):
+            return  # nothing to revalidate with next time, so don't bother storing
+        path = self._path(url)
+        tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+        with open(tmp, "wb") as fh:
+            pickle.dump(CachedFeed(url, etag, last_modified, entries, time.time()), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def touch(self, url: str) -> None:
+        """Mark a feed as recently used after a 304, so LRU eviction keeps it."""
+        try:
+            os.utime(self._path(url))
+        except FileNotFoundError:
+            pass
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _files(self) -> List[Tuple[Path, os.stat_result]]:
+        files = []
+        for path in self.directory.glob("*.pkl"):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                pass
+        return files
+
+    def prune(self) -> int:
+        """Evict feeds older than max_age, then least-recently-used ones until under max_bytes."""
+        now = time.time()
+        removed = 0
+        kept = []
+        for path, st in self._files():
+            if now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                kept.append((path, st))
+
+        total = sum(st.st_size for _, st in kept)
+        for path, st in sorted(kept, key=lambda p: p[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for path, _ in self._files():
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def stats(self) -> List[Dict[str, object]]:
+        rows = []
+        for path, st in self._files():
+            cached = None
+            try:
+                with open(path, "rb") as fh:
+                    cached = pickle.load(fh)
+            except Exception:
+                pass
+            rows.append({
+                "url": cached.url if cached else "?",
+                "etag": cached.etag if cached else "",
+                "last_modified": cached.last_modified if cached else "",
+                "entries": len(cached.entries) if cached else 0,
+                "bytes": st.st_size,
+                "age_hours": (time.time() - st.st_mtime) / 3600,
+            })
+        return sorted(rows, key=lambda r: r["url"])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or clear the on-disk feed cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="list cached feeds with their validators, entry counts and sizes")
+    sub.add_parser("prune", help="apply age and size eviction now")
+    sub.add_parser("clear", help="delete every cached feed")
+    args = parser.parse_args(argv)
+
+    cache = FeedCache()
+    if args.command == "stats":
+        rows = cache.stats()
+        for r in rows:
+            print(f"{r['bytes']:>9,}B  {r['entries']:>4} entries  {r['age_hours']:6.1f}h  {r['url']}")
+            print(f"{'':>12}etag={r['etag'] or '-'}  last-modified={r['last_modified'] or '-'}")
+        print(f"{len(rows)} feed(s), {sum(r['bytes'] for r in rows):,} bytes in {cache.directory}")
+    elif args.command == "prune":
+        print(f"Evicted {cache.prune()} feed(s) from {cache.directory}")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} feed(s) from {cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import datetime, email.utils, time
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, Optional
+
+from dateutil import parser as date_parser
+from feedparser import FeedParserDict
+
+# Namespaces whose elements we read; everything else is matched on its local name.
+CONTENT_NS = "http://purl.org/rss/1.0/modules/content/"
+MEDIA_NS = "http://search.yahoo.com/mrss/"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+ENTRY_TAGS = {"item", "entry"}
+
+def _split(tag: str) -> tuple:
+    if tag.startswith("{"):
+        ns, _, local = tag[1:].partition("}")
+        return ns, local
+    return "", tag
+
+
+def _text(elem: ET.Element) -> str:
+    """Element content as a string; XHTML children (Atom type="xhtml") are serialized back to markup."""
+    if len(elem) == 0:
+        return (elem.text or "").strip()
+    for node in elem.iter():
+        node.tag = _split(node.tag)[1] # plain <div>/<img>, not <html:div>; the entry is discarded afterwards anyway
+    return ((elem.text or "") + "".join(ET.tostring(child, encoding="unicode") for child in elem)).strip()
+
+
+def parse_date(value: str) -> Optional[time.struct_time]:
+    """RFC 822 (RSS) or ISO 8601 (Atom) date → UTC struct_time, like feedparser's *_parsed fields."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            dt = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            try:
+                dt = date_parser.parse(value)
+            except (ValueError, OverflowError):
+                return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.utctimetuple()
+
+
+def element_to_entry(elem: ET.Element) -> FeedParserDict:
+    """
+    One <item> (RSS) or <entry> (Atom) as a FeedParserDict with the fields rss.entry_to_item
+    reads: title, link, summary, content, media_content, enclosures, published/updated_parsed.
+    """
+    e = FeedParserDict(media_content=[], links=[]) # feedparser derives e.enclosures from rel="enclosure" links
+    children = list(elem)
+    for group in [c for c in children if c.tag == f"{{{MEDIA_NS}}}group"]:
+        children.extend(group) # media:group wraps media:content alternatives
+    for child in children:
+        ns, name = _split(child.tag)
+        if name == "title" and "title" not in e:
+            e["title"] = _text(child)
+        elif name == "link":
+            href, rel = child.get("href"), child.get("rel", "alternate")
+            if href is None:
+                e.setdefault("link", (child.text or "").strip())
+            elif rel == "enclosure":
+                e["links"].append(FeedParserDict(rel="enclosure", href=href, type=child.get("type", "")))
+            elif rel == "alternate":
+                e.setdefault("link", href)
+        elif name in ("description", "summary") and ns != MEDIA_NS:
+            e.setdefault("summary", _text(child))
+        elif (name == "encoded" and ns == CONTENT_NS) or (name == "content" and ns == ATOM_NS):
+            e.setdefault("content", [FeedParserDict(value=_text(child), type=child.get("type", "text/html"))])
+        elif name == "content" and ns == MEDIA_NS and child.get("url"):
+            e["media_content"].append({"url": child.get("url"), "type": child.get("type") or child.get("medium", "")})
+        elif name == "enclosure" and child.get("url"):
+            e["links"].append(FeedParserDict(rel="enclosure", href=child.get("url"), type=child.get("type", "")))
+        elif name in ("pubDate", "published", "date", "issued") and "published_parsed" not in e:
+            e["published_parsed"] = parse_date(child.text)
+        elif name in ("updated", "modified") and "updated_parsed" not in e:
+            e["updated_parsed"] = parse_date(child.text)
+    if "summary" not in e and "content" in e: # feedparser does the same for content-only Atom entries
+        e["summary"] = e["content"][0].value
+    return e
+
+
+def iter_entries(chunks: Iterable[bytes]) -> Iterator[FeedParserDict]:
+    """
+    Incrementally parse an RSS/Atom document fed as byte chunks, yielding each entry as soon as
+    its closing tag arrives. Finished entries are removed from the tree, so memory stays flat
+    however long the feed is. Stop iterating to stop reading. Raises ET.ParseError on broken XML.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack = []
+    depth = 0 # how many entry elements we are inside (entries don't nest, but be safe)
+
+    def drain() -> Iterator[FeedParserDict]:
+        nonlocal depth
+        for event, elem in parser.read_events():
+            if event == "start":
+                stack.append(elem)
+                if _split(elem.tag)[1] in ENTRY_TAGS:
+                    depth += 1
+                continue
+            stack.pop()
+            if _split(elem.tag)[1] in ENTRY_TAGS:
+                depth -= 1
+                if depth == 0:
+                    yield element_to_entry(elem)
+                    elem.clear()
+                    if stack:
+                        stack[-1].remove(elem)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import argparse, datetime, os, sqlite3, threading, time, tomllib
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from state import state_path
+
+REGISTRY_FILE = Path(os.environ.get("DIGEST_FEEDS_FILE") or Path(__file__).resolve().parent.parent / "feeds.toml")
+
+# ── Polling schedule settings ──────────────────────────────────────
+MAX_SKIP_HOURS = float(os.environ.get("DIGEST_MAX_SKIP_HOURS", 72))  # no feed goes unpolled longer than this
+MIN_POLL_HOURS = 0.25       # never poll one feed more often than this
+TARGET_NEW_ITEMS = 1.0      # aim to poll once about this many new items are expected
+RATE_WINDOW_DAYS = 7        # entry timestamps older than this don't count towards the rate
+RATE_SMOOTHING = 0.5        # weight of the newest rate estimate against the running one
+POLL_SLACK_HOURS = 0.5      # scheduled runs drift; a feed due within this long is polled now
+POLL_BUDGET = int(os.environ.get("DIGEST_POLL_BUDGET", 0))           # feeds per round; 0 = every due feed
+# one-shot runs: read a skipped feed back to its last poll instead of just hours_back (the daemon always does)
+READ_BACK = os.environ.get("DIGEST_READ_BACK", "").lower() in ("1", "true", "yes")
+# ───────────────────────────────────────────────────────────────────
+
+
+@dataclass(frozen=True)
+class FeedSpec:
+    """One entry of feeds.toml."""
+    url: str
+    name: str = ""
+    weight: float = 1.0
+    category: str = "news"
+    cadence_hours: float = 6.0   # starting guess for the scheduler
+    date_ordered: bool = True    # parser hint: entries are newest first
+    enabled: bool = True
+
+
+def load_registry(path: Optional[Path] = None) -> List[FeedSpec]:
+    """Read the feed registry, apply [defaults] and validate. Disabled feeds are left out."""
+    path = Path(path or REGISTRY_FILE)
+    with open(path, "rb") as fh:
+        data = tomllib.load(fh)
+    known = {f.name for f in fields(FeedSpec)}
+    defaults = data.get("defaults", {})
+    specs, seen = [], set()
+    for i, raw in enumerate(data.get("feed", []), 1):
+        entry = {**defaults, **raw}
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"{path}: feed #{i} has unknown key(s): {', '.join(sorted(unknown))}")
+        if not entry.get("url"):
+            raise ValueError(f"{path}: feed #{i} has no url")
+        if entry["url"] in seen:
+            raise ValueError(f"{path}: duplicate feed url {entry['url']}")
+        if float(entry.get("cadence_hours", 1)) <= 0 or float(entry.get("weight", 1)) < 0:
+            raise ValueError(f"{path}: feed {entry['url']} needs cadence_hours > 0 and weight >= 0")
+        seen.add(entry["url"])
+        spec = FeedSpec(**{**entry, "name": entry.get("name") or entry["url"]})
+        if spec.enabled:
+            specs.append(spec)
+    return specs
+
+
+def estimate_rate(stamps: Iterable[float], now: float, window_days: float = RATE_WINDOW_DAYS) -> float:
+    """
+    Posts per hour from a feed's entry timestamps (epoch seconds). Feeds only list their latest
+    few entries, so the rate is taken over the span those entries actually cover, up to now.
+    """
+    stamps = [s for s in stamps if s <= now + 3600] # ignore entries dated in the future
+    if not stamps:
+        return 0.0
+    window_start = now - window_days * 86400
+    recent = [s for s in stamps if s >= window_start]
+    # If the feed still lists something older than the window, the whole window is covered.
+    covered_from = window_start if min(stamps) < window_start else min(stamps)
+    return len(recent) / max(1.0, (now - covered_from) / 3600)
+
+
+class FeedScheduler:
+    """
+    Decides which feeds to poll this round. Each feed's publish rate is learned from the entry
+    timestamps seen on every poll, and its poll interval is the time it takes to expect
+    TARGET_NEW_ITEMS new entries, clamped to [MIN_POLL_HOURS, max_skip_hours]. With read_back, a
+    feed skipped on earlier rounds is read back to its last poll rather than the caller's window,
+    which can be up to max_skip_hours old. State is kept in SQLite under .state; thread-safe.
+    """
+
+    def __init__(self, registry: Optional[List[FeedSpec]] = None, path: Optional[Path] = None,
+                 max_skip_hours: float = MAX_SKIP_HOURS, budget: int = POLL_BUDGET, read_back: bool = True):
+        self.specs: Dict[str, FeedSpec] = {s.url: s for s in (load_registry() if registry is None else registry)}
+        self.path = Path(path) if path else state_path("feed_schedule.sqlite3")
+        self.max_skip_hours = max_skip_hours
+        self.budget = budget
+        self.read_back = read_back
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS schedule (
+                url          TEXT PRIMARY KEY,
+                rate         REAL NOT NULL,     -- learned posts per hour
+                last_polled  REAL NOT NULL,     -- last successful poll (epoch seconds)
+                newest_entry REAL NOT NULL,
+                polls        INTEGER NOT NULL
+            );
+            """
+        )
+
+    def spec(self, url: str) -> FeedSpec:
+        return self.specs.get(url) or FeedSpec(url, name=url)
+
+    def _row(self, url: str):
+        return self.db.execute("SELECT rate, last_polled, newest_entry, polls FROM schedule WHERE url = ?", (url,)).fetchone()
+
+    def interval_hours(self, rate: float) -> float:
+        if rate <= 0:
+            return self.max_skip_hours
+        return min(self.max_skip_hours, max(MIN_POLL_HOURS, TARGET_NEW_ITEMS / rate))
+
+    def last_polled(self, url: str) -> Optional[float]:
+        with self._lock:
+            row = self._row(url)
+        return row[1] if row else None
+
+    def due(self, urls: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """
+        Feeds to poll now, in the order given. Never-polled feeds and feeds at the max-skip limit
+        always go; with a budget, the rest are ranked by expected new items × weight.
+        """
+        now = time.time() if now is None else now
+        forced, optional, order = [], [], {}
+        with self._lock:
+            for i, url in enumerate(urls):
+                order[url] = i
+                row = self._row(url)
+                if row is None:
+                    forced.append(url)
+                    continue
+                rate, last_polled = row[0], row[1]
+                waited = (now - last_polled) / 3600 + POLL_SLACK_HOURS
+                if waited >= self.max_skip_hours:
+                    forced.append(url)
+                elif waited >= self.interval_hours(rate):
+                    optional.append((rate * waited * self.spec(url).weight, url))
+        ranked = [url for _, url in sorted(optional, reverse=True)]
+        if self.budget:
+            ranked = ranked[:max(0, self.budget - len(forced))] # forced feeds go even past the budget
+        return sorted(forced + ranked, key=order.get)
+
+    def record(self, url: str, stamps: List[float], now: Optional[float] = None) -> None:
+        """Fold one successful poll's entry timestamps into the feed's rate."""
+        now = time.time() if now is None else now
+        observed = estimate_rate(stamps, now)
+        with self._lock, self.db:
+            row = self._row(url)
+            if row is None:
+                rate = RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) / self.spec(url).cadence_hours
+                newest, polls = 0.0, 0
+            else:
+                rate = RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * row[0]
+                newest, polls = row[2], row[3]
+            self.db.execute(
+                "INSERT OR REPLACE INTO schedule (url, rate, last_polled, newest_entry, polls) VALUES (?, ?, ?, ?, ?)",
+                (url, rate, now, max([newest, *stamps]), polls + 1),
+            )
+
+    def rows(self) -> List[tuple]:
+        with self._lock:
+            return self.db.execute("SELECT url, rate, last_polled, newest_entry, polls FROM schedule ORDER BY url").fetchall()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect the feed registry and polling schedule.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the feeds in feeds.toml")
+    sub.add_parser("schedule", help="show each feed's learned rate, interval and next poll")
+    args = parser.parse_args(argv)
+
+    registry = load_registry()
+    if args.command == "list":
+        for spec in registry:
+            hints = "date-ordered" if spec.date_ordered else "unordered"
+            print(f"{spec.weight:>5.1f}  {spec.category:<15} {f'every ~{spec.cadence_hours:g}h':<13} {hints:<13} {spec.name}  <{spec.url}>")
+        print(f"{len(registry)} enabled feed(s) in {REGISTRY_FILE}")
+    elif args.command == "schedule":
+        scheduler = FeedScheduler(registry)
+        now = time.time()
+        state = {row[0]: row for row in scheduler.rows()}
+        due = set(scheduler.due([s.url for s in registry], now))
+        print(f"{'posts/day':>9}{'interval':>10}{'next poll':>18}  feed")
+        for spec in registry:
+            if spec.url not in state:
+                print(f"{'?':>9}{'?':>10}{'now (new)':>18}  {spec.name}")
+                continue
+            _, rate, last_polled, _, _ = state[spec.url]
+            interval = scheduler.interval_hours(rate)
+            when = "now" if spec.url in due else datetime.datetime.fromtimestamp(last_polled + interval * 3600).strftime("%d %b %H:%M")
+            print(f"{rate * 24:>9.1f}{interval:>9.1f}h{when:>18}  {spec.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+from __future__ import annotations
+import argparse, os, re, sqlite3, struct, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from metrics import span
+from state import state_path
+
+if TYPE_CHECKING: # requests is imported where it is used, so apply_images costs render --dry-run nothing
+    import requests
+
+# ── Image check settings ───────────────────────────────────────────
+IMAGE_CHECK = os.environ.get("DIGEST_IMAGE_CHECK", "1").lower() not in ("0", "false", "no")
+CONNECT_TIMEOUT = 2.0       # seconds to reach an image host
+READ_TIMEOUT = 3.0          # seconds per read, and for the whole probe of one URL
+MAX_WORKERS = 8             # stories whose images are checked at the same time
+PROBE_BYTES = 32 * 1024     # ranged GET for the first bytes: type, size and dimensions in one request
+MIN_BYTES = 2 * 1024        # smaller files are tracking pixels, spacers or icons
+MIN_SIDE = 200              # px; narrower or shorter images look broken at card width
+MAX_BYTES = 5 * 1024 * 1024 # bigger files are slow to load in a mail client
+MAX_SIDE = 8000             # px
+CACHE_TTL = 7 * 24 * 3600   # accepted and rejected images are not probed again for a week
+RETRY_TTL = 3600            # timeouts, 5xx and connection errors are retried after an hour
+USER_AGENT = "CyberDigestBot/1.0 (+https://github.com/throwaway666-ui/Cybersecurity-Newsletter)"
+# ───────────────────────────────────────────────────────────────────
+
+CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@dataclass
+class ImageInfo:
+    """What probing one image URL found; reason says why it was rejected ("" when ok)."""
+    url: str
+    ok: bool
+    reason: str = ""
+    content_type: str = ""
+    length: Optional[int] = None   # bytes, when the server said
+    width: Optional[int] = None
+    height: Optional[int] = None
+    transient: bool = False        # the check itself failed (timeout, 5xx...): retry sooner
+
+
+def image_size(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """(format, width, height) from the first bytes of a PNG, GIF, JPEG or WebP file, else None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return "png", *struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return "gif", *struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            w, h = struct.unpack("<HH", data[26:30])
+            return "webp", w & 0x3FFF, h & 0x3FFF
+        if chunk == b"VP8L":
+            b = data[21:25]
+            return "webp", 1 + (((b[1] & 0x3F) << 8) | b[0]), 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        if chunk == b"VP8X":
+            return "webp", 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+        return None
+    if data[:2] == b"\xff\xd8": # walk the JPEG segments up to the first start-of-frame
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF:
+                i += 1
+                continue
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            if marker in JPEG_SOF:
+                h, w = struct.unpack(">HH", data[i + 5:i + 9])
+                return "jpeg", w, h
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def _total_length(response: requests.Response) -> Optional[int]:
+    if response.status_code == 206:
+        match = CONTENT_RANGE_TOTAL.search(response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+    length = response.headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
+
+def judge(url: str, content_type: str, length: Optional[int], head: bytes) -> ImageInfo:
+    """Accept or reject an image from its response headers and first bytes."""
+    size = image_size(head)
+    info = ImageInfo(url, False, content_type=content_type, length=length,
+                     width=size[1] if size else None, height=size[2] if size else None)
+    if "svg" in content_type:
+        info.reason = "SVG (most mail clients don't show it)"
+    elif not size and not content_type.startswith("image/"):
+        info.reason = f"not an image ({content_type or 'no content type'})"
+    elif length is not None and length < MIN_BYTES:
+        info.reason = f"tiny ({length} bytes)"
+    elif length is not None and length > MAX_BYTES:
+        info.reason = f"too large ({length / 1e6:.1f} MB)"
+    elif size and min(size[1], size[2]) < MIN_SIDE:
+        info.reason = f"too small ({size[1]}×{size[2]})"
+    elif size and max(size[1], size[2]) > MAX_SIDE:
+        info.reason = f"too large ({size[1]}×{size[2]})"
+    else:
+        info.ok = True
+    return info
+
+
+def probe(session: requests.Session, url: str, connect_timeout: float = CONNECT_TIMEOUT,
+          read_timeout: float = READ_TIMEOUT) -> ImageInfo:
+    """
+    One ranged GET for the first PROBE_BYTES: the headers give type and total size (Content-Range,
+    or Content-Length when the server ignores Range) and the bytes give the dimensions, so a HEAD
+    request would only add a round trip. At most PROBE_BYTES are read even from a full response.
+    """
+    import requests
+    if not url.lower().startswith(("http://", "https://")):
+        return ImageInfo(url, False, "not an http(s) URL")
+    deadline = time.monotonic() + read_timeout
+    try:
+        with session.get(url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}, stream=True,
+                         timeout=(connect_timeout, read_timeout), allow_redirects=True) as response:
+            if response.status_code >= 400:
+                return ImageInfo(url, False, f"HTTP {response.status_code}", transient=response.status_code >= 500 or response.status_code == 429)
+            head = bytearray()
+            for chunk in response.iter_content(8192):
+                head += chunk
+                if len(head) >= PROBE_BYTES:
+                    break
+                if time.monotonic() > deadline:
+                    return ImageInfo(url, False, "too slow", transient=True)
+            length = _total_length(response)
+            if length is None and len(head) < PROBE_BYTES: # the whole file arrived
+                length = len(head)
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            return judge(url, content_type, length, bytes(head))
+    except requests.RequestException as e:
+        return ImageInfo(url, False, type(e).__name__, transient=True)
+
+
+class ImageCache:
+    """
+    Probe results by image URL, in SQLite under .state, so images that recur across runs (and
+    across the daemon's polls) are never probed again while fresh. Thread-safe.
+    """
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = CACHE_TTL, retry_ttl: float = RETRY_TTL):
+        self.path = Path(path) if path else state_path("image_cache.sqlite3")
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                url          TEXT PRIMARY KEY,
+                ok           INTEGER NOT NULL,
+                reason       TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                length       INTEGER,
+                width        INTEGER,
+                height       INTEGER,
+                expires_at   REAL NOT NULL
+            );
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def get(self, url: str) -> Optional[ImageInfo]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT ok, reason, content_type, length, width, height FROM images WHERE url = ? AND expires_at > ?", (url, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        ok, reason, content_type, length, width, height = row
+        return ImageInfo(url, bool(ok), reason, content_type, length, width, height)
+
+    def put(self, info: ImageInfo) -> None:
+        expires_at = time.time() + (self.retry_ttl if info.transient else self.ttl)
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO images (url, ok, reason, content_type, length, width, height, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (info.url, int(info.ok), info.reason, info.content_type, info.length, info.width, info.height, expires_at),
+            )
+
+    def prune(self) -> int:
+        with self._lock, self.db:
+            return self.db.execute("DELETE FROM images WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+
+def _make_session(pool_size: int) -> requests.Session:
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def candidates(article: dict) -> List[str]:
+    """The article's image URLs in preference order (rss.entry_to_item collects them)."""
+    urls = article.get("image_candidates") or [article.get("image_url", "")]
+    return [u for u in dict.fromkeys(urls) if u]
+
+
+def pick_images(articles: List[dict], cache: Optional[ImageCache] = None, session: Optional[requests.Session] = None,
+                max_workers: int = MAX_WORKERS) -> Dict[str, Optional[ImageInfo]]:
+    """
+    The first acceptable image of each article, by link (None: no candidate passed). Articles
+    are checked concurrently over one pooled session; each tries its candidates in order, and
+    every result goes into the cache.
+    """
+    own_cache = cache is None
+    if own_cache:
+        cache = ImageCache()
+    session = session or _make_session(max_workers)
+    rejected: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def check(url: str) -> ImageInfo:
+        info = cache.get(url)
+        if info is None:
+            info = probe(session, url)
+            cache.put(info)
+        if not info.ok:
+            with lock:
+                reason = info.reason.split(" (")[0]
+                rejected[reason] = rejected.get(reason, 0) + 1
+        return info
+
+    def first_ok(article: dict) -> Optional[ImageInfo]:
+        for url in candidates(article):
+            info = check(url)
+            if info.ok:
+                return info
+        return None
+
+    with span("images") as s:
+        s.items_in = len(articles)
+        hits, misses = cache.hits, cache.misses
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(articles) or 1)), thread_name_prefix="images") as executor:
+            found = dict(zip((a["link"] for a in articles), executor.map(first_ok, articles)))
+        s.items_out = sum(1 for info in found.values() if info)
+        s.cache_hits, s.cache_misses = cache.hits - hits, cache.misses - misses
+        s.attrs["rejected"] = rejected
+    print(f"DEBUG: images: {s.items_out} of {len(articles)} stories have a usable image; "
+          f"{s.cache_misses} URL(s) probed, {s.cache_hits} cached" + (f"; rejected {rejected}" if rejected else ""))
+    if own_cache:
+        cache.prune()
+        cache.close()
+    return found
+
+
+def apply_images(records: List[dict], articles: List[dict], found: Dict[str, Optional[ImageInfo]]) -> List[dict]:
+    """
+    Copies of the summary records (records[i] belongs to articles[i]) with the checked image and
+    its dimensions; a story whose candidates all failed gets no image. Articles that weren't
+    checked (not in found) keep theirs.
+    """
+    out = []
+    for record, article in zip(records, articles):
+        if article["link"] in found:
+            info = found[article["link"]]
+            record = {**record, "image_url": info.url if info else "",
+                      "image_width": info.width if info else None, "image_height": info.height if info else None}
+        out.append(record)
+    return out + records[len(articles):]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check image URLs the way the digest does.")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--no-cache", action="store_true", help="probe even if a fresh result is cached")
+    args = parser.parse_args(argv)
+    session = _make_session(MAX_WORKERS)
+    cache = None if args.no_cache else ImageCache()
+    for url in args.urls:
+        info = (cache.get(url) if cache else None) or probe(session, url)
+        if cache:
+            cache.put(info)
+        dims = f"{info.width}×{info.height}" if info.width else "?×?"
+        size = f"{info.length:,} B" if info.length is not None else "? B"
+        print(f"{'OK  ' if info.ok else 'SKIP'} {dims:>11} {size:>12} {info.content_type or '-':<12} {url}" + (f"  ({info.reason})" if info.reason else ""))
+
+
+if __name__ == "__main__":
+    main()
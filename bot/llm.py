@@ -0,0 +1,265 @@
+from __future__ import annotations
+import os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from llm_cache import LLMCache, cache_key, default_cache
+from metrics import span
+
+# ── Model call settings ────────────────────────────────────────────
+LLM_MAX_WORKERS = int(os.environ.get("GEMINI_MAX_WORKERS", 4))       # concurrent calls per stage
+LLM_RPM = int(os.environ.get("GEMINI_RPM", 60))                      # requests per minute, per model
+LLM_TPM = int(os.environ.get("GEMINI_TPM", 1_000_000))               # prompt tokens per minute, per model
+LLM_CALL_TIMEOUT = float(os.environ.get("GEMINI_CALL_TIMEOUT", 90))  # seconds per call, retries included
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE = 1.0   # first retry waits up to this many seconds, doubling each time
+LLM_BACKOFF_CAP = 30.0
+LLM_RUN_TOKENS = int(os.environ.get("GEMINI_RUN_TOKENS", 0))         # tokens in + out per run, all models; 0 = no cap
+# ───────────────────────────────────────────────────────────────────
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def __getattr__(name: str):
+    # google.generativeai takes most of a second to import, so `llm.genai` is loaded on first use.
+    if name == "genai":
+        import google.generativeai as genai
+        globals()["genai"] = genai
+        return genai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def transient_errors() -> tuple:
+    """
+    Errors worth retrying: quota pushback, server hiccups and network trouble. The REST transport
+    raises requests/urllib3 errors for resets and timeouts, and those don't derive from the
+    builtin ConnectionError/TimeoutError.
+    """
+    from google.api_core import exceptions as google_exceptions
+    import requests, urllib3
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.BadGateway,
+        ConnectionError,
+        TimeoutError,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.ProtocolError,
+        urllib3.exceptions.TimeoutError,
+        urllib3.exceptions.NewConnectionError,
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token for English prose)."""
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """Token buckets for requests and prompt tokens per minute, shared by every thread calling one model."""
+
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> None:
+        tokens = min(tokens, self.tpm) # a single oversized prompt must still get through eventually
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._stamp
+                self._stamp = now
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60 / self.rpm, (tokens - self._tokens) * 60 / self.tpm)
+            time.sleep(wait)
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """A model call would take the run over LLM_RUN_TOKENS."""
+
+
+class TokenLedger:
+    """
+    Tokens spent by this run's model calls (cache hits are free), per prompt template, with an
+    optional cap. Counts are the API's usage metadata when the response has it, else estimates.
+    Thread-safe; call reset() between runs of a long-lived process.
+    """
+
+    def __init__(self, limit: int = LLM_RUN_TOKENS):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.tokens_in = 0
+            self.tokens_out = 0
+            self.reserved = 0 # prompt tokens of calls in flight
+            self.by_template: Dict[str, List[int]] = {}
+
+    def reserve(self, tokens_in: int) -> None:
+        """
+        Hold tokens_in for a call about to be made, or raise TokenBudgetExceeded if that would go
+        over the cap. Checked and held under one lock, so concurrent calls can't all pass the
+        check and overshoot together. Settle with charge(..., reserved=tokens_in) or release().
+        """
+        with self._lock:
+            spent = self.tokens_in + self.tokens_out + self.reserved
+            if self.limit and spent + tokens_in > self.limit:
+                raise TokenBudgetExceeded(f"run token budget spent: {spent:,} of {self.limit:,}, next prompt ~{tokens_in:,}")
+            self.reserved += tokens_in
+
+    def release(self, tokens_in: int) -> None:
+        """Give back a reservation whose call failed."""
+        with self._lock:
+            self.reserved = max(0, self.reserved - tokens_in)
+
+    def charge(self, template: str, tokens_in: int, tokens_out: int, reserved: int = 0) -> None:
+        with self._lock:
+            self.reserved = max(0, self.reserved - reserved)
+            self.calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            counts = self.by_template.setdefault(template or "-", [0, 0, 0])
+            counts[0] += 1
+            counts[1] += tokens_in
+            counts[2] += tokens_out
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = ", ".join(f"{t} {n}×{i:,}→{o:,}" for t, (n, i, o) in sorted(self.by_template.items()))
+            cap = f" of {self.limit:,}" if self.limit else ""
+            return f"LLM tokens: {self.tokens_in:,} in, {self.tokens_out:,} out{cap} over {self.calls} call(s)" + (f" [{parts}]" if parts else "")
+
+
+TOKENS = TokenLedger()
+
+
+def _usage(response, prompt: str, text: str) -> tuple:
+    """(tokens in, tokens out) from the response's usage metadata, or estimated locally."""
+    usage = getattr(response, "usage_metadata", None)
+    tokens_in = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+    tokens_out = getattr(usage, "candidates_token_count", 0) or estimate_tokens(text)
+    return tokens_in, tokens_out
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model_name: str) -> RateLimiter:
+    """One limiter per model name, since quotas are per model."""
+    with _limiters_lock:
+        if model_name not in _limiters:
+            _limiters[model_name] = RateLimiter()
+        return _limiters[model_name]
+
+
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_name: str):
+    """Shared GenerativeModel per model name; genai is configured from GENAI_API_KEY on first use."""
+    import google.generativeai as genai
+    with _models_lock:
+        if not _models:
+            genai.configure(api_key=os.environ["GENAI_API_KEY"])
+        if model_name not in _models:
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def generate_text(
+    model,
+    prompt: str,
+    template_version: str = "",
+    limiter: Optional[RateLimiter] = None,
+    retries: int = LLM_MAX_RETRIES,
+    timeout: float = LLM_CALL_TIMEOUT,
+    cache: Optional[LLMCache] = None,
+    generation_config: Optional[dict] = None,
+    ledger: Optional[TokenLedger] = None,
+) -> str:
+    """
+    model.generate_content(prompt).text with rate limiting, a deadline and jittered exponential
+    backoff on transient errors. Anything else, or running out of retries/time, re-raises.
+    Responses are cached by (model name, template_version, prompt); bump the template
+    version whenever a prompt's wording or expected output format changes. Token counts of
+    every call are logged and charged to the run's TokenLedger; the prompt is reserved against
+    the run's cap before calling, and TokenBudgetExceeded is raised instead once it is reached.
+    """
+    model_name = getattr(model, "model_name", "default")
+    with span("llm.generate", model=model_name, template=template_version) as s:
+        s.bytes_in = len(prompt.encode("utf-8"))
+        s.attrs["tokens_in"] = estimate_tokens(prompt)
+        cache = cache or default_cache()
+        key = cache_key(model_name, template_version, prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            s.cache_hits = 1
+            s.bytes_out = len(cached.encode("utf-8"))
+            return cached
+        s.cache_misses = 1
+
+        ledger = ledger or TOKENS
+        reserved = s.attrs["tokens_in"]
+        ledger.reserve(reserved)
+        limiter = limiter or limiter_for(model_name)
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        try:
+            while True:
+                limiter.acquire(estimate_tokens(prompt))
+                remaining = deadline - time.monotonic()
+                try:
+                    response = model.generate_content(
+                        prompt, generation_config=generation_config, request_options={"timeout": max(1.0, remaining)}
+                    )
+                    text = response.text
+                    if text.strip():
+                        cache.put(key, model_name, template_version, text)
+                    s.bytes_out = len(text.encode("utf-8"))
+                    s.attrs["retries"] = attempt
+                    s.attrs["tokens_in"], s.attrs["tokens_out"] = _usage(response, prompt, text)
+                    ledger.charge(template_version, s.attrs["tokens_in"], s.attrs["tokens_out"], reserved=reserved)
+                    reserved = 0
+                    print(f"DEBUG: {model_name} {template_version or 'call'}: {s.attrs['tokens_in']:,} tokens in, {s.attrs['tokens_out']:,} out")
+                    return text
+                except transient_errors() as e:
+                    attempt += 1
+                    backoff = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+                    if attempt > retries or time.monotonic() + backoff >= deadline:
+                        raise
+                    print(f"WARN: transient model error ({type(e).__name__}: {e}); retry {attempt}/{retries} in {backoff:.1f}s")
+                    time.sleep(backoff)
+        finally:
+            if reserved:
+                ledger.release(reserved)
+
+
+def map_ordered(fn: Callable[[T], R], items: List[T], max_workers: int = LLM_MAX_WORKERS) -> List[R]:
+    """Run fn over items on a bounded thread pool; results come back in input order."""
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))), thread_name_prefix="llm") as pool:
+        return list(pool.map(fn, items))
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import argparse, hashlib, os, sqlite3, threading, time
+from pathlib import Path
+from typing import List, Optional
+
+from state import state_path
+
+# ── Cache settings ─────────────────────────────────────────────────
+LLM_CACHE_TTL = 3 * 24 * 3600       # stories rarely stay in feeds longer than this
+LLM_CACHE_MAX_ENTRIES = 5000        # least recently used responses go first beyond this
+# Set LLM_CACHE_BYPASS=1 to always call the model (responses are still stored).
+LLM_CACHE_BYPASS = os.environ.get("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+# ───────────────────────────────────────────────────────────────────
+
+
+def cache_key(model_name: str, template_version: str, prompt: str) -> str:
+    """Content address of one model call: same model + prompt template + prompt text → same key."""
+    h = hashlib.sha256()
+    for part in (model_name, template_version, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with TTL and LRU eviction, safe to share between threads."""
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, bypass: bool = LLM_CACHE_BYPASS):
+        self.path = Path(path) if path else state_path("llm_cache.sqlite3")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key        TEXT PRIMARY KEY,
+                model      TEXT NOT NULL,
+                template   TEXT NOT NULL,
+                response   TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at    REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_used ON responses(used_at);
+            """
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if self.bypass:
+                self.misses += 1
+                return None
+            now = time.time()
+            row = self.db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            with self.db:
+                self.db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model_name: str, template_version: str, response: str) -> None:
+        with self._lock, self.db:
+            now = time.time()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, template, response, created_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, template_version, response, now, now),
+            )
+
+    def prune(self) -> int:
+        """Drop expired responses, then the least recently used ones beyond max_entries."""
+        with self._lock, self.db:
+            removed = self.db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+            removed += self.db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        return removed
+
+    def clear(self) -> int:
+        with self._lock, self.db:
+            return self.db.execute("DELETE FROM responses").rowcount
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"LLM cache: {self.hits} hit(s), {self.misses} miss(es), hit rate {rate}" + (" [bypassed]" if self.bypass else "")
+
+
+_default: Optional[LLMCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> LLMCache:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LLMCache()
+        return _default
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or clear the model response cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="count cached responses per model and prompt template")
+    sub.add_parser("prune", help="apply TTL and LRU eviction now")
+    sub.add_parser("clear", help="delete every cached response")
+    args = parser.parse_args(argv)
+
+    cache = LLMCache()
+    if args.command == "stats":
+        rows = cache.db.execute(
+            "SELECT model, template, COUNT(*), SUM(LENGTH(response)), MIN(created_at) FROM responses GROUP BY model, template ORDER BY model, template"
+        ).fetchall()
+        for model, template, count, size, oldest in rows:
+            print(f"{count:>6} responses  {size:>10,} chars  oldest {(time.time() - oldest) / 3600:6.1f}h  {model}  {template}")
+        print(f"{sum(r[2] for r in rows)} response(s) in {cache.path}")
+    elif args.command == "prune":
+        print(f"Evicted {cache.prune()} response(s) from {cache.path}")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} response(s) from {cache.path}")
+
+
+if __name__ == "__main__":
+    main()
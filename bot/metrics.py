@@ -0,0 +1,194 @@
+from __future__ import annotations
+import cProfile, datetime, fnmatch, functools, json, os, re, threading, time, tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from state import STATE_DIR, state_path
+
+# ── Metrics settings ───────────────────────────────────────────────
+# Comma-separated span names (shell-style wildcards allowed) to profile, e.g.
+# DIGEST_PROFILE=stage.summarise or DIGEST_PROFILE="render,dedup". Off by default.
+PROFILE_SPANS = [p.strip() for p in os.environ.get("DIGEST_PROFILE", "").split(",") if p.strip()]
+PROFILE_DIR = Path(os.environ.get("DIGEST_PROFILE_DIR") or STATE_DIR / "profiles")
+METRICS_KEEP_DAYS = float(os.environ.get("DIGEST_METRICS_KEEP_DAYS", 14))  # run metrics files older than this are removed
+# ───────────────────────────────────────────────────────────────────
+
+
+@dataclass
+class Span:
+    """One timed piece of work. Counters are set by the code inside the `with` block."""
+    name: str
+    start: float                 # seconds since the tracer started
+    end: float = 0.0
+    thread: str = ""
+    items_in: int = 0
+    items_out: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    error: str = ""
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def elapsed(self) -> float:
+        return self.end - self.start
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of an unsorted list; 0.0 when empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+class _Profile:
+    """cProfile for the thread that opened the span plus a tracemalloc snapshot, dumped on exit."""
+    _active = threading.Lock() # only one cProfile can be enabled at a time
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.own_tracemalloc = not tracemalloc.is_tracing()
+        if self.own_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.profile.enable()
+
+    def dump(self) -> None:
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self.own_tracemalloc:
+            tracemalloc.stop()
+        stem = PROFILE_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', self.name)}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}"
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(f"{stem}.prof")
+        with open(f"{stem}.mem.txt", "w", encoding="utf-8") as f:
+            f.write(f"peak traced memory: {peak / 1024:.1f} KiB\n\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                f.write(f"{stat}\n")
+        print(f"DEBUG: profile of '{self.name}' written to {stem}.prof / .mem.txt (peak {peak / 1024 / 1024:.1f} MiB)")
+
+    @classmethod
+    def start_for(cls, name: str) -> Optional["_Profile"]:
+        if not any(fnmatch.fnmatchcase(name, p) for p in PROFILE_SPANS):
+            return None
+        if not cls._active.acquire(blocking=False):
+            print(f"WARN: not profiling '{name}', another span is already being profiled")
+            return None
+        return cls(name)
+
+    def finish(self) -> None:
+        try:
+            self.dump()
+        finally:
+            self._active.release()
+
+
+class Tracer:
+    """Collects spans from every thread of a run and reports them as JSON or a table."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.started_at = time.time()
+            self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        s = Span(name, time.perf_counter() - self._t0, thread=threading.current_thread().name, attrs=attrs)
+        profile = _Profile.start_for(name) if PROFILE_SPANS else None
+        try:
+            yield s
+        except BaseException as e:
+            s.error = type(e).__name__
+            raise
+        finally:
+            s.end = time.perf_counter() - self._t0
+            if profile:
+                profile.finish()
+            with self._lock:
+                self.spans.append(s)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """Decorator form of span(), for functions that don't report any counters."""
+        def wrap(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name or fn.__qualname__):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per span name: count, wall time percentiles and summed counters, in order of first appearance."""
+        with self._lock:
+            spans = list(self.spans)
+        groups: Dict[str, List[Span]] = {}
+        for s in sorted(spans, key=lambda s: s.start):
+            groups.setdefault(s.name, []).append(s)
+        out = {}
+        for name, group in groups.items():
+            times = [s.elapsed for s in group]
+            out[name] = {
+                "count": len(group),
+                "total_s": sum(times),
+                "p50_s": percentile(times, 50),
+                "p95_s": percentile(times, 95),
+                "max_s": max(times),
+                "errors": sum(1 for s in group if s.error),
+                **{k: sum(getattr(s, k) for s in group) for k in ("items_in", "items_out", "bytes_in", "bytes_out", "cache_hits", "cache_misses")},
+            }
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [asdict(s) for s in self.spans]
+        return {
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+            "wall_s": time.perf_counter() - self._t0,
+            "summary": self.summary(),
+            "spans": spans,
+        }
+
+    def write_json(self, path: Optional[Path] = None) -> Path:
+        """
+        Write this run's metrics (to .state/metrics/run-<time>.json unless a path is given). Files
+        are rotated by age, not count, since the daemon writes one per poll step.
+        """
+        if path is None:
+            path = state_path("metrics", f"run-{datetime.datetime.fromtimestamp(self.started_at):%Y%m%d-%H%M%S}.json")
+            expired = time.time() - METRICS_KEEP_DAYS * 86400
+            for old in path.parent.glob("run-*.json"):
+                try:
+                    if old.stat().st_mtime < expired:
+                        old.unlink()
+                except FileNotFoundError: # another process rotated it first
+                    pass
+        Path(path).write_text(json.dumps(self.to_dict(), indent=1, default=str), encoding="utf-8")
+        return Path(path)
+
+    def table(self) -> str:
+        lines = [f"{'span':<20}{'n':>5}{'total':>9}{'p50':>8}{'p95':>8}{'max':>8}{'items in→out':>15}{'KB in':>9}{'KB out':>9}{'cache h/m':>11}{'err':>5}"]
+        for name, m in self.summary().items():
+            lines.append(
+                f"{name:<20}{m['count']:>5}{m['total_s']:>8.2f}s{m['p50_s']:>7.2f}s{m['p95_s']:>7.2f}s{m['max_s']:>7.2f}s"
+                f"{str(m['items_in']) + '→' + str(m['items_out']):>15}{m['bytes_in'] / 1024:>9.1f}{m['bytes_out'] / 1024:>9.1f}"
+                f"{str(m['cache_hits']) + '/' + str(m['cache_misses']):>11}{m['errors']:>5}"
+            )
+        return "\n".join(lines)
+
+
+# One tracer per process; call TRACER.reset() between runs of a long-lived process.
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from metrics import span
+
+
+@dataclass
+class Stage:
+    """One named step. fn is called with the results of `deps`, in the order they are listed."""
+    name: str
+    fn: Callable[..., Any]
+    deps: Sequence[str] = ()
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class Pipeline:
+    """
+    A small DAG scheduler: each stage starts as soon as all of its dependencies have finished,
+    so independent stages overlap. The first failure cancels whatever hasn't started and is re-raised.
+    """
+    max_workers: int = 4
+    stages: Dict[str, Stage] = field(default_factory=dict)
+    results: Dict[str, Any] = field(default_factory=dict)
+    _t0: float = 0.0
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> None:
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [d for d in deps if d not in self.stages]
+        if missing: # stages must be added after their dependencies, which also rules out cycles
+            raise ValueError(f"Stage {name!r} depends on unknown stage(s): {', '.join(missing)}")
+        self.stages[name] = Stage(name, fn, tuple(deps))
+
+    def _run_stage(self, stage: Stage) -> Any:
+        stage.started = time.monotonic()
+        try:
+            with span(f"stage.{stage.name}"):
+                return stage.fn(*(self.results[d] for d in stage.deps))
+        finally:
+            stage.finished = time.monotonic()
+
+    def run(self) -> Dict[str, Any]:
+        self._t0 = time.monotonic()
+        pending = dict(self.stages)
+        running: Dict[Future, Stage] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(d in self.results for d in stage.deps):
+                        running[pool.submit(self._run_stage, stage)] = stage
+                        del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    stage = running.pop(fut)
+                    try:
+                        self.results[stage.name] = fut.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        print(f"❌ Stage '{stage.name}' failed after {stage.elapsed:.1f}s")
+                        raise
+        return self.results
+
+    def critical_path(self) -> List[Stage]:
+        """Chain of stages that determined the total runtime: from the last stage to finish, back through its latest-finishing dependency."""
+        if not self.stages:
+            return []
+        stage: Optional[Stage] = max(self.stages.values(), key=lambda s: s.finished)
+        path = []
+        while stage is not None:
+            path.append(stage)
+            stage = max((self.stages[d] for d in stage.deps), key=lambda s: s.finished, default=None)
+        return path[::-1]
+
+    def report(self) -> str:
+        critical = {s.name for s in self.critical_path()}
+        lines = [f"{'stage':<12}{'start':>8}{'end':>8}{'took':>8}  deps"]
+        for stage in sorted(self.stages.values(), key=lambda s: s.started):
+            lines.append(
+                f"{stage.name:<12}{stage.started - self._t0:>7.1f}s{stage.finished - self._t0:>7.1f}s{stage.elapsed:>7.1f}s"
+                f"  {', '.join(stage.deps) or '-'}{'  ◀ critical' if stage.name in critical else ''}"
+            )
+        return "\n".join(lines)
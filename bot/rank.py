@@ -0,0 +1,128 @@
+from __future__ import annotations
+import datetime
+from itertools import chain
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dedup import TOKEN_CACHE, article_tokens, tokenize_and_normalize
+from metrics import span
+
+# ── Ranking settings ───────────────────────────────────────────────
+# Score = source weight × (sum of weighted signals); each signal is roughly in [0, 1].
+RELEVANCE_WEIGHT = 1.0       # TF-IDF cosine against IMPACT_TERMS
+CENTRALITY_WEIGHT = 0.5      # TF-IDF cosine against the centroid of all candidates (today's big themes)
+CVE_WEIGHT = 0.6             # mentions a CVE; a little more per extra CVE ID
+COVERAGE_WEIGHT = 0.8        # carried by several feeds (dedup clusters), log2 scale
+RECENCY_WEIGHT = 0.7         # exponential decay on the publish time
+RECENCY_HALF_LIFE_HOURS = 12.0
+IMPACT_TERMS = (
+    "exploited exploit actively zero-day zeroday critical vulnerability vulnerabilities remote code execution rce "
+    "ransomware breach breached leak stolen attack attackers campaign backdoor malware botnet supply chain "
+    "patch emergency advisory cisa kev authentication bypass privilege escalation nation-state apt"
+)
+# ───────────────────────────────────────────────────────────────────
+
+def mentions_cve(article: dict) -> bool:
+    return "cve" in article["title"].lower() or "cve" in article["summary"].lower()
+
+
+def _cve_signal(tokens: frozenset[str]) -> float:
+    """mentions_cve on the article's (lowercased) tokens, plus a little per CVE ID."""
+    if "cve" not in " ".join(tokens):
+        return 0.0
+    ids = sum(1 for t in tokens if t.startswith("cve") and t[3:].isdigit()) # CVE-2025-1234 tokenizes to cve20251234
+    return min(1.0, 0.75 + 0.125 * ids) # "CVE" alone counts most of the way; 2+ IDs max it out
+
+
+def tfidf_scores(docs: List[frozenset[str]], query: set[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine similarity of every document to `query` and to the candidates' centroid, using binary
+    TF-IDF vectors. Vectors are kept as (doc, term, value) triplets, so the cost is linear in the
+    total number of tokens and no dense documents × vocabulary matrix is built.
+    """
+    n = len(docs)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+    flat = list(chain.from_iterable(docs))
+    vocab: Dict[str, int] = {t: i for i, t in enumerate(dict.fromkeys(flat))}
+    term_ids = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+    doc_ids = np.repeat(np.arange(n), [len(tokens) for tokens in docs])
+    if term_ids.size == 0:
+        return np.zeros(n), np.zeros(n)
+
+    df = np.bincount(term_ids, minlength=len(vocab))
+    idf = np.log((1 + n) / (1 + df)) + 1.0
+    values = idf[term_ids]
+    norms = np.sqrt(np.bincount(doc_ids, weights=values ** 2, minlength=n))
+    values /= norms[doc_ids]
+
+    q = np.zeros(len(vocab))
+    q_ids = [vocab[t] for t in query if t in vocab]
+    q[q_ids] = idf[q_ids]
+    q_norm = np.linalg.norm(q)
+    relevance = np.bincount(doc_ids, weights=values * q[term_ids], minlength=n) / q_norm if q_norm else np.zeros(n)
+
+    centroid = np.bincount(term_ids, weights=values, minlength=len(vocab)) / n
+    c_norm = np.linalg.norm(centroid)
+    centrality = np.bincount(doc_ids, weights=values * centroid[term_ids], minlength=n) / c_norm
+    return relevance, centrality
+
+
+def _recency(article: dict, now: datetime.datetime) -> float:
+    published = article.get("published")
+    if not published:
+        return 0.0
+    try:
+        age_hours = (now - datetime.datetime.fromisoformat(published)).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.5 ** (max(0.0, age_hours) / RECENCY_HALF_LIFE_HOURS)
+
+
+def _registry_weights() -> Dict[str, float]:
+    from feeds import load_registry
+    try:
+        return {spec.url: spec.weight for spec in load_registry()}
+    except (OSError, ValueError) as e:
+        print(f"WARN: ranking without source weights: {e}")
+        return {}
+
+
+def rank_articles(articles: List[dict], top_k: Optional[int] = None, now: Optional[datetime.datetime] = None,
+                  source_weights: Optional[Dict[str, float]] = None) -> List[dict]:
+    """
+    Order deduplicated articles by expected impact, best first, without any model call.
+    Signals: TF-IDF relevance to IMPACT_TERMS, centrality among today's candidates, CVE mentions,
+    cross-feed "coverage" from dedup, recency of "published"; the sum is scaled by the weight
+    feeds.toml gives the article's "feed". Ties keep feed order. Returned articles get a "score"
+    key; top_k cuts the list.
+    """
+    if not articles:
+        return []
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    weights = _registry_weights() if source_weights is None else source_weights
+    TOKEN_CACHE.reserve(len(articles))
+    with span("rank") as s:
+        s.items_in = len(articles)
+        hits = TOKEN_CACHE.hits
+        docs = [article_tokens(a) for a in articles]
+        s.cache_hits = TOKEN_CACHE.hits - hits
+        s.cache_misses = len(articles) - s.cache_hits
+        relevance, centrality = tfidf_scores(docs, tokenize_and_normalize(IMPACT_TERMS))
+        cve = np.fromiter(map(_cve_signal, docs), dtype=float, count=len(articles))
+        coverage = np.log2(np.fromiter((max(1, a.get("coverage", 1)) for a in articles), dtype=float, count=len(articles)))
+        recency = np.fromiter((_recency(a, now) for a in articles), dtype=float, count=len(articles))
+        source = np.fromiter((weights.get(a.get("feed"), 1.0) for a in articles), dtype=float, count=len(articles))
+
+        scores = source * (RELEVANCE_WEIGHT * relevance + CENTRALITY_WEIGHT * centrality + CVE_WEIGHT * cve
+                           + COVERAGE_WEIGHT * np.minimum(coverage, 2.0) / 2.0 + RECENCY_WEIGHT * recency)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        ranked = [articles[i] for i in order]
+        for article, score in zip(ranked, scores[order].tolist()):
+            article["score"] = round(score, 4)
+        s.items_out = len(ranked)
+
+    top = ranked[:min(top_k or 5, 5)]
+    print(f"DEBUG: ranked {len(articles)} candidate(s); top {len(top)}: " + ", ".join(f"{a['score']:.2f} {a['title'][:40]!r}" for a in top))
+    return ranked
@@ -0,0 +1,238 @@
+from __future__ import annotations
+import io, os, re, threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from html import escape
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from metrics import span
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "assets" / "templates"
+
+# Define the logo URL (using raw.githubusercontent.com as requested)
+LOGO_URL = "https://raw.githubusercontent.com/throwaway666-ui/Cybersecurity-Newsletter/main/assets/digest.png"
+
+# Gmail clips anything past ~102 KB of HTML; keep a little headroom under it by default.
+MAX_BYTES = int(os.environ.get("DIGEST_MAX_BYTES", 100_000))
+
+# ── Shared inline style fragments ──────────────────────────────────
+# Email clients ignore most <style> rules, so every card repeats these inline.
+CARD_STYLE = "margin-bottom:30px; padding:25px; border-radius:12px; background-color:#1E1E1E; box-shadow:0 6px 15px rgba(0,255,224,0.1);"
+CARD_TITLE_STYLE = "font-size:22px; color:#00F5D4; font-weight:700; margin:0 0 15px; line-height:1.3;"
+CARD_IMAGE_WIDTH = 550     # px; images checked by images.py get width/height attributes scaled to this
+CARD_IMAGE_STYLE = "width:100%; max-width:550px; height:auto; display:block; margin:0 auto 20px; border-radius:8px; object-fit:cover;"
+CARD_SMALL_IMAGE_STYLE = "max-width:100%; height:auto; display:block; margin:0 auto 20px; border-radius:8px;" # narrower than the card: not upscaled
+HEADING_STYLE = "font-weight:bold; color:#E0E0E0; font-size:16px; margin-bottom:10px;"
+RADAR_TEXT_STYLE = "font-weight:normal; color:#cccccc;"
+BULLET_LIST_STYLE = "padding-left:20px; margin:0; list-style-type:disc; color:#cccccc; font-size:15px; line-height:1.6;"
+BULLET_STYLE = "margin-bottom:8px;"
+DETAILS_TEXT_STYLE = "color:#cccccc; font-size:15px; line-height:1.7; margin:0;"
+BUTTON_STYLE = "display:inline-block; margin-top:20px; padding:12px 25px; background-color:#00FFE0; color:#121212; text-decoration:none; border-radius:8px; font-weight:bold; font-size:15px; transition:background-color 0.3s ease;"
+QUICK_LINK_STYLE = "color:#00F5D4; text-decoration:none;"
+# ───────────────────────────────────────────────────────────────────
+
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+@lru_cache(maxsize=None)
+def compile_template(name: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Load a template once and split it into literal chunks and `{{ name }}` slots:
+    chunks[0] slot[0] chunks[1] slot[1] ... chunks[-1].
+    """
+    text = (TEMPLATE_DIR / name).read_text(encoding="utf-8")
+    parts = _PLACEHOLDER_RE.split(text)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+def render_template(name: str, out: io.StringIO, values: Dict[str, str]) -> None:
+    chunks, slots = compile_template(name)
+    for chunk, slot in zip(chunks, slots):
+        out.write(chunk)
+        out.write(values[slot])
+    out.write(chunks[-1])
+
+
+_BETWEEN_TAGS_RE = re.compile(r">\s+<")
+_WS_RE = re.compile(r"\s{2,}")
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_PUNCT_RE = re.compile(r"\s*([:;{},])\s*")
+_STYLE_ATTR_RE = re.compile(r"style=([\"'])(.*?)\1", re.DOTALL)
+_STYLE_BLOCK_RE = re.compile(r"(<style[^>]*>)(.*?)(</style>)", re.DOTALL | re.IGNORECASE)
+_IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+
+
+def _minify_css(css: str) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    return _CSS_PUNCT_RE.sub(r"\1", _WS_RE.sub(" ", css)).strip().rstrip(";")
+
+
+def minify_html(html: str) -> str:
+    """Whitespace and CSS minifier for the digest. Safe because the digest has no <pre> blocks."""
+    html = _STYLE_BLOCK_RE.sub(lambda m: m.group(1) + _minify_css(m.group(2)) + m.group(3), html)
+    html = _STYLE_ATTR_RE.sub(lambda m: f"style={m.group(1)}{_minify_css(m.group(2))}{m.group(1)}", html)
+    html = _BETWEEN_TAGS_RE.sub("><", html)
+    return _WS_RE.sub(" ", html).strip()
+
+
+def _attr(value: str) -> str:
+    return escape(value or "", quote=True)
+
+
+def render_card(item: Dict, images: bool = True, bullets: bool = True) -> str:
+    """One story card. Every piece of text or URL from a feed or the model is escaped."""
+    out = io.StringIO()
+    title = _attr(item["title"])
+    out.write(f"<div style='{CARD_STYLE}'><h2 style='{CARD_TITLE_STYLE}'>{title}</h2>")
+    # Add image if available (for individual article images, not the main logo)
+    if images and item.get("image_url"):
+        width, height = item.get("image_width"), item.get("image_height")
+        if width and height:
+            scale = min(1.0, CARD_IMAGE_WIDTH / width)
+            size = f" width=\"{round(width * scale)}\" height=\"{round(height * scale)}\""
+            style = CARD_IMAGE_STYLE if width >= CARD_IMAGE_WIDTH else CARD_SMALL_IMAGE_STYLE
+        else:
+            size, style = "", CARD_IMAGE_STYLE
+        out.write(f"<img src=\"{_attr(item['image_url'])}\" alt=\"{title}\"{size} style=\"{style}\">")
+    out.write(
+        f"<p style='{HEADING_STYLE} margin-top:0;'>The Radar: <span style='{RADAR_TEXT_STYLE}'>{_attr(item.get('rundown_text', ''))}</span></p>"
+    )
+    points = [bp for bp in item.get("bullets") or [] if bp] if bullets else []
+    if points:
+        out.write(f"<p style='{HEADING_STYLE} margin-top:15px;'>The details:</p><ul style='{BULLET_LIST_STYLE}'>")
+        for bp in points:
+            out.write(f"<li style='{BULLET_STYLE}'>{_attr(bp)}</li>")
+        out.write("</ul>")
+    elif bullets and item.get("summary_content_html"):
+        # Fallback cards (no model summary) show the feed's own HTML, sanitized by extract.extract at fetch time.
+        details = item["summary_content_html"] if images else _IMG_TAG_RE.sub("", item["summary_content_html"])
+        out.write(f"<p style='{HEADING_STYLE} margin-top:15px;'>The details:</p><div style='{DETAILS_TEXT_STYLE}'>{details}</div>")
+    elif bullets and item.get("summary"):
+        out.write(f"<p style='{HEADING_STYLE} margin-top:15px;'>The details:</p><p style='{DETAILS_TEXT_STYLE}'>{_attr(item['summary'])}</p>")
+    out.write(f"<a href=\"{_attr(item['link'])}\" target=\"_blank\" style=\"{BUTTON_STYLE}\">Read More &gt;</a></div>")
+    return out.getvalue()
+
+
+class CardCache:
+    """
+    Rendered story cards shared between digest variants (audiences), so a card with the same
+    story and options is built once however many variants show it. Thread-safe.
+    """
+
+    def __init__(self):
+        self._cards: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def card(self, item: Dict, images: bool, bullets: bool) -> str:
+        key = (item["link"], item["title"], item.get("rundown_text", ""), images, bullets)
+        with self._lock:
+            html = self._cards.get(key)
+            if html is not None:
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = render_card(item, images=images, bullets=bullets) # two threads may both build it; same result
+        with self._lock:
+            self._cards[key] = html
+        return html
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+
+@dataclass
+class RenderResult:
+    html: str
+    size_bytes: int
+    stories: int
+    degradations: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        steps = ", ".join(self.degradations) or "none"
+        return f"Digest HTML {self.size_bytes:,} bytes, {self.stories} stories (degradations: {steps})"
+
+
+def _render(cards: List[str], links: List[str], welcome_message: str, today_str: str, minify: bool) -> str:
+    out = io.StringIO()
+    render_template("digest.html", out, {
+        "logo_url": _attr(LOGO_URL),
+        "today": _attr(today_str),
+        "year": _attr(today_str[-4:]),
+        "welcome": _attr(welcome_message),
+        "quick_links": "".join(links),
+        "stories": "".join(cards),
+    })
+    html = out.getvalue()
+    return minify_html(html) if minify else html
+
+
+def render_digest(summaries: List[Dict], welcome_message: str, today_str: str,
+                  max_bytes: int = MAX_BYTES, minify: bool = False, images: bool = True, bullets: bool = True,
+                  card_cache: Optional[CardCache] = None) -> RenderResult:
+    """
+    Render the digest and, while it is over max_bytes, degrade step by step:
+    minify, drop article images, drop bullet lists, then drop stories from the end.
+    images/bullets=False start from that layout. Pass one CardCache to every variant rendered
+    from the same summaries to share their cards.
+    """
+    with span("render") as s:
+        s.items_in = len(summaries)
+        hits, misses = (card_cache.hits, card_cache.misses) if card_cache is not None else (0, 0)
+        result = _render_within_budget(summaries, welcome_message, today_str, max_bytes, minify, images, bullets, card_cache)
+        if card_cache is not None: # approximate when variants render concurrently
+            s.cache_hits, s.cache_misses = card_cache.hits - hits, card_cache.misses - misses
+        s.items_out = result.stories
+        s.bytes_out = result.size_bytes
+        s.attrs["degradations"] = result.degradations
+        return result
+
+
+def _render_within_budget(summaries: List[Dict], welcome_message: str, today_str: str, max_bytes: int, minify: bool,
+                          images: bool = True, bullets: bool = True, card_cache: Optional[CardCache] = None) -> RenderResult:
+    count = len(summaries)
+    degradations = ["minified"] if minify else []
+    links = [f"<li><a href=\"{_attr(item['link'])}\" style=\"{QUICK_LINK_STYLE}\">{_attr(item['title'])}</a></li>\n" for item in summaries]
+    cards: Dict[Tuple[bool, bool], List[str]] = {} # each card variant is built once, however often we re-render
+
+    def attempt() -> str:
+        if (images, bullets) not in cards:
+            cards[images, bullets] = [card_cache.card(item, images, bullets) if card_cache is not None else render_card(item, images=images, bullets=bullets)
+                                      for item in summaries]
+        return _render(cards[images, bullets][:count], links[:count], welcome_message, today_str, minify)
+
+    html = attempt()
+    steps = [("minified", "minify"), ("no images", "images"), ("no bullet lists", "bullets")]
+    for label, knob in steps:
+        if len(html.encode("utf-8")) <= max_bytes:
+            break
+        if knob == "minify":
+            if minify:
+                continue
+            minify = True
+        elif knob == "images":
+            if not images:
+                continue
+            images = False
+        else:
+            if not bullets:
+                continue
+            bullets = False
+        degradations.append(label)
+        html = attempt()
+    if len(html.encode("utf-8")) > max_bytes and count > 1:
+        # Binary search for the most stories that still fit.
+        lo, hi = 1, count - 1
+        while lo < hi:
+            count = (lo + hi + 1) // 2
+            if len(attempt().encode("utf-8")) <= max_bytes:
+                lo = count
+            else:
+                hi = count - 1
+        count = lo
+        html = attempt()
+    if count < len(summaries):
+        degradations.append(f"dropped {len(summaries) - count} stories")
+    return RenderResult(html, len(html.encode("utf-8")), count, degradations)
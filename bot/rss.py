@@ -1,87 +1,481 @@
 from __future__ import annotations
-import datetime, feedparser, re
-from typing import List, Dict
-from bs4 import BeautifulSoup # Import BeautifulSoup is crucial
-
-FEEDS = [
-    "https://krebsonsecurity.com/feed/",
-    "https://feeds.feedburner.com/TheHackersNews",
-    "https://www.bleepingcomputer.com/feed/",
-]
-
-def today_items(max_items: int = 25, hours_back: int = 24) -> List[Dict[str, str]]:
-    """Return recent RSS items with title, summary (plain text), link, image_url, and summary_content_html."""
+import datetime, feedparser, os, queue, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Dict, Iterable, Iterator, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+from extract import extract
+from feed_cache import FeedCache
+from feed_stream import iter_entries
+from feeds import FeedScheduler, FeedSpec, load_registry
+from metrics import span
+
+# Feed URLs come from feeds.toml (see feeds.py for the per-feed settings).
+REGISTRY = {spec.url: spec for spec in load_registry()}
+FEEDS = list(REGISTRY)
+
+# ── Fetch settings ─────────────────────────────────────────────────
+CONNECT_TIMEOUT = 5.0   # seconds to establish a connection to one feed host
+READ_TIMEOUT = 15.0     # seconds to wait for one feed's response body
+FETCH_DEADLINE = 45.0   # seconds for the whole fetch round, across all feeds
+MAX_WORKERS = 8         # upper bound on feeds fetched at the same time
+USER_AGENT = "CyberDigestBot/1.0 (+https://github.com/throwaway666-ui/Cybersecurity-Newsletter)"
+# ───────────────────────────────────────────────────────────────────
+
+# ── Streaming settings ─────────────────────────────────────────────
+# Set DIGEST_STREAM_PARSE=0 to go back to downloading and feedparser-parsing whole feeds.
+STREAM_PARSE = os.environ.get("DIGEST_STREAM_PARSE", "1").lower() not in ("0", "false", "no")
+STREAM_CHUNK_BYTES = 16 * 1024
+ORDERED_STOP_AFTER = 3  # consecutive too-old entries before a date-ordered feed is abandoned (pinned posts come first)
+# ───────────────────────────────────────────────────────────────────
+
+
+class FetchDeadlineExceeded(RuntimeError):
+    """Raised by fetch_feeds when partial=False and some feeds missed the deadline."""
+
+
+@dataclass
+class FeedResult:
+    """Outcome of fetching one feed. status is "ok", "error" or "timeout"."""
+    url: str
+    status: str
+    entries: list = field(default_factory=list)
+    error: str = ""
+    elapsed: float = 0.0
+    from_cache: bool = False   # True when the server answered 304 and cached entries were reused
+    # Streaming only: set when the whole feed was read. The consumer stores the cache entry and the
+    # scheduler stamps once it has drained the feed, so a feed it never got to is re-read next time.
+    completed: bool = False
+    etag: str = ""
+    last_modified: str = ""
+    stamps: list = field(default_factory=list)
+
+
+def _make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def _fetch_one(session: requests.Session, url: str, timeout: tuple[float, float], cache: FeedCache | None = None) -> FeedResult:
+    with span("rss.feed", url=url) as s:
+        result = _fetch_and_parse(session, url, timeout, cache, s)
+        s.items_out = len(result.entries)
+        s.attrs["status"] = result.status
+        return result
+
+
+def _fetch_and_parse(session: requests.Session, url: str, timeout: tuple[float, float], cache: FeedCache | None, s) -> FeedResult:
+    start = time.monotonic()
+    try:
+        cached = cache.get(url) if cache else None
+        headers = cache.conditional_headers(cached) if cache else {}
+        resp = session.get(url, timeout=timeout, headers=headers)
+        s.bytes_in = len(resp.content)
+        if resp.status_code == 304 and cached:
+            cache.touch(url)
+            cache.record(hit=True)
+            s.cache_hits = 1
+            s.items_in = len(cached.entries)
+            return FeedResult(url, "ok", list(cached.entries), elapsed=time.monotonic() - start, from_cache=True)
+        resp.raise_for_status()
+        fp = feedparser.parse(resp.content, response_headers=dict(resp.headers))
+        entries = list(fp.entries)
+        s.items_in = len(entries)
+        if cache:
+            cache.record(hit=False)
+            s.cache_misses = 1
+            cache.put(url, resp.headers.get("ETag", ""), resp.headers.get("Last-Modified", ""), entries)
+        return FeedResult(url, "ok", entries, elapsed=time.monotonic() - start)
+    except requests.Timeout as e:
+        return FeedResult(url, "timeout", error=str(e), elapsed=time.monotonic() - start)
+    except Exception as e:
+        return FeedResult(url, "error", error=f"{type(e).__name__}: {e}", elapsed=time.monotonic() - start)
+
+
+def fetch_feeds(
+    urls: List[str],
+    connect_timeout: float = CONNECT_TIMEOUT,
+    read_timeout: float = READ_TIMEOUT,
+    deadline: float = FETCH_DEADLINE,
+    max_workers: int = MAX_WORKERS,
+    partial: bool = True,
+    cache: FeedCache | None = None,
+) -> List[FeedResult]:
+    """
+    Fetch and parse every feed concurrently over one pooled HTTP session.
+    Results come back in the same order as `urls`, whatever order the hosts answered in.
+    Feeds still running when `deadline` expires are reported as "timeout"; with
+    partial=False that raises FetchDeadlineExceeded instead.
+    With a `cache`, requests are conditional and a 304 reuses the stored entries.
+    """
+    if not urls:
+        return []
+
+    workers = max(1, min(max_workers, len(urls)))
+    session = _make_session(workers)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed")
+    results: List[FeedResult | None] = [None] * len(urls)
+    try:
+        futures = {pool.submit(_fetch_one, session, url, (connect_timeout, read_timeout), cache): i for i, url in enumerate(urls)}
+        pending = set(futures)
+        stop_at = time.monotonic() + deadline
+        while pending:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[futures[fut]] = fut.result()
+    finally:
+        # Don't block on stragglers; their own read timeout bounds how long they linger.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    missed = [urls[i] for i, r in enumerate(results) if r is None]
+    if missed and not partial:
+        raise FetchDeadlineExceeded(f"{len(missed)} feed(s) missed the {deadline:.0f}s deadline: {', '.join(missed)}")
+    for i, r in enumerate(results):
+        if r is None:
+            results[i] = FeedResult(urls[i], "timeout", error=f"global deadline of {deadline:.0f}s exceeded", elapsed=deadline)
+
+    for r in results:
+        if r.status != "ok":
+            print(f"WARN: feed {r.url} {r.status} after {r.elapsed:.1f}s: {r.error}")
+    if cache:
+        print(f"DEBUG: feed cache {cache.hits} hit(s), {cache.misses} miss(es); evicted {cache.prune()}")
+    return results
+
+
+def _entry_content_html(e) -> str:
+    # feedparser typically puts content:encoded into e.content[0].value
+    content = e.get("content")
+    if isinstance(content, list) and content and "value" in content[0]:
+        return content[0].value
+    if isinstance(content, dict) and "value" in content:
+        # Handle cases where e.content might be a dict directly (less common but possible)
+        return content["value"]
+    return ""
+
+
+def entry_to_item(e) -> Dict[str, str]:
+    """Turn one feedparser entry into a digest item, parsing each distinct HTML fragment once."""
+    raw_summary = e.get("summary", "") # Preserve raw summary/description for processing
+    content_html = _entry_content_html(e)
+
+    summary = extract(raw_summary)
+    content = extract(content_html) if content_html and content_html != raw_summary else summary
+
+    # Every image candidate, best first; images.pick_images falls back along this list when one
+    # turns out broken, tiny or not an image.
+    # 1. First image in the full 'content:encoded' HTML
+    candidates = [content.image_url] if content_html else []
+
+    # 2. 'media:content' (e.g., The Hacker News sometimes uses this)
+    candidates += [media["url"] for media in e.get("media_content", []) if "url" in media and media.get("type", "").startswith("image/")]
+
+    # 3. 'enclosures' (e.g., The Hacker News often uses this)
+    candidates += [enc["href"] for enc in e.get("enclosures", []) if "href" in enc and enc.get("type", "").startswith("image/")]
+
+    # 4. First <img> in the raw 'summary'/'description'
+    candidates.append(summary.image_url)
+    candidates = list(dict.fromkeys(c for c in candidates if c))
+    image_url = candidates[0] if candidates else ""
+
+    return {
+        "title": e.get("title", "").strip(),
+        "summary": summary.text, # This is the plain text summary
+        "link": e.get("link", "").strip(),
+        "image_url": image_url,       # The extracted image URL
+        "image_candidates": candidates,
+        "summary_content_html": content.html if content_html else summary.html, # The HTML content for the digest
+    }
+
+
+def _entry_time(e) -> datetime.datetime | None:
+    stamp = getattr(e, "published_parsed", None) or getattr(e, "updated_parsed", None)
+    return datetime.datetime(*stamp[:6], tzinfo=datetime.timezone.utc) if stamp else None
+
+
+def _dated_item(e, url: str, entry_dt: datetime.datetime) -> Dict[str, str]:
+    """entry_to_item plus where and when it was published, for ranking."""
+    return {**entry_to_item(e), "feed": url, "published": entry_dt.isoformat()}
+
+
+def _feed_cutoff(url: str, cutoff: datetime.datetime, scheduler: FeedScheduler | None) -> datetime.datetime:
+    """With scheduler.read_back, a feed skipped on earlier runs is read back to its last poll, not just hours_back."""
+    last_polled = scheduler.last_polled(url) if scheduler is not None and scheduler.read_back else None
+    if last_polled is None:
+        return cutoff
+    return min(cutoff, datetime.datetime.fromtimestamp(last_polled, datetime.timezone.utc))
+
+
+def _due_feeds(scheduler: FeedScheduler | None) -> List[str]:
+    if scheduler is None:
+        return FEEDS
+    urls = scheduler.due(FEEDS)
+    print(f"DEBUG: polling {len(urls)} of {len(FEEDS)} feed(s) this run")
+    return urls
+
+
+def _put(out: queue.Queue, msg, stop: threading.Event) -> bool:
+    """Put that tells the worker to give up once the consumer has stopped reading."""
+    if stop.is_set():
+        return False
+    out.put(msg)
+    return True
+
+
+def _stream_one(session: requests.Session, index: int, url: str, timeout: tuple[float, float], cutoff: datetime.datetime,
+                date_ordered: bool, cache: FeedCache | None, out: queue.Queue, stop: threading.Event) -> None:
+    """
+    Worker for iter_items: stream one feed, parse entries as they arrive and put (index, item)
+    on `out` for each fresh one, then (index, FeedResult) once the feed is done (with what the
+    cache and scheduler need, for the consumer to store after draining it). Stops reading when
+    `stop` is set, or, for a date-ordered feed, once entries have gone past the cutoff.
+    """
+    start = time.monotonic()
+    result = FeedResult(url, "ok")
+    with span("rss.feed", url=url, streamed=True) as s:
+        resp = None
+        emitted = 0
+        kept: Optional[list] = None # entries read, stored for the next conditional GET
+        stamps: List[float] = []
+        completed = False
+
+        def emit(entries: Iterable) -> bool:
+            nonlocal emitted
+            stale = 0
+            for e in entries:
+                if stop.is_set():
+                    return False
+                s.items_in += 1
+                if kept is not None:
+                    kept.append(e)
+                entry_dt = _entry_time(e)
+                if entry_dt is None:
+                    continue
+                stamps.append(entry_dt.timestamp())
+                if entry_dt < cutoff:
+                    stale += 1
+                    if date_ordered and stale >= ORDERED_STOP_AFTER:
+                        s.attrs["stopped_early"] = True
+                        return True
+                    continue
+                stale = 0
+                if not _put(out, (index, _dated_item(e, url, entry_dt)), stop):
+                    return False
+                emitted += 1
+            return True
+
+        try:
+            cached = cache.get(url) if cache else None
+            headers = cache.conditional_headers(cached) if cache else {}
+            resp = session.get(url, timeout=timeout, headers=headers, stream=True)
+            if resp.status_code == 304 and cached:
+                cache.touch(url)
+                cache.record(hit=True)
+                s.cache_hits = 1
+                result.from_cache = True
+                completed = emit(cached.entries)
+            else:
+                resp.raise_for_status()
+                if cache:
+                    cache.record(hit=False)
+                    s.cache_misses = 1
+                    kept = []
+
+                def chunks() -> Iterator[bytes]:
+                    for chunk in resp.iter_content(STREAM_CHUNK_BYTES):
+                        s.bytes_in += len(chunk)
+                        yield chunk
+
+                try:
+                    completed = emit(iter_entries(chunks()))
+                except Exception as e: # ElementTree is strict XML; feedparser copes with sloppier feeds
+                    if emitted:
+                        raise
+                    print(f"WARN: streaming parse of {url} failed ({type(e).__name__}: {e}); falling back to feedparser")
+                    resp.close()
+                    resp = session.get(url, timeout=timeout)
+                    resp.raise_for_status()
+                    s.bytes_in += len(resp.content)
+                    kept, stamps[:] = ([] if cache else None), []
+                    completed = emit(feedparser.parse(resp.content, response_headers=dict(resp.headers)).entries)
+            if completed:
+                result.completed, result.stamps = True, stamps
+                if kept is not None:
+                    result.entries, result.etag, result.last_modified = kept, resp.headers.get("ETag", ""), resp.headers.get("Last-Modified", "")
+        except requests.Timeout as e:
+            result.status, result.error = "timeout", str(e)
+        except Exception as e:
+            result.status, result.error = "error", f"{type(e).__name__}: {e}"
+        finally:
+            if resp is not None:
+                resp.close() # for an early stop this drops the rest of the download
+            s.items_out = emitted
+            s.attrs["status"] = result.status
+        result.elapsed = time.monotonic() - start
+    _put(out, (index, result), stop)
+
+
+def iter_items(
+    max_items: int = 25,
+    hours_back: int = 24,
+    partial: bool = True,
+    use_cache: bool = True,
+    sent_index=None,
+    scheduler: FeedScheduler | None = None,
+    connect_timeout: float = CONNECT_TIMEOUT,
+    read_timeout: float = READ_TIMEOUT,
+    deadline: float = FETCH_DEADLINE,
+    max_workers: int = MAX_WORKERS,
+) -> Iterator[Dict[str, str]]:
+    """
+    Streaming today_items: yields the same items in the same order, but feeds are parsed
+    incrementally while they download, a date-ordered feed (feeds.toml hint) is abandoned once its
+    entries fall past the cutoff, and everything stops as soon as max_items unique items have
+    been produced. Workers never wait on the consumer: items of a feed that is ahead of its turn
+    are buffered here, so a slow feed can't hold up the feeds still queued behind it. Only
+    feeds read to the end are stored in the feed cache and recorded with the scheduler. When the
+    deadline passes, what the answering feeds already delivered is still yielded.
+    """
+    urls = _due_feeds(scheduler)
+    if not urls or max_items <= 0:
+        return
     cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours_back)
-    items = []
+    cache = FeedCache() if use_cache else None
+    workers = max(1, min(max_workers, len(urls)))
+    session = _make_session(workers)
+    stop = threading.Event()
+    inbox: queue.Queue = queue.Queue() # (feed index, item or FeedResult) from every worker
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed")
+    for i, url in enumerate(urls):
+        spec = REGISTRY.get(url) or FeedSpec(url)
+        pool.submit(_stream_one, session, i, url, (connect_timeout, read_timeout), _feed_cutoff(url, cutoff, scheduler),
+                    spec.date_ordered, cache, inbox, stop)
 
-    for url in FEEDS:
-        fp = feedparser.parse(url)
-        for e in fp.entries:
-            stamp = getattr(e, "published_parsed", None) or getattr(e, "updated_parsed", None)
-            if not stamp:
+    seen_titles = set()
+    produced = dropped = 0
+    stop_at = time.monotonic() + deadline
+    buffered = [deque() for _ in urls]
+    finished: List[Optional[FeedResult]] = [None] * len(urls)
+    active, turn = list(range(len(urls))), 0
+    expired = False
+    try:
+        # Round-robin over the feeds, one entry from each in turn (the interleaving today_items
+        # uses), so the item budget is shared instead of going to the first feeds in FEEDS.
+        while active:
+            i = active[turn]
+            if buffered[i]:
+                msg = buffered[i].popleft()
+                turn = (turn + 1) % len(active)
+            elif finished[i] is not None or expired: # drained, or out of time: the feed leaves the rotation
+                active.pop(turn)
+                turn = turn % len(active) if active else 0
+                result = finished[i]
+                if result is None:
+                    continue
+                if result.status != "ok":
+                    print(f"WARN: feed {result.url} {result.status} after {result.elapsed:.1f}s: {result.error}")
+                elif result.completed:
+                    if cache and not result.from_cache:
+                        cache.put(result.url, result.etag, result.last_modified, result.entries)
+                    if scheduler is not None:
+                        scheduler.record(result.url, result.stamps)
+                continue
+            else: # feed i's turn but nothing from it yet: wait for any feed
+                try:
+                    j, got = inbox.get(timeout=max(0.0, stop_at - time.monotonic()))
+                except queue.Empty:
+                    missed = [urls[j] for j in active if finished[j] is None]
+                    if not partial:
+                        raise FetchDeadlineExceeded(f"{len(missed)} feed(s) missed the {deadline:.0f}s deadline: {', '.join(missed)}")
+                    for m in missed:
+                        print(f"WARN: feed {m} timeout: global deadline of {deadline:.0f}s exceeded")
+                    stop.set()
+                    expired = True # yield what already arrived, then stop
+                    while True:
+                        try:
+                            j, got = inbox.get_nowait()
+                        except queue.Empty:
+                            break
+                        if not isinstance(got, FeedResult):
+                            buffered[j].append(got)
+                    continue
+                if isinstance(got, FeedResult):
+                    finished[j] = got
+                else:
+                    buffered[j].append(got)
                 continue
-            entry_dt = datetime.datetime(*stamp[:6], tzinfo=datetime.timezone.utc)
-            if entry_dt < cutoff:
+            if sent_index is not None and sent_index.was_sent(msg):
+                dropped += 1
                 continue
+            # Deduplicate items by title to avoid duplicates from multiple feeds or feed updates
+            if msg["title"] in seen_titles:
+                continue
+            seen_titles.add(msg["title"])
+            yield msg
+            produced += 1
+            if produced >= max_items:
+                return
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if dropped:
+            print(f"DEBUG: Dropped {dropped} article(s) already sent in earlier digests")
+        if cache:
+            print(f"DEBUG: feed cache {cache.hits} hit(s), {cache.misses} miss(es); evicted {cache.prune()}")
+
+
+def today_items(max_items: int = 25, hours_back: int = 24, partial: bool = True, use_cache: bool = True, sent_index=None,
+                scheduler: FeedScheduler | None = None, stream: bool = STREAM_PARSE) -> List[Dict[str, str]]:
+    """
+    Return recent RSS items with title, summary (plain text), link, image_url, summary_content_html,
+    feed (the source URL) and published (ISO 8601, UTC).
+    If a sent_index.SentIndex is given, items mailed in earlier digests are dropped before the max_items cut.
+    With a feeds.FeedScheduler only the feeds it says are due get polled; if its read_back is set, a
+    feed that was skipped on earlier runs is read back to its last poll, so nothing published in
+    between is lost (those items may be older than hours_back).
+    stream=True (the default, see STREAM_PARSE) collects iter_items instead of parsing whole feeds.
+    """
+    if stream:
+        return list(iter_items(max_items, hours_back, partial, use_cache, sent_index, scheduler))
+
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours_back)
+    per_feed = [] # (url, items, stamps) of each feed that answered
+
+    urls = _due_feeds(scheduler)
+    cache = FeedCache() if use_cache else None
+    results = fetch_feeds(urls, partial=partial, cache=cache)
+    with span("rss.extract") as s:
+        for result in results:
+            s.items_in += len(result.entries)
+            feed_cutoff = _feed_cutoff(result.url, cutoff, scheduler)
+            stamps, feed_items = [], []
+            for e in result.entries:
+                entry_dt = _entry_time(e)
+                if entry_dt is None:
+                    continue
+                stamps.append(entry_dt.timestamp())
+                if entry_dt < feed_cutoff:
+                    continue
+
+                feed_items.append(_dated_item(e, result.url, entry_dt))
+            if result.status == "ok":
+                per_feed.append((result.url, feed_items, stamps))
+        # One entry from each feed in turn, so the max_items cut doesn't only keep the first feeds.
+        items = [item for round_ in zip_longest(*(f[1] for f in per_feed)) for item in round_ if item is not None]
+        s.items_out = len(items)
 
-            title = e.get("title", "").strip()
-            link = e.get("link", "").strip()
-
-            image_url = ""
-            summary_content_html = ""
-            raw_summary = e.get("summary", "") # Preserve raw summary/description for processing
-
-            # 1. Attempt to get full HTML content from 'content:encoded' first
-            # feedparser typically puts content:encoded into e.content[0].value
-            if 'content' in e and isinstance(e.content, list) and len(e.content) > 0 and 'value' in e.content[0]:
-                summary_content_html = e.content[0].value
-            elif 'content' in e and isinstance(e.content, dict) and 'value' in e.content:
-                # Handle cases where e.content might be a dict directly (less common but possible)
-                summary_content_html = e.content.value
-            
-            if summary_content_html:
-                content_soup = BeautifulSoup(summary_content_html, 'html.parser')
-                # Try to find the first image in the parsed HTML content
-                img_tag = content_soup.find('img')
-                if img_tag and 'src' in img_tag.attrs:
-                    image_url = img_tag['src']
-            
-            # 2. If no image found yet, check 'media:content' (e.g., The Hacker News sometimes uses this)
-            if not image_url and 'media_content' in e:
-                for media in e.media_content:
-                    if 'url' in media and media.get('type', '').startswith('image/'):
-                        image_url = media['url']
-                        break # Take the first valid image
-
-            # 3. If no image found yet, check 'enclosures' (e.g., The Hacker News often uses this)
-            if not image_url and 'enclosures' in e:
-                for enc in e.enclosures:
-                    if 'href' in enc and enc.get('type', '').startswith('image/'):
-                        image_url = enc['href']
-                        break # Take the first valid image
-
-            # 4. Fallback: If no image found yet, search for an <img> tag in the raw 'summary'/'description'
-            if not image_url and raw_summary:
-                summary_soup_for_img = BeautifulSoup(raw_summary, 'html.parser')
-                img_tag_in_summary = summary_soup_for_img.find('img')
-                if img_tag_in_summary and 'src' in img_tag_in_summary.attrs:
-                    image_url = img_tag_in_summary['src']
-            
-            # Ensure summary_content_html is always set. If content:encoded wasn't found, use raw_summary.
-            if not summary_content_html and raw_summary:
-                summary_content_html = raw_summary
-
-            # Create a plain text summary for the 'summary' field (useful for previews or text-only display)
-            plain_text_summary = re.sub(r'<.*?>', '', raw_summary).strip()
-
-
-            items.append({
-                "title": title,
-                "summary": plain_text_summary, # This is the plain text summary
-                "link": link,
-                "image_url": image_url,       # The extracted image URL
-                "summary_content_html": summary_content_html, # The HTML content for the digest
-            })
+    if sent_index is not None:
+        items = sent_index.filter_unsent(items)
 
     # Deduplicate items by title to avoid duplicates from multiple feeds or feed updates
     seen_titles = set()
@@ -91,4 +485,9 @@ def today_items(max_items: int = 25, hours_back: int = 24) -> List[Dict[str, str
             seen_titles.add(item["title"])
             unique.append(item)
 
+    if scheduler is not None: # a feed with items past the cut is re-read to its last poll next time
+        cut = {item["feed"] for item in unique[max_items:]}
+        for url, _, stamps in per_feed:
+            if url not in cut:
+                scheduler.record(url, stamps)
     return unique[:max_items]
@@ -1,13 +1,50 @@
-import base64
+from __future__ import annotations
+import base64, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Callable, Dict, List, Optional, Protocol, Tuple, Union
+
+import google_auth_httplib2, httplib2
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 import os
 
-def send_html_email(subject: str, html_content: str):
+from metrics import span
+
+# ── Sending settings ───────────────────────────────────────────────
+GMAIL_BATCH_SIZE = 50        # messages per Gmail batch request (Gmail allows up to 100)
+GMAIL_MAX_WORKERS = 4        # batch requests in flight at once
+GMAIL_MAX_RETRIES = 3        # extra attempts for each recipient whose send failed
+GMAIL_HTTP_TIMEOUT = 60      # seconds per HTTP request
+# HTTP statuses worth retrying: rate limits and server-side trouble.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# ───────────────────────────────────────────────────────────────────
+
+SendResult = Tuple[Optional[str], Optional[Exception]] # (message id, error)
+
+
+class DeliveryError(RuntimeError):
+    """Some or all recipients didn't get the message, after retries. `failed` maps each of them to its error."""
+
+    def __init__(self, failed: Dict[str, Exception], total: int):
+        self.failed = failed
+        self.delivered = total - len(failed)
+        first = next(iter(failed.values()))
+        super().__init__(f"Gmail delivery failed for {len(failed)} of {total} recipient(s) ({', '.join(failed)}): {first}")
+
+
+class GmailTransport(Protocol):
+    """Anything that can push a list of raw (base64url) messages and report each outcome, in order."""
+
+    def send_batch(self, raws: List[str]) -> List[SendResult]: ...
+
+
+def gmail_credentials() -> Credentials:
     # Setup credentials from environment variables
-    creds = Credentials(
+    return Credentials(
         token=None,
         refresh_token=os.environ["GMAIL_REFRESH_TOKEN"],
         token_uri="https://oauth2.googleapis.com/token",
@@ -16,29 +53,183 @@ def send_html_email(subject: str, html_content: str):
         scopes=["https://www.googleapis.com/auth/gmail.send"]
     )
 
-    # Initialize Gmail API
-    service = build("gmail", "v1", credentials=creds)
 
-    sender = os.environ["GMAIL_SENDER"]
-    bcc_recipients = [
-        email.strip()
-        for email in os.environ["GMAIL_RECIPIENTS"].split(",")
-        if email.strip()
-    ]
+class GoogleApiTransport:
+    """
+    Gmail API over googleapiclient, built once from the discovery document bundled with the
+    library (no discovery fetch). Credentials are shared, so the access token is refreshed once
+    and reused; each worker thread keeps its own persistent HTTP connection because httplib2
+    objects aren't thread-safe. Pass api_endpoint to talk to a local fake server instead.
+    """
+
+    def __init__(self, credentials=None, api_endpoint: Optional[str] = None):
+        self.credentials = credentials or gmail_credentials()
+        options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        self.service = build("gmail", "v1", credentials=self.credentials, static_discovery=True, client_options=options)
+        self.batch_uri = api_endpoint.rstrip("/") + "/batch" if api_endpoint else None
+        self._local = threading.local()
+        self._https: List[httplib2.Http] = [] # every thread's connection, for close()
+        self._lock = threading.Lock()
+
+    def _http(self):
+        if not hasattr(self._local, "http"):
+            http = httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT)
+            with self._lock:
+                self._https.append(http)
+            self._local.http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=http)
+        return self._local.http
+
+    def close(self) -> None:
+        with self._lock:
+            for http in self._https:
+                http.close()
+            self._https.clear()
+
+    def send_batch(self, raws: List[str]) -> List[SendResult]:
+        results: List[SendResult] = [(None, None)] * len(raws)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response["id"] if response else None, exception)
+
+        batch = (
+            BatchHttpRequest(callback=callback, batch_uri=self.batch_uri) if self.batch_uri
+            else self.service.new_batch_http_request(callback=callback)
+        )
+        for i, raw in enumerate(raws):
+            batch.add(self.service.users().messages().send(userId="me", body={"raw": raw}), request_id=str(i))
+        try:
+            batch.execute(http=self._http())
+        except Exception as e: # the whole batch request failed; every message in it gets retried
+            return [(None, e)] * len(raws)
+        return results
+
 
+def build_message(subject: str, html_content: str, sender: str, to: str, bcc: Optional[List[str]] = None) -> str:
+    """MIME-encode one HTML email and return it base64url-encoded, ready for the Gmail API."""
     # Create a MIME email message
     message = MIMEMultipart("alternative")
     message["Subject"] = subject
     message["From"] = sender
-    message["To"] = sender  # visible 'To:' line
-    message["Bcc"] = ", ".join(bcc_recipients)  # actual recipients hidden
+    message["To"] = to
+    if bcc:
+        message["Bcc"] = ", ".join(bcc)
 
     # Attach the HTML content
     part_html = MIMEText(html_content, "html")
     message.attach(part_html)
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return True # network-level failures (timeouts, resets) are worth another go
+
+
+class GmailSender:
+    """
+    Long-lived Gmail sender. Build it once per process and reuse it: the transport (and with it
+    credentials and HTTP connections) and the worker threads are created once, so each worker
+    keeps its connection from one send to the next. send_personalized() mails each recipient
+    their own message through Gmail batch requests and retries only the recipients that failed.
+    close() stops the workers and closes the connections.
+    """
+
+    def __init__(self, transport: Optional[GmailTransport] = None, sender: Optional[str] = None,
+                 batch_size: int = GMAIL_BATCH_SIZE, max_workers: int = GMAIL_MAX_WORKERS,
+                 retries: int = GMAIL_MAX_RETRIES):
+        self.transport = transport or GoogleApiTransport()
+        self.sender = sender or os.environ["GMAIL_SENDER"]
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="gmail")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        close = getattr(self.transport, "close", None)
+        if close is not None:
+            close()
+
+    def send_personalized(self, subject: str, recipients: List[str],
+                          html: Union[str, Callable[[str], str]]) -> Dict[str, SendResult]:
+        """
+        Send one message per recipient. `html` is either the shared body or a function of the
+        recipient returning their personalised body. Returns recipient -> (message id, error).
+        """
+        with span("gmail.send") as s:
+            raws = {
+                rcpt: build_message(subject, html(rcpt) if callable(html) else html, self.sender, rcpt)
+                for rcpt in recipients
+            }
+            s.items_in = len(raws)
+            s.bytes_out = sum(len(raw) for raw in raws.values())
+            outcome: Dict[str, SendResult] = {}
+            pending = list(raws)
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(random.uniform(0, min(30.0, 2 ** attempt)))
+                    print(f"WARN: retrying {len(pending)} recipient(s), attempt {attempt}/{self.retries}")
+                batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                sent = self._pool.map(self._send_batch, [[raws[r] for r in batch] for batch in batches])
+                for batch, results in zip(batches, sent):
+                    for rcpt, result in zip(batch, results):
+                        outcome[rcpt] = result
+                pending = [r for r in pending if outcome[r][1] is not None and _retryable(outcome[r][1])]
+                if not pending:
+                    break
+
+            failed = [r for r, (_, err) in outcome.items() if err is not None]
+            s.items_out = len(recipients) - len(failed)
+            s.attrs["attempts"] = attempt + 1 if recipients else 0
+            print(f"📧 Gmail: {len(recipients) - len(failed)}/{len(recipients)} delivered" + (f"; failed: {', '.join(failed)}" if failed else ""))
+            return outcome
+
+    def _send_batch(self, raws: List[str]) -> List[SendResult]:
+        with span("gmail.batch") as s:
+            s.items_in = len(raws)
+            s.bytes_out = sum(len(raw) for raw in raws)
+            results = self.transport.send_batch(raws)
+            s.items_out = sum(1 for _, err in results if err is None)
+            return results
+
+
+def recipients_from_env() -> List[str]:
+    return [
+        email.strip()
+        for email in os.environ["GMAIL_RECIPIENTS"].split(",")
+        if email.strip()
+    ]
+
+
+_default_sender: Optional[GmailSender] = None
+_default_lock = threading.Lock()
+
+
+def default_sender() -> GmailSender:
+    global _default_sender
+    with _default_lock:
+        if _default_sender is None:
+            _default_sender = GmailSender()
+        return _default_sender
+
+
+def close_default_sender() -> None:
+    global _default_sender
+    with _default_lock:
+        if _default_sender is not None:
+            _default_sender.close()
+            _default_sender = None
+
 
-    # Encode and send
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    body = {"raw": raw}
-    result = service.users().messages().send(userId="me", body=body).execute()
-    print("📧 Gmail response:", result["id"])
+def send_html_email(subject: str, html_content: str, recipients: Optional[List[str]] = None) -> Dict[str, SendResult]:
+    """
+    Send the digest to every recipient (default: GMAIL_RECIPIENTS), one message each (recipients
+    never see each other). Raises DeliveryError, after the others were sent, if any recipient
+    still failed after retries.
+    """
+    outcome = default_sender().send_personalized(subject, recipients or recipients_from_env(), html_content)
+    failed = {rcpt: err for rcpt, (_, err) in outcome.items() if err is not None}
+    if failed:
+        raise DeliveryError(failed, len(outcome))
+    return outcome
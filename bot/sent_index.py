@@ -0,0 +1,120 @@
+from __future__ import annotations
+import argparse, hashlib, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from dedup import tokenize_and_normalize
+from state import state_path
+
+# ── Index settings ─────────────────────────────────────────────────
+RETENTION_DAYS = 180    # forget stories sent longer ago than this
+# Query parameters that only track the click and never change which article a link points to.
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "source"}
+# ───────────────────────────────────────────────────────────────────
+
+
+def normalize_link(link: str) -> str:
+    """Canonical form of an article URL: no scheme/www/fragment/tracking params, sorted query."""
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    key = host + parts.path.rstrip("/")
+    return f"{key}?{urlencode(query)}" if query else key
+
+
+def content_fingerprint(article: Dict[str, str]) -> str:
+    """
+    Hash of the article's summary tokens, ignoring order, case and punctuation.
+    The title is left out on purpose so a re-published story with an edited headline still matches.
+    """
+    tokens = tokenize_and_normalize(article.get("summary", ""))
+    if len(tokens) < 5: # too little body text to tell stories apart; fall back to title + summary
+        tokens |= tokenize_and_normalize(article.get("title", ""))
+    return hashlib.sha1(" ".join(sorted(tokens)).encode("utf-8")).hexdigest()
+
+
+class SentIndex:
+    """SQLite record of every story that went out, so later runs never mail it again. Thread-safe."""
+
+    def __init__(self, path: Optional[Path] = None, retention_days: int = RETENTION_DAYS):
+        self.path = Path(path) if path else state_path("sent_index.sqlite3")
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sent (
+                link_key    TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                title       TEXT NOT NULL,
+                sent_at     INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sent_link ON sent(link_key);
+            CREATE INDEX IF NOT EXISTS sent_fingerprint ON sent(fingerprint);
+            CREATE INDEX IF NOT EXISTS sent_at ON sent(sent_at);
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def was_sent(self, article: Dict[str, str]) -> bool:
+        """Same normalized link or same content as a sent story. A story without a link matches on content only."""
+        link_key, fingerprint = normalize_link(article.get("link", "")), content_fingerprint(article)
+        with self._lock:
+            if not link_key: # every link-less story shares the empty key
+                row = self.db.execute("SELECT 1 FROM sent WHERE fingerprint = ? LIMIT 1", (fingerprint,)).fetchone()
+            else:
+                row = self.db.execute("SELECT 1 FROM sent WHERE link_key = ? OR fingerprint = ? LIMIT 1", (link_key, fingerprint)).fetchone()
+        return row is not None
+
+    def filter_unsent(self, articles: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Drop articles already sent in an earlier run (same normalized link or same content)."""
+        fresh = [a for a in articles if not self.was_sent(a)]
+        if len(fresh) != len(articles):
+            print(f"DEBUG: Dropped {len(articles) - len(fresh)} article(s) already sent in earlier digests")
+        return fresh
+
+    def mark_sent(self, articles: Iterable[Dict[str, str]], sent_at: Optional[float] = None) -> None:
+        now = int(sent_at if sent_at is not None else time.time())
+        rows = [(normalize_link(a.get("link", "")), content_fingerprint(a), a.get("title", ""), now) for a in articles]
+        with self._lock, self.db:
+            self.db.executemany("INSERT INTO sent (link_key, fingerprint, title, sent_at) VALUES (?, ?, ?, ?)", rows)
+        self.prune()
+
+    def prune(self) -> int:
+        cutoff = int(time.time()) - self.retention_days * 86400
+        with self._lock, self.db:
+            return self.db.execute("DELETE FROM sent WHERE sent_at < ?", (cutoff,)).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM sent").fetchone()[0]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or prune the index of already-sent stories.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show how many stories are remembered and the most recent ones")
+    sub.add_parser("prune", help=f"forget stories older than {RETENTION_DAYS} days")
+    args = parser.parse_args(argv)
+
+    index = SentIndex()
+    if args.command == "stats":
+        print(f"{len(index):,} stories in {index.path}")
+        for title, sent_at in index.db.execute("SELECT title, sent_at FROM sent ORDER BY sent_at DESC LIMIT 10"):
+            print(f"  {time.strftime('%Y-%m-%d %H:%M', time.gmtime(sent_at))}  {title}")
+    elif args.command == "prune":
+        print(f"Pruned {index.prune()} stories from {index.path}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
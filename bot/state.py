@@ -0,0 +1,14 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+
+# Everything the bot persists between runs (feed cache, indexes, archives...) lives
+# under this directory. The workflow restores/saves it with actions/cache.
+STATE_DIR = Path(os.environ.get("DIGEST_STATE_DIR") or Path(__file__).resolve().parent.parent / ".state")
+
+
+def state_path(*parts: str) -> Path:
+    """Return a path inside STATE_DIR, creating its parent directory on the way."""
+    path = STATE_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path